@@ -27,6 +27,8 @@ INSTALLED_APPS = [
 # FIXED: Remove duplicate CorsMiddleware and fix order
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'main.middleware.RequestLoggingMiddleware',
+    'main.middleware.ServerTimingMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -128,6 +130,7 @@ CORS_ALLOW_HEADERS = [
     'user-agent',
     'x-csrftoken',
     'x-requested-with',
+    'x-request-id',
 ]
 
 # CSRF Configuration for local development
@@ -154,6 +157,111 @@ TEMP_DIR = BASE_DIR / 'temp'
 TEMP_DIR.mkdir(exist_ok=True)
 FILE_UPLOAD_TEMP_DIR = str(TEMP_DIR)
 
+# Encryption settings
+# Password KDF runs (PBKDF2, 100k iterations) share this many worker threads
+KDF_MAX_WORKERS = config('KDF_MAX_WORKERS', default=2, cast=int)
+
+# File serving
+# 'python' streams downloads from Django; 'x-accel-redirect' (nginx) or
+# 'x-sendfile' (Apache/lighttpd) let the front proxy send the bytes.
+# For nginx, map FILE_SERVE_ACCEL_PREFIX to MEDIA_ROOT in an internal location.
+FILE_SERVE_MODE = config('FILE_SERVE_MODE', default='python')
+FILE_SERVE_ACCEL_PREFIX = config('FILE_SERVE_ACCEL_PREFIX', default='/protected-media/')
+
+# Share links
+# Public base URL (e.g. https://example.com) used for share links and their
+# QR codes. Without it, links are built from the request's Host header and
+# QR codes are only cached in process, not on disk under MEDIA_ROOT/qr_cache.
+SITE_URL = config('SITE_URL', default='').rstrip('/')
+
+# Metadata storage
+# 'rows' stores one MetadataEntry row per tag; 'compact' stores new analyses'
+# entries as one compressed blob on FileAnalysis. Existing rows are moved
+# with `manage.py compact_metadata`.
+METADATA_STORAGE = config('METADATA_STORAGE', default='rows')
+
+# Platform rules
+# Active PlatformRules are compiled once per process. Workers compare the
+# rules' count and latest updated_at in the database at most this often
+# (seconds) and reload when either moved.
+PLATFORM_RULE_CHECK_INTERVAL = config('PLATFORM_RULE_CHECK_INTERVAL', default=5, cast=float)
+
+# Metrics
+# /metrics serves Prometheus metrics; when METRICS_TOKEN is set, scrapers must
+# send "Authorization: Bearer <token>". With several worker processes, export
+# PROMETHEUS_MULTIPROC_DIR (an empty directory shared by the workers, cleared
+# on deploy) before they start.
+METRICS_TOKEN = config('METRICS_TOKEN', default='')
+
+# VirusTotal
+# /api/analyze/ uploads every file here before processing it. For tests and
+# load runs, point VIRUSTOTAL_BASE_URL at `manage.py fake_virustotal`.
+VIRUSTOTAL_API_KEY = config('VIRUSTOTAL_API_KEY', default='')
+VIRUSTOTAL_BASE_URL = config('VIRUSTOTAL_BASE_URL', default='https://www.virustotal.com/api/v3').rstrip('/')
+# Seconds between polls for the verdict, and how long to keep polling
+VIRUSTOTAL_POLL_DELAY = config('VIRUSTOTAL_POLL_DELAY', default=5, cast=float)
+VIRUSTOTAL_POLL_TIMEOUT = config('VIRUSTOTAL_POLL_TIMEOUT', default=60, cast=float)
+VIRUSTOTAL_CONNECT_TIMEOUT = config('VIRUSTOTAL_CONNECT_TIMEOUT', default=5, cast=float)
+VIRUSTOTAL_READ_TIMEOUT = config('VIRUSTOTAL_READ_TIMEOUT', default=30, cast=float)
+# Retries on connection errors, timeouts, 429 and 5xx, with jittered backoff
+# of up to BACKOFF_BASE * 2**attempt seconds (never more than BACKOFF_MAX)
+VIRUSTOTAL_MAX_RETRIES = config('VIRUSTOTAL_MAX_RETRIES', default=3, cast=int)
+VIRUSTOTAL_BACKOFF_BASE = config('VIRUSTOTAL_BACKOFF_BASE', default=0.5, cast=float)
+VIRUSTOTAL_BACKOFF_MAX = config('VIRUSTOTAL_BACKOFF_MAX', default=8, cast=float)
+# Pooled keep-alive connections per worker
+VIRUSTOTAL_POOL_SIZE = config('VIRUSTOTAL_POOL_SIZE', default=10, cast=int)
+# After this many failed calls in a row, fail fast for COOLDOWN seconds
+VIRUSTOTAL_BREAKER_THRESHOLD = config('VIRUSTOTAL_BREAKER_THRESHOLD', default=5, cast=int)
+VIRUSTOTAL_BREAKER_COOLDOWN = config('VIRUSTOTAL_BREAKER_COOLDOWN', default=30, cast=float)
+
+# Server-Timing
+# Adds a Server-Timing header with per-stage durations (extract, clean,
+# encrypt, VirusTotal, ...) to every response; ?timings=1 also puts them in
+# JSON bodies. Exposes internals, so keep it off for public deployments.
+SERVER_TIMING_ENABLED = config('SERVER_TIMING_ENABLED', default=False, cast=bool)
+
+# Logging
+# Records go through a bounded in-memory queue to a background thread that
+# writes JSON lines to stdout, so requests never wait on log I/O (records are
+# dropped and counted if it fills). Each record carries the request id.
+# LOG_SAMPLE_RATE keeps that fraction of requests' INFO/DEBUG lines;
+# warnings and errors are always kept.
+LOG_LEVEL = config('LOG_LEVEL', default='INFO')
+LOG_SAMPLE_RATE = config('LOG_SAMPLE_RATE', default=1.0, cast=float)
+LOG_QUEUE_SIZE = config('LOG_QUEUE_SIZE', default=10000, cast=int)
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'filters': {
+        'request_id': {'()': 'main.utils.log_pipeline.RequestIdFilter'},
+        'sampling': {'()': 'main.utils.log_pipeline.SamplingFilter', 'rate': LOG_SAMPLE_RATE},
+    },
+    'handlers': {
+        'queue': {
+            '()': 'main.utils.log_pipeline.AsyncLogHandler',
+            'queue_size': LOG_QUEUE_SIZE,
+            'filters': ['request_id', 'sampling'],
+        },
+    },
+    'root': {'handlers': ['queue'], 'level': LOG_LEVEL},
+    'loggers': {
+        'django': {'handlers': ['queue'], 'level': LOG_LEVEL, 'propagate': False},
+        # 4xx warnings would repeat main.access; 5xx still logged with the traceback
+        'django.request': {'handlers': ['queue'], 'level': 'ERROR', 'propagate': False},
+    },
+}
+
+# The test runner swaps these handlers for a NullHandler; use -v 2 to see the logs
+TEST_RUNNER = 'main.test_runner.QuietTestRunner'
+
+# Retention, applied by `manage.py purge` (days; 0 disables a rule)
+RETENTION_ANONYMOUS_DAYS = config('RETENTION_ANONYMOUS_DAYS', default=7, cast=int)
+RETENTION_FAILED_DAYS = config('RETENTION_FAILED_DAYS', default=7, cast=int)
+RETENTION_ANALYSIS_DAYS = config('RETENTION_ANALYSIS_DAYS', default=0, cast=int)
+RETENTION_ORIGINAL_FILE_DAYS = config('RETENTION_ORIGINAL_FILE_DAYS', default=30, cast=int)
+RETENTION_CLEANED_FILE_DAYS = config('RETENTION_CLEANED_FILE_DAYS', default=0, cast=int)
+
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
         'rest_framework.authentication.TokenAuthentication',
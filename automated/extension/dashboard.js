@@ -50,27 +50,29 @@ function loadAuthState() {
     });
 }
 
-// -- darsh: Load Dashboard using existing /api/analyses/ endpoint
+// -- darsh: Load Dashboard from /api/stats/ and the first page of /api/analyses/
 async function loadDashboard() {
     showLoading();
 
     try {
-        // Fetch all user's file analyses
-        const response = await fetch(`${API_BASE_URL}/analyses/`, {
-            headers: { 'Authorization': `Token ${authToken}` }
-        });
-
-        if (!response.ok) {
+        // Totals come precomputed from /stats/; only the recent page of analyses is listed
+        const headers = { 'Authorization': `Token ${authToken}` };
+        const [statsResponse, response] = await Promise.all([
+            fetch(`${API_BASE_URL}/stats/`, { headers }),
+            fetch(`${API_BASE_URL}/analyses/`, { headers })
+        ]);
+
+        if (!statsResponse.ok || !response.ok) {
             throw new Error('Failed to fetch data');
         }
 
+        const userStats = await statsResponse.json();
         const data = await response.json();
-        console.log('API Response:', data); // Debug log
 
         // -- darsh: Fetch encrypted count from chrome storage (more reliable)
         chrome.storage.local.get(['encryptedFilesCount'], (result) => {
             const analyses = Array.isArray(data) ? data : (data.results || []);
-            const stats = calculateStats(analyses, result.encryptedFilesCount || 0);
+            const stats = calculateStats(userStats, result.encryptedFilesCount || 0);
             displayDashboard(stats, analyses);
         });
     } catch (error) {
@@ -79,32 +81,16 @@ async function loadDashboard() {
     }
 }
 
-// -- darsh: Calculate stats from analyses array
-function calculateStats(analyses, encryptedCount = 0) {
-    const totalFiles = analyses.length;
-
-    // -- darsh: Count files that have been cleaned (properly check cleaned_file_url)
-    const filesCleaned = analyses.filter(a => a.cleaned_file_url || a.status === 'cleaned').length;
-
-    // -- darsh: Sum all metadata fields found across all files
-    let totalMetadata = 0;
-    analyses.forEach(analysis => {
-        const entries = analysis.metadata_entries || analysis.metadata || [];
-        if (Array.isArray(entries) && entries.length > 0) {
-            totalMetadata += entries.length;
-        } else if (analysis.metadata_count) {
-            totalMetadata += analysis.metadata_count;
-        }
-    });
-
+// Map the server's /stats/ payload to the dashboard counters
+function calculateStats(userStats, encryptedCount = 0) {
     // -- darsh: Use passed encrypted count (from storage)
     const filesEncrypted = encryptedCount || 0;
 
     return {
-        total_files: totalFiles,
-        files_cleaned: filesCleaned,
+        total_files: userStats.total_files || 0,
+        files_cleaned: userStats.by_status?.cleaned || 0,
         files_encrypted: filesEncrypted,
-        total_metadata_removed: totalMetadata
+        total_metadata_removed: userStats.metadata_count || 0
     };
 }
 
@@ -158,32 +144,58 @@ function showComparisonModal(analysis) {
     else if (analysis.risk_score >= 40) riskScore.style.background = '#fef3c7', riskScore.style.color = '#d97706';
     else riskScore.style.background = '#d1fae5', riskScore.style.color = '#059669';
 
-    // Populate table
-    body.innerHTML = '';
-    const metadata = analysis.metadata_entries || analysis.metadata || [];
+    // -- darsh: List rows carry no entries; fetch them from the analysis detail
+    body.innerHTML = modalMessage('Loading metadata...');
+    modal.dataset.analysisId = analysis.id;
+
+    modal.classList.remove('hidden');
+
+    // Close modal handlers
+    const closeModal = () => modal.classList.add('hidden');
+    closeBtn.onclick = closeModal;
+    modal.onclick = (e) => { if (e.target === modal) closeModal(); };
 
-    if (metadata.length === 0) {
-        body.innerHTML = '<tr><td colspan="3" style="text-align:center;padding:20px;color:var(--text-muted);">No metadata found</td></tr>';
+    loadComparisonEntries(analysis.id, modal, body);
+}
+
+async function loadComparisonEntries(analysisId, modal, body) {
+    let metadata;
+    try {
+        const response = await fetch(`${API_BASE_URL}/analyses/${analysisId}/`, {
+            headers: { 'Authorization': `Token ${authToken}` }
+        });
+        if (!response.ok) {
+            throw new Error('Failed to fetch analysis');
+        }
+        metadata = (await response.json()).metadata_entries || [];
+    } catch (error) {
+        console.error('Comparison error:', error);
+        metadata = null;
+    }
+
+    // Another file was opened while this one was loading
+    if (modal.dataset.analysisId !== String(analysisId)) return;
+
+    if (metadata === null) {
+        body.innerHTML = modalMessage('Failed to load metadata');
+    } else if (metadata.length === 0) {
+        body.innerHTML = modalMessage('No metadata found');
     } else {
+        body.innerHTML = '';
         metadata.forEach(entry => {
             const row = document.createElement('tr');
             row.innerHTML = `
-                <td style="font-weight:500;">${entry.key}</td>
-                <td style="color:var(--text-secondary);max-width:150px;overflow:hidden;text-overflow:ellipsis;white-space:nowrap;" title="${entry.value}">${entry.value}</td>
+                <td style="font-weight:500;">${escapeHtml(entry.key)}</td>
+                <td style="color:var(--text-secondary);max-width:150px;overflow:hidden;text-overflow:ellipsis;white-space:nowrap;" title="${escapeHtml(entry.value).replace(/"/g, '&quot;')}">${escapeHtml(entry.value)}</td>
                 <td><span class="status-tag ${entry.is_removed ? 'removed' : 'kept'}">${entry.is_removed ? 'REMOVED' : 'KEPT'}</span></td>
             `;
             body.appendChild(row);
         });
     }
+}
 
-
-
-    modal.classList.remove('hidden');
-
-    // Close modal handlers
-    const closeModal = () => modal.classList.add('hidden');
-    closeBtn.onclick = closeModal;
-    modal.onclick = (e) => { if (e.target === modal) closeModal(); };
+function modalMessage(text) {
+    return `<tr><td colspan="3" style="text-align:center;padding:20px;color:var(--text-muted);">${text}</td></tr>`;
 }
 
 function createRecentItem(analysis) {
@@ -193,13 +205,8 @@ function createRecentItem(analysis) {
     const riskLevel = analysis.risk_score >= 70 ? 'high' : analysis.risk_score >= 40 ? 'medium' : 'low';
     const date = new Date(analysis.created_at).toLocaleDateString();
 
-    // Count metadata
-    let metadataCount = 0;
-    if (analysis.metadata && Array.isArray(analysis.metadata)) {
-        metadataCount = analysis.metadata.length;
-    } else if (analysis.metadata_entries && Array.isArray(analysis.metadata_entries)) {
-        metadataCount = analysis.metadata_entries.length;
-    }
+    // Listing rows carry the count, not the entries
+    const metadataCount = analysis.metadata_count || 0;
 
     item.innerHTML = `
         <svg class="recent-icon" width="20" height="20" viewBox="0 0 24 24" fill="none">
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import FileAnalysis, MetadataEntry, PlatformRule
+from .models import FileAnalysis, MetadataEntry, PlatformRule, UserStats
 
 @admin.register(FileAnalysis)
 class FileAnalysisAdmin(admin.ModelAdmin):
@@ -19,4 +19,10 @@ class MetadataEntryAdmin(admin.ModelAdmin):
 class PlatformRuleAdmin(admin.ModelAdmin):
     list_display = ['platform', 'is_active', 'created_at']
     list_filter = ['is_active', 'platform']
-    search_fields = ['platform', 'description']
\ No newline at end of file
+    search_fields = ['platform', 'description']
+
+@admin.register(UserStats)
+class UserStatsAdmin(admin.ModelAdmin):
+    list_display = ['user', 'total_files', 'cleaned_count', 'failed_count', 'bytes_cleaned', 'updated_at']
+    search_fields = ['user__username']
+    readonly_fields = ['updated_at']
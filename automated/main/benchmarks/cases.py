@@ -0,0 +1,186 @@
+import io
+from cryptography.fernet import Fernet
+from django.core.files.uploadedfile import SimpleUploadedFile
+from main.utils.encryption_handler import EncryptionHandler
+from main.utils.metadata_extractor import MetadataExtractor
+from main.utils.metadata_remover import MetadataRemover
+from main.utils.platform_rules import CompiledRule
+from main.utils.risk_analyzer import RiskAnalyzer
+from .harness import BenchmarkCase
+
+
+PASSWORD = 'Benchmark#Pass1'
+
+
+def drain(output):
+    """Output size in bytes of whatever a handler returned, consuming streams"""
+    if isinstance(output, (bytes, bytearray)):
+        return len(output)
+    if hasattr(output, 'size'):
+        return output.size
+    return sum(len(chunk) for chunk in output)
+
+
+class BenchmarkCases:
+    """
+    Every public MetadataExtractor, MetadataRemover and EncryptionHandler
+    method paired with the corpus inputs it handles. files is
+    SyntheticCorpus.files() output.
+    """
+
+    @staticmethod
+    def all(files):
+        return BenchmarkCases.extractor(files) + BenchmarkCases.remover(files) + BenchmarkCases.encryption(files)
+
+    @staticmethod
+    def by_kind(files):
+        kinds = {}
+        for name, content_type, data in files:
+            kinds[name.rsplit('.', 1)[-1]] = (name, content_type, data)
+        return kinds
+
+    @staticmethod
+    def extractor(files):
+        kinds = BenchmarkCases.by_kind(files)
+        cases = [
+            BenchmarkCase(
+                'MetadataExtractor.extract_metadata', name, data,
+                lambda data, content_type=content_type: len(MetadataExtractor.extract_metadata(io.BytesIO(data), content_type))
+            )
+            for name, content_type, data in files
+        ]
+        for kind in ('jpg', 'png'):
+            name, _, data = kinds[kind]
+            cases.append(BenchmarkCase(
+                'MetadataExtractor.extract_image_metadata', name, data,
+                lambda data: len(MetadataExtractor.extract_image_metadata(io.BytesIO(data)))
+            ))
+        name, _, data = kinds['pdf']
+        cases.append(BenchmarkCase(
+            'MetadataExtractor.extract_pdf_metadata', name, data,
+            lambda data: len(MetadataExtractor.extract_pdf_metadata(io.BytesIO(data)))
+        ))
+        name, content_type, data = kinds['jpg']
+        cases.append(BenchmarkCase(
+            'MetadataExtractor.categorize_metadata', name, data,
+            lambda metadata: [MetadataExtractor.categorize_metadata(k, v) for k, v in metadata.items()] and None,
+            setup=lambda data: MetadataExtractor.extract_metadata(io.BytesIO(data), content_type),
+        ))
+        return cases
+
+    @staticmethod
+    def remover(files):
+        kinds = BenchmarkCases.by_kind(files)
+        cases = []
+        for kind, image_format in (('jpg', 'JPEG'), ('png', 'PNG')):
+            name, _, data = kinds[kind]
+            cases.append(BenchmarkCase(
+                'MetadataRemover.remove_from_image', name, data,
+                lambda data, image_format=image_format: drain(MetadataRemover.remove_from_image(io.BytesIO(data), image_format))
+            ))
+        for kind, method in (('pdf', MetadataRemover.remove_from_pdf), ('docx', MetadataRemover.remove_from_docx),
+                             ('pptx', MetadataRemover.remove_from_pptx)):
+            name, _, data = kinds[kind]
+            cases.append(BenchmarkCase(
+                f'MetadataRemover.{method.__name__}', name, data,
+                lambda data, method=method: drain(method(io.BytesIO(data)))
+            ))
+        name, _, data = kinds['mp4']
+        cases.append(BenchmarkCase(
+            'MetadataRemover.remove_from_video', name, data,
+            lambda data, name=name: drain(MetadataRemover.remove_from_video(io.BytesIO(data), name))
+        ))
+        for name, content_type, data in files:
+            cases.append(BenchmarkCase(
+                'MetadataRemover.remove_metadata', name, data,
+                lambda data, name=name, content_type=content_type: drain(
+                    MetadataRemover.remove_metadata(io.BytesIO(data), content_type, name)
+                )
+            ))
+        rule = CompiledRule('instagram', RiskAnalyzer.PLATFORM_RISKY_KEYS['instagram'])
+        for kind in ('jpg', 'png', 'pdf'):
+            name, content_type, data = kinds[kind]
+            cases.append(BenchmarkCase(
+                'MetadataRemover.remove_selective_metadata', name, data,
+                lambda data, name=name, content_type=content_type: drain(
+                    MetadataRemover.remove_selective_metadata(io.BytesIO(data), content_type, rule, name)
+                )
+            ))
+        return cases
+
+    @staticmethod
+    def legacy_fernet(data, filename):
+        """A file in the pre-v2 layout: salt + filename length + filename + Fernet token"""
+        key, salt = EncryptionHandler.generate_key_from_password(PASSWORD)
+        encoded = filename.encode('utf-8')
+        return salt + len(encoded).to_bytes(2, 'big') + encoded + Fernet(key).encrypt(data)
+
+    @staticmethod
+    def encryption(files):
+        kinds = BenchmarkCases.by_kind(files)
+        photo_name, _, photo = kinds['jpg']
+        pdf_name, _, pdf = kinds['pdf']
+
+        def v2_container(data):
+            stream, _ = EncryptionHandler.encrypt_file_stream(io.BytesIO(data), PASSWORD, photo_name, len(data))
+            return b''.join(stream)
+
+        def extension_container(data):
+            stream, _ = EncryptionHandler.encrypt_file_stream(io.BytesIO(data), PASSWORD, photo_name, len(data), 'extension')
+            return b''.join(stream)
+
+        def seekable(data):
+            container = v2_container(data)
+            return container, EncryptionHandler.open_seekable_file(io.BytesIO(container), PASSWORD)
+
+        def uploads(data):
+            return [SimpleUploadedFile(name, content) for name, _, content in files if name.endswith(('.jpg', '.docx', '.pptx'))]
+
+        def archive(uploaded):
+            for upload in uploaded:
+                upload.seek(0)
+            return drain(EncryptionHandler.encrypt_files_archive(uploaded, PASSWORD))
+
+        middle = len(photo) // 2
+        range_end = min(middle + 1024 * 1024, len(photo)) - 1
+        return [
+            BenchmarkCase('EncryptionHandler.generate_key_from_password', 'password', b'',
+                          lambda data: len(EncryptionHandler.generate_key_from_password(PASSWORD)[0])),
+            BenchmarkCase('EncryptionHandler.encrypt_file', photo_name, photo,
+                          lambda data: drain(EncryptionHandler.encrypt_file(io.BytesIO(data), PASSWORD, photo_name))),
+            BenchmarkCase('EncryptionHandler.encrypt_file_stream', photo_name, photo,
+                          lambda data: drain(EncryptionHandler.encrypt_file_stream(io.BytesIO(data), PASSWORD, photo_name, len(data))[0])),
+            BenchmarkCase('EncryptionHandler.encrypt_file_stream', f'{photo_name} (extension)', photo,
+                          lambda data: drain(EncryptionHandler.encrypt_file_stream(io.BytesIO(data), PASSWORD, photo_name, len(data), 'extension')[0])),
+            BenchmarkCase('EncryptionHandler.encrypt_files_archive', 'jpg+docx+pptx', photo + kinds['docx'][2] + kinds['pptx'][2],
+                          archive, setup=uploads),
+            BenchmarkCase('EncryptionHandler.is_legacy_fernet_file', photo_name, photo,
+                          lambda container: EncryptionHandler.is_legacy_fernet_file(io.BytesIO(container)) and None, setup=v2_container),
+            BenchmarkCase('EncryptionHandler.open_encrypted_file', photo_name, photo,
+                          lambda container: drain(EncryptionHandler.open_encrypted_file(io.BytesIO(container), PASSWORD)[2]),
+                          setup=v2_container),
+            BenchmarkCase('EncryptionHandler.open_encrypted_file', f'{photo_name} (extension)', photo,
+                          lambda container: drain(EncryptionHandler.open_encrypted_file(io.BytesIO(container), PASSWORD)[2]),
+                          setup=extension_container),
+            BenchmarkCase('EncryptionHandler.open_seekable_file', photo_name, photo,
+                          lambda container: len(EncryptionHandler.open_seekable_file(io.BytesIO(container), PASSWORD)),
+                          setup=v2_container),
+            BenchmarkCase('EncryptionHandler.decrypt_range', photo_name, photo,
+                          lambda prepared: drain(EncryptionHandler.decrypt_range(io.BytesIO(prepared[0]), prepared[1], middle, range_end)),
+                          setup=seekable, input_bytes=range_end - middle + 1),
+            BenchmarkCase('EncryptionHandler.decrypt_file', photo_name, photo,
+                          lambda container: drain(EncryptionHandler.decrypt_file(io.BytesIO(container), PASSWORD)[0]),
+                          setup=lambda data: BenchmarkCases.legacy_fernet(data, photo_name)),
+            BenchmarkCase('EncryptionHandler.password_protect_pdf', pdf_name, pdf,
+                          lambda data: drain(EncryptionHandler.password_protect_pdf(io.BytesIO(data), PASSWORD))),
+            BenchmarkCase('EncryptionHandler.password_protect_pdf_stream', pdf_name, pdf,
+                          lambda data: drain(EncryptionHandler.password_protect_pdf_stream(io.BytesIO(data), PASSWORD)[0])),
+            BenchmarkCase('EncryptionHandler.create_password_protected_zip', photo_name, photo,
+                          lambda data: drain(EncryptionHandler.create_password_protected_zip(io.BytesIO(data), photo_name, PASSWORD))),
+            BenchmarkCase('EncryptionHandler.create_password_protected_zip_stream', photo_name, photo,
+                          lambda data: drain(EncryptionHandler.create_password_protected_zip_stream([(photo_name, io.BytesIO(data))], PASSWORD))),
+        ] + [
+            BenchmarkCase('EncryptionHandler.protect_file', f'{name} ({method})', data,
+                          lambda data, name=name, method=method: drain(EncryptionHandler.protect_file(io.BytesIO(data), name, PASSWORD, method)))
+            for method, name, data in (('encrypt', photo_name, photo), ('pdf', pdf_name, pdf), ('zip', photo_name, photo))
+        ]
@@ -0,0 +1,246 @@
+import hashlib
+import io
+import json
+import os
+import random
+import struct
+import zipfile
+import numpy as np
+from datetime import datetime
+from PIL import Image
+
+try:
+    import pikepdf
+    PIKEPDF_AVAILABLE = True
+except ImportError:
+    PIKEPDF_AVAILABLE = False
+
+
+# Every timestamp written into the corpus, so files are identical run to run
+FIXED_DATE = datetime(2024, 1, 1, 12, 0, 0)
+ZIP_DATE = FIXED_DATE.timetuple()[:6]
+# 2024-01-01 in MP4 time (seconds since 1904-01-01)
+MP4_EPOCH_DATE = 3786955200
+
+XMP_PACKET = '''<?xpacket begin="﻿" id="W5M0MpCehiHzreSzNTczkc9d"?>
+<x:xmpmeta xmlns:x="adobe:ns:meta/">
+ <rdf:RDF xmlns:rdf="http://www.w3.org/1999/02/22-rdf-syntax-ns#">
+  <rdf:Description rdf:about=""
+    xmlns:dc="http://purl.org/dc/elements/1.1/"
+    xmlns:xmp="http://ns.adobe.com/xap/1.0/"
+    xmlns:photoshop="http://ns.adobe.com/photoshop/1.0/"
+    xmp:CreatorTool="Benchmark Studio 4.2"
+    xmp:CreateDate="2024-01-01T12:00:00"
+    photoshop:City="Lisbon"
+    photoshop:Country="Portugal">
+   <dc:creator><rdf:Seq><rdf:li>Jane Doe</rdf:li></rdf:Seq></dc:creator>
+   <dc:rights><rdf:Alt><rdf:li xml:lang="x-default">(c) Jane Doe</rdf:li></rdf:Alt></dc:rights>
+  </rdf:Description>
+ </rdf:RDF>
+</x:xmpmeta>
+<?xpacket end="w"?>'''
+
+
+class SyntheticCorpus:
+    """
+    Deterministic benchmark inputs: the same seed and scale always produce
+    byte-identical files (checked through the manifest's sha256), so results
+    from different releases compare the same work.
+
+    scale multiplies image dimensions, page and slide counts; 1.0 is sized
+    like real uploads (multi-megapixel photos, a 300-page PDF).
+    """
+
+    def __init__(self, seed=1234, scale=1.0):
+        self.seed = seed
+        self.scale = scale
+
+    def scaled(self, value, minimum=1):
+        return max(minimum, int(round(value * self.scale)))
+
+    def pixels(self, width, height, salt):
+        """A smooth gradient with noise: compresses like a photo, not like a flat colour"""
+        rng = np.random.default_rng([self.seed, salt])
+        y, x = np.mgrid[0:height, 0:width]
+        base = np.stack([x * 255 // max(width - 1, 1), y * 255 // max(height - 1, 1), (x + y) % 256], axis=-1)
+        noise = rng.integers(-24, 24, size=(height, width, 3))
+        return Image.fromarray(np.clip(base + noise, 0, 255).astype(np.uint8), 'RGB')
+
+    def exif(self):
+        exif = Image.Exif()
+        exif[0x010F] = 'Canon'  # Make
+        exif[0x0110] = 'Canon EOS R5'  # Model
+        exif[0x0131] = 'Benchmark Studio 4.2'  # Software
+        exif[0x0132] = '2024:01:01 12:00:00'  # DateTime
+        exif[0x013B] = 'Jane Doe'  # Artist
+        exif[0x8298] = '(c) Jane Doe'  # Copyright
+        exif[0x0112] = 1  # Orientation
+        sub = exif.get_ifd(0x8769)
+        sub[0x9003] = '2024:01:01 12:00:00'  # DateTimeOriginal
+        sub[0x829D] = 2.8  # FNumber
+        sub[0x8827] = 400  # ISOSpeedRatings
+        sub[0xA431] = '032024001234'  # BodySerialNumber
+        sub[0x927C] = bytes(random.Random(self.seed).getrandbits(8) for _ in range(2048))  # MakerNote
+        gps = exif.get_ifd(0x8825)
+        gps[1], gps[2] = 'N', (38.0, 42.0, 49.38)
+        gps[3], gps[4] = 'W', (9.0, 8.0, 21.44)
+        gps[5], gps[6] = 0, 112.5
+        return exif
+
+    def jpeg(self, width, height, salt=1):
+        output = io.BytesIO()
+        self.pixels(width, height, salt).save(output, format='JPEG', quality=90, exif=self.exif().tobytes())
+        data = output.getvalue()
+        # Pillow 9 has no xmp= argument: insert the APP1 XMP segment after EXIF
+        packet = b'http://ns.adobe.com/xap/1.0/\x00' + XMP_PACKET.encode('utf-8')
+        exif_end = 4 + struct.unpack('>H', data[4:6])[0]
+        return data[:exif_end] + b'\xff\xe1' + struct.pack('>H', len(packet) + 2) + packet + data[exif_end:]
+
+    def png(self, width, height, salt=2):
+        from PIL.PngImagePlugin import PngInfo
+        info = PngInfo()
+        info.add_text('Author', 'Jane Doe')
+        info.add_text('Software', 'Benchmark Studio 4.2')
+        info.add_itxt('XML:com.adobe.xmp', XMP_PACKET)
+        output = io.BytesIO()
+        self.pixels(width, height, salt).save(output, format='PNG', pnginfo=info, exif=self.exif().tobytes())
+        return output.getvalue()
+
+    def pdf(self, pages):
+        if not PIKEPDF_AVAILABLE:
+            from PyPDF2 import PdfWriter
+            writer = PdfWriter()
+            for _ in range(pages):
+                writer.add_blank_page(width=595, height=842)
+            writer.add_metadata({'/Author': 'Jane Doe', '/Creator': 'Benchmark Studio 4.2', '/CreationDate': 'D:20240101120000'})
+            output = io.BytesIO()
+            writer.write(output)
+            return output.getvalue()
+
+        pdf = pikepdf.new()
+        font = pdf.make_indirect(pikepdf.Dictionary(
+            Type=pikepdf.Name.Font, Subtype=pikepdf.Name.Type1, BaseFont=pikepdf.Name.Helvetica
+        ))
+        for number in range(pages):
+            lines = b''.join(b'(Page %d line %d: quarterly report draft) Tj 0 -14 Td ' % (number, line) for line in range(40))
+            pdf.pages.append(pikepdf.Page(pikepdf.Dictionary(
+                Type=pikepdf.Name.Page,
+                MediaBox=[0, 0, 595, 842],
+                Resources=pikepdf.Dictionary(Font=pikepdf.Dictionary(F1=font)),
+                Contents=pdf.make_stream(b'BT /F1 11 Tf 50 780 Td ' + lines + b'ET'),
+            )))
+        pdf.docinfo['/Author'] = 'Jane Doe'
+        pdf.docinfo['/Creator'] = 'Benchmark Studio 4.2'
+        pdf.docinfo['/Producer'] = 'Benchmark PDF Library'
+        pdf.docinfo['/CreationDate'] = 'D:20240101120000'
+        pdf.Root.Metadata = pdf.make_stream(XMP_PACKET.encode('utf-8'))
+        pdf.Root.Metadata.Type = pikepdf.Name.Metadata
+        pdf.Root.Metadata.Subtype = pikepdf.Name.XML
+        output = io.BytesIO()
+        pdf.save(output, deterministic_id=True)
+        return output.getvalue()
+
+    def photos(self, count, salt):
+        return [self.jpeg(self.scaled(800, 16), self.scaled(600, 16), salt + index) for index in range(count)]
+
+    def docx(self, photos=4):
+        from docx import Document
+        from docx.shared import Inches
+        document = Document()
+        self.set_core_properties(document.core_properties)
+        for index, photo in enumerate(self.photos(photos, 100)):
+            document.add_heading(f'Site visit {index + 1}', level=1)
+            document.add_paragraph('Photo taken on location; see attached report. ' * 20)
+            document.add_picture(io.BytesIO(photo), width=Inches(5))
+        output = io.BytesIO()
+        document.save(output)
+        return self.normalize_zip(output.getvalue())
+
+    def pptx(self, slides=4):
+        from pptx import Presentation
+        from pptx.util import Inches
+        presentation = Presentation()
+        self.set_core_properties(presentation.core_properties)
+        for index, photo in enumerate(self.photos(slides, 200)):
+            slide = presentation.slides.add_slide(presentation.slide_layouts[5])
+            slide.shapes.title.text = f'Quarterly review {index + 1}'
+            slide.shapes.add_picture(io.BytesIO(photo), Inches(1), Inches(1.5), width=Inches(8))
+        output = io.BytesIO()
+        presentation.save(output)
+        return self.normalize_zip(output.getvalue())
+
+    def set_core_properties(self, properties):
+        properties.author = 'Jane Doe'
+        properties.last_modified_by = 'Jane Doe'
+        properties.comments = 'Internal draft'
+        properties.created = FIXED_DATE
+        properties.modified = FIXED_DATE
+        properties.last_printed = FIXED_DATE
+
+    def normalize_zip(self, data):
+        """Office writers stamp members with the current time; rewrite with a fixed one"""
+        output = io.BytesIO()
+        with zipfile.ZipFile(io.BytesIO(data)) as source, zipfile.ZipFile(output, 'w', zipfile.ZIP_DEFLATED) as target:
+            for info in source.infolist():
+                member = zipfile.ZipInfo(info.filename, date_time=ZIP_DATE)
+                member.compress_type = zipfile.ZIP_DEFLATED
+                target.writestr(member, source.read(info))
+        return output.getvalue()
+
+    def mp4(self, payload_size):
+        """
+        ISO BMFF container with iTunes-style metadata (title, artist, date,
+        GPS) and a deterministic mdat payload. It has no decodable track, so
+        it exercises container parsing and copying rather than a codec.
+        """
+        def box(kind, *parts):
+            body = b''.join(parts)
+            return struct.pack('>I4s', 8 + len(body), kind) + body
+
+        def text(kind, value):
+            return box(kind, box(b'data', struct.pack('>II', 1, 0), value.encode('utf-8')))
+
+        identity = struct.pack('>9i', 0x10000, 0, 0, 0, 0x10000, 0, 0, 0, 0x40000000)
+        mvhd = box(b'mvhd', struct.pack('>IIIII', 0, MP4_EPOCH_DATE, MP4_EPOCH_DATE, 1000, 10000),
+                   struct.pack('>IH', 0x10000, 0x100), bytes(10), identity, bytes(24), struct.pack('>I', 2))
+        ilst = box(
+            b'ilst',
+            text(b'\xa9nam', 'Site visit'),
+            text(b'\xa9ART', 'Jane Doe'),
+            text(b'\xa9day', '2024-01-01T12:00:00Z'),
+            text(b'\xa9too', 'Benchmark Studio 4.2'),
+            text(b'\xa9xyz', '+38.7137-009.1393/'),
+        )
+        hdlr = box(b'hdlr', bytes(8), b'mdir', b'appl', bytes(9))
+        udta = box(b'udta', box(b'meta', bytes(4), hdlr, ilst))
+        payload = np.random.default_rng([self.seed, 5]).bytes(payload_size)
+        return box(b'ftyp', b'isom', struct.pack('>I', 512), b'isomiso2mp41') + box(b'moov', mvhd, udta) + box(b'mdat', payload)
+
+    def files(self):
+        """[(name, content type, bytes)] for the whole corpus"""
+        return [
+            ('photo_exif_gps.jpg', 'image/jpeg', self.jpeg(self.scaled(3000, 16), self.scaled(2000, 16))),
+            ('large.png', 'image/png', self.png(self.scaled(2400, 16), self.scaled(1600, 16))),
+            ('report_xmp.pdf', 'application/pdf', self.pdf(self.scaled(300))),
+            ('site_visit.docx', 'application/vnd.openxmlformats-officedocument.wordprocessingml.document', self.docx()),
+            ('review.pptx', 'application/vnd.openxmlformats-officedocument.presentationml.presentation', self.pptx()),
+            ('clip.mp4', 'video/mp4', self.mp4(self.scaled(2 * 1024 * 1024, 4096))),
+        ]
+
+    def build(self, directory):
+        """Write the corpus and manifest.json into directory; returns the manifest"""
+        os.makedirs(directory, exist_ok=True)
+        entries = []
+        for name, content_type, data in self.files():
+            with open(os.path.join(directory, name), 'wb') as f:
+                f.write(data)
+            entries.append({
+                'name': name,
+                'content_type': content_type,
+                'size': len(data),
+                'sha256': hashlib.sha256(data).hexdigest(),
+            })
+        manifest = {'seed': self.seed, 'scale': self.scale, 'files': entries}
+        with open(os.path.join(directory, 'manifest.json'), 'w') as f:
+            json.dump(manifest, f, indent=2)
+        return manifest
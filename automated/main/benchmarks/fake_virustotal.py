@@ -0,0 +1,185 @@
+import hashlib
+import json
+import random
+import re
+import sys
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+EICAR = b'X5O!P%@AP[4\\PZX54(P^)7CC)7}$EICAR-STANDARD-ANTIVIRUS-TEST-FILE!$H+H*'
+
+ANALYSIS_PATH = re.compile(r'^(?:/api/v3)?/analyses/([\w=-]+)$')
+FILES_PATH = re.compile(r'^(?:/api/v3)?/files$')
+
+
+class QuietHTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # Clients that time out or give up hang up mid-reply; that is expected here
+        if isinstance(sys.exc_info()[1], (BrokenPipeError, ConnectionResetError)):
+            return
+        super().handle_error(request, client_address)
+
+
+class FakeVirusTotalServer:
+    """
+    Local stand-in for the two VirusTotal v3 endpoints the analyze view
+    uses (POST /files, GET /analyses/<id>), for tests and load runs.
+
+    - latency/jitter: seconds added to every response
+    - malicious_rate: fraction of uploads reported malicious, chosen from
+      the file's sha256 so a file always gets the same verdict; files
+      containing the EICAR test string are always malicious
+    - pending_polls: how many polls of an analysis answer 'queued' first
+    - error_rate: fraction of requests answered 429 or 503
+
+    Point the app at it with VIRUSTOTAL_BASE_URL=<server.url>.
+    """
+
+    def __init__(self, host='127.0.0.1', port=0, latency=0.0, jitter=0.0, malicious_rate=0.0,
+                 pending_polls=0, error_rate=0.0, seed=1234):
+        self.latency = latency
+        self.jitter = jitter
+        self.malicious_rate = malicious_rate
+        self.pending_polls = pending_polls
+        self.error_rate = error_rate
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.analyses = {}
+        self.counts = {'uploads': 0, 'polls': 0, 'errors': 0}
+        self.httpd = QuietHTTPServer((host, port), self.handler_class())
+        self.thread = None
+
+    @property
+    def url(self):
+        host, port = self.httpd.server_address[:2]
+        return f'http://{host}:{port}/api/v3'
+
+    def start(self):
+        self.thread = threading.Thread(target=self.httpd.serve_forever, name='fake-virustotal', daemon=True)
+        self.thread.start()
+        return self
+
+    def serve_forever(self):
+        self.httpd.serve_forever()
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+        if self.thread is not None:
+            self.thread.join()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def delay(self):
+        """Sleep the configured latency; returns an injected error status or None"""
+        with self.lock:
+            pause = self.latency + (self.random.uniform(0, self.jitter) if self.jitter else 0)
+            error = None
+            if self.error_rate and self.random.random() < self.error_rate:
+                error = self.random.choice([429, 503])
+                self.counts['errors'] += 1
+        if pause:
+            time.sleep(pause)
+        return error
+
+    def verdict(self, content):
+        if EICAR in content:
+            return True
+        digest = hashlib.sha256(content).digest()
+        return int.from_bytes(digest[:4], 'big') / 0xFFFFFFFF < self.malicious_rate
+
+    @staticmethod
+    def file_content(body, content_type):
+        """The 'file' part of a multipart upload (the whole body if it is not multipart)"""
+        match = re.search(r'boundary="?([^";]+)"?', content_type or '')
+        if not match:
+            return body
+        for part in body.split(b'--' + match.group(1).encode()):
+            headers, _, content = part.partition(b'\r\n\r\n')
+            if b'name="file"' in headers:
+                return content[:-2] if content.endswith(b'\r\n') else content
+        return body
+
+    def upload(self, content):
+        analysis_id = uuid.uuid4().hex
+        with self.lock:
+            self.analyses[analysis_id] = {'malicious': self.verdict(content), 'polls': 0}
+            self.counts['uploads'] += 1
+        return {'data': {'type': 'analysis', 'id': analysis_id}}
+
+    def poll(self, analysis_id):
+        with self.lock:
+            analysis = self.analyses.get(analysis_id)
+            if analysis is None:
+                return None
+            analysis['polls'] += 1
+            self.counts['polls'] += 1
+            completed = analysis['polls'] > self.pending_polls
+        stats = {'harmless': 0, 'malicious': 0, 'suspicious': 0, 'undetected': 0, 'timeout': 0}
+        if completed:
+            stats['malicious' if analysis['malicious'] else 'undetected'] = 60 if analysis['malicious'] else 70
+        return {'data': {'type': 'analysis', 'id': analysis_id, 'attributes': {
+            'status': 'completed' if completed else 'queued',
+            'stats': stats,
+        }}}
+
+    def handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, format, *args):
+                pass
+
+            def reply(self, status, body):
+                data = json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                try:
+                    self.end_headers()
+                    self.wfile.write(data)
+                except (BrokenPipeError, ConnectionResetError):
+                    # The client timed out and went away
+                    self.close_connection = True
+
+            def check(self):
+                if not self.headers.get('x-apikey'):
+                    self.reply(401, {'error': {'code': 'AuthenticationRequiredError', 'message': 'x-apikey header is missing'}})
+                    return False
+                status = server.delay()
+                if status:
+                    code = 'QuotaExceededError' if status == 429 else 'TransientError'
+                    self.reply(status, {'error': {'code': code, 'message': 'Injected failure'}})
+                    return False
+                return True
+
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get('Content-Length') or 0))
+                if not FILES_PATH.match(self.path.split('?')[0]):
+                    return self.reply(404, {'error': {'code': 'NotFoundError', 'message': self.path}})
+                if self.check():
+                    self.reply(200, server.upload(server.file_content(body, self.headers.get('Content-Type'))))
+
+            def do_GET(self):
+                match = ANALYSIS_PATH.match(self.path.split('?')[0])
+                if not match:
+                    return self.reply(404, {'error': {'code': 'NotFoundError', 'message': self.path}})
+                if not self.check():
+                    return
+                result = server.poll(match.group(1))
+                if result is None:
+                    return self.reply(404, {'error': {'code': 'NotFoundError', 'message': 'Unknown analysis'}})
+                self.reply(200, result)
+
+        return Handler
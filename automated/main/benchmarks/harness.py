@@ -0,0 +1,213 @@
+import gc
+import json
+import multiprocessing
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+import numpy as np
+from datetime import datetime, timezone
+from importlib import metadata
+
+try:
+    import resource
+    RESOURCE_AVAILABLE = True
+except ImportError:
+    RESOURCE_AVAILABLE = False
+
+
+SCHEMA_VERSION = 1
+
+# Distributions whose versions go into every result file
+PACKAGES = ('Django', 'Pillow', 'PyPDF2', 'pikepdf', 'python-docx', 'python-pptx', 'cryptography', 'numpy', 'pyminizip')
+
+
+class BenchmarkCase:
+    """
+    One method on one input. setup(data) runs untimed before the first
+    call and its result is what func receives; func returns the output size
+    in bytes (or None). input_bytes, for throughput, defaults to len(data).
+    """
+
+    def __init__(self, name, input_name, data, func, setup=None, input_bytes=None):
+        self.name = name
+        self.input_name = input_name
+        self.data = data
+        self.func = func
+        self.setup = setup
+        self.input_bytes = len(data or b'') if input_bytes is None else input_bytes
+
+    @property
+    def key(self):
+        return f'{self.name}[{self.input_name}]'
+
+
+class BenchmarkHarness:
+    """
+    Times BenchmarkCases and reports latency percentiles, throughput and
+    memory as JSON-ready dicts.
+
+    Each case runs in a forked child by default, so its peak RSS (which
+    includes C allocations from Pillow, pikepdf, cryptography, ...) is its
+    own and one case's leftovers cannot slow the next. The Python heap peak
+    comes from a separate tracemalloc run, since tracing skews the timings.
+    """
+
+    @staticmethod
+    def measure(case, iterations=10, warmup=1, max_seconds=30.0):
+        """Run a case in this process; returns its result dict"""
+        result = {'name': case.name, 'input': case.input_name, 'input_bytes': case.input_bytes}
+        try:
+            argument = case.setup(case.data) if case.setup else case.data
+            rss_start = BenchmarkHarness.current_rss()
+
+            for _ in range(warmup):
+                case.func(argument)
+
+            timings = []
+            output_bytes = None
+            started = time.perf_counter()
+            for index in range(iterations):
+                gc.collect()
+                start = time.perf_counter()
+                output_bytes = case.func(argument)
+                timings.append(time.perf_counter() - start)
+                # Slow cases stop early, but never below three samples
+                if index >= 2 and time.perf_counter() - started > max_seconds:
+                    break
+
+            tracemalloc.start()
+            case.func(argument)
+            _, heap_peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+        except Exception as e:
+            result.update({'status': 'error', 'error': f'{type(e).__name__}: {e}'})
+            return result
+
+        timings = np.array(timings) * 1000
+        mean = float(timings.mean())
+        result.update({
+            'status': 'ok',
+            'iterations': len(timings),
+            'latency_ms': {
+                'min': round(float(timings.min()), 3),
+                'mean': round(mean, 3),
+                'p50': round(float(np.percentile(timings, 50)), 3),
+                'p90': round(float(np.percentile(timings, 90)), 3),
+                'p99': round(float(np.percentile(timings, 99)), 3),
+                'max': round(float(timings.max()), 3),
+            },
+            'ops_per_s': round(1000 / mean, 2) if mean else None,
+            'throughput_mb_s': round(result['input_bytes'] / 1024 / 1024 / (mean / 1000), 2) if mean and result['input_bytes'] else None,
+            'output_bytes': output_bytes,
+            'peak_heap_mb': round(heap_peak / 1024 / 1024, 2),
+        })
+        peak_rss = BenchmarkHarness.peak_rss()
+        if peak_rss is not None:
+            result['peak_rss_mb'] = round(peak_rss / 1024 / 1024, 2)
+            if rss_start is not None:
+                result['rss_growth_mb'] = round(max(0, peak_rss - rss_start) / 1024 / 1024, 2)
+        return result
+
+    @staticmethod
+    def run(case, isolate=True, **options):
+        """measure() in a forked child when isolate and fork are available"""
+        if not isolate or 'fork' not in multiprocessing.get_all_start_methods():
+            return BenchmarkHarness.measure(case, **options)
+
+        receiver, sender = multiprocessing.Pipe(duplex=False)
+        process = multiprocessing.get_context('fork').Process(
+            target=BenchmarkHarness._child, args=(sender, case, options), daemon=True
+        )
+        process.start()
+        sender.close()
+        try:
+            result = receiver.recv()
+        except EOFError:
+            result = {'name': case.name, 'input': case.input_name, 'input_bytes': case.input_bytes,
+                      'status': 'error', 'error': f'Benchmark process died (exit code {process.exitcode})'}
+        process.join()
+        return result
+
+    @staticmethod
+    def _child(sender, case, options):
+        try:
+            sender.send(BenchmarkHarness.measure(case, **options))
+        finally:
+            sender.close()
+
+    @staticmethod
+    def current_rss():
+        """Resident set size in bytes, or None where /proc is missing"""
+        if not RESOURCE_AVAILABLE:
+            return None
+        try:
+            with open('/proc/self/statm') as f:
+                return int(f.read().split()[1]) * resource.getpagesize()
+        except OSError:
+            return None
+
+    @staticmethod
+    def peak_rss():
+        """Peak resident set size of this process in bytes, or None"""
+        if not RESOURCE_AVAILABLE:
+            return None
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # kilobytes on Linux, bytes on macOS
+        return peak if sys.platform == 'darwin' else peak * 1024
+
+    @staticmethod
+    def environment():
+        packages = {}
+        for name in PACKAGES:
+            try:
+                packages[name] = metadata.version(name)
+            except metadata.PackageNotFoundError:
+                packages[name] = None
+        try:
+            commit = subprocess.run(
+                ['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, check=True
+            ).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            commit = None
+        return {
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'machine': platform.machine(),
+            'cpu_count': multiprocessing.cpu_count(),
+            'git_commit': commit,
+            'packages': packages,
+        }
+
+    @staticmethod
+    def report(results, manifest, options):
+        return {
+            'schema': SCHEMA_VERSION,
+            'created_at': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+            'environment': BenchmarkHarness.environment(),
+            'options': options,
+            'corpus': manifest,
+            'results': results,
+        }
+
+    @staticmethod
+    def compare(results, baseline):
+        """[(key, baseline p50, current p50, percent change)] for cases present in both runs"""
+        previous = {
+            f"{r['name']}[{r['input']}]": r['latency_ms']['p50']
+            for r in baseline.get('results', []) if r.get('status') == 'ok'
+        }
+        rows = []
+        for result in results:
+            key = f"{result['name']}[{result['input']}]"
+            if result.get('status') != 'ok' or key not in previous:
+                continue
+            before, after = previous[key], result['latency_ms']['p50']
+            rows.append((key, before, after, (after - before) / before * 100 if before else None))
+        return rows
+
+    @staticmethod
+    def load(path):
+        with open(path) as f:
+            return json.load(f)
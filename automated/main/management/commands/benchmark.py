@@ -0,0 +1,92 @@
+import json
+import os
+import tempfile
+import time
+from django.core.management.base import BaseCommand, CommandError
+from main.benchmarks.cases import BenchmarkCases
+from main.benchmarks.corpus import SyntheticCorpus
+from main.benchmarks.harness import BenchmarkHarness
+
+
+class Command(BaseCommand):
+    help = (
+        'Benchmark every MetadataExtractor, MetadataRemover and EncryptionHandler method '
+        'on a deterministic synthetic corpus and write the results as JSON'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', default='benchmark-results.json', help='Where to write the JSON results')
+        parser.add_argument('--iterations', type=int, default=10, help='Timed runs per case')
+        parser.add_argument('--warmup', type=int, default=1, help='Untimed runs per case')
+        parser.add_argument('--max-seconds', type=float, default=30.0, help='Stop timing a case after this long (min 3 runs)')
+        parser.add_argument('--seed', type=int, default=1234, help='Corpus seed')
+        parser.add_argument('--scale', type=float, default=1.0, help='Corpus size factor (images, pages, payloads)')
+        parser.add_argument('--only', action='append', default=[], help='Run cases whose name contains this (repeatable)')
+        parser.add_argument('--corpus-dir', help='Keep the generated corpus and its manifest here')
+        parser.add_argument('--no-isolate', action='store_true', help='Run cases in this process instead of one fork each')
+        parser.add_argument('--compare', help='Earlier results file; prints the p50 change per case')
+
+    def handle(self, *args, **options):
+        baseline = None
+        if options['compare']:
+            try:
+                baseline = BenchmarkHarness.load(options['compare'])
+            except (OSError, ValueError) as e:
+                raise CommandError(f"Cannot read {options['compare']}: {e}")
+
+        start = time.perf_counter()
+        corpus = SyntheticCorpus(options['seed'], options['scale'])
+        files = corpus.files()
+        with tempfile.TemporaryDirectory() as directory:
+            manifest = corpus.build(options['corpus_dir'] or directory)
+        self.stdout.write(
+            f"Corpus (seed {options['seed']}, scale {options['scale']}) built in {time.perf_counter() - start:.1f}s: "
+            + ', '.join(f"{entry['name']} {entry['size'] / 1024 / 1024:.1f} MB" for entry in manifest['files'])
+        )
+
+        cases = BenchmarkCases.all(files)
+        if options['only']:
+            cases = [case for case in cases if any(term in case.key for term in options['only'])]
+        if not cases:
+            raise CommandError('No cases match --only')
+
+        self.stdout.write(
+            f"\n{'case':<72}{'p50 ms':>10}{'p99 ms':>10}{'MB/s':>9}{'heap MB':>9}{'RSS MB':>9}"
+        )
+        results = []
+        for case in cases:
+            result = BenchmarkHarness.run(
+                case, isolate=not options['no_isolate'], iterations=options['iterations'],
+                warmup=options['warmup'], max_seconds=options['max_seconds']
+            )
+            results.append(result)
+            if result['status'] != 'ok':
+                self.stdout.write(self.style.WARNING(f"{case.key:<72}  {result['error'][:120]}"))
+                continue
+            latency = result['latency_ms']
+            self.stdout.write(
+                f"{case.key:<72}{latency['p50']:>10.2f}{latency['p99']:>10.2f}"
+                f"{result['throughput_mb_s'] or 0:>9.1f}{result['peak_heap_mb']:>9.1f}{result.get('peak_rss_mb', 0):>9.1f}"
+            )
+
+        report = BenchmarkHarness.report(results, manifest, {
+            key: options[key] for key in ('iterations', 'warmup', 'max_seconds', 'seed', 'scale', 'only', 'no_isolate')
+        })
+        output_dir = os.path.dirname(os.path.abspath(options['output']))
+        os.makedirs(output_dir, exist_ok=True)
+        with open(options['output'], 'w') as f:
+            json.dump(report, f, indent=2)
+
+        if baseline is not None:
+            if baseline.get('corpus', {}).get('files') != manifest['files']:
+                self.stdout.write(self.style.WARNING('\nBaseline used a different corpus; changes are not like for like'))
+            self.stdout.write(f"\n{'case':<72}{'before':>10}{'after':>10}{'change':>9}")
+            for key, before, after, change in BenchmarkHarness.compare(results, baseline):
+                line = f"{key:<72}{before:>10.2f}{after:>10.2f}{change:>+8.1f}%"
+                self.stdout.write(self.style.ERROR(line) if change > 10 else line)
+
+        failed = sum(1 for result in results if result['status'] != 'ok')
+        self.stdout.write(self.style.SUCCESS(
+            f"\n{len(results) - failed} cases measured, {failed} failed, in {time.perf_counter() - start:.1f}s; "
+            f"results written to {options['output']}"
+        ))
@@ -0,0 +1,125 @@
+import random
+import time
+import uuid
+from urllib.parse import parse_qsl, urlsplit
+from datetime import timedelta
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+from rest_framework.pagination import Cursor, PageNumberPagination
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+from main.models import FileAnalysis
+from main.pagination import AnalysisCursorPagination
+
+
+class Command(BaseCommand):
+    help = 'Benchmark analysis history paging (OFFSET vs cursor) over a synthetic table; all rows are rolled back'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=1000000, help='Total synthetic analyses')
+        parser.add_argument('--heavy-rows', type=int, default=100000, help='Analyses owned by the heavy user')
+        parser.add_argument('--users', type=int, default=1000, help='Users sharing the remaining rows')
+        parser.add_argument('--repeat', type=int, default=5, help='Timed requests per page depth')
+        parser.add_argument('--batch-size', type=int, default=10000)
+
+    def populate(self, options):
+        User.objects.bulk_create([
+            User(username=f'bench_history_{uuid.uuid4().hex[:12]}', password='!')
+            for _ in range(options['users'] + 1)
+        ])
+        users = list(User.objects.filter(username__startswith='bench_history_').order_by('id'))
+        heavy, others = users[0], users[1:]
+
+        now = timezone.now()
+        span = int(timedelta(days=730).total_seconds() * 1000000)
+        rng = random.Random(42)
+
+        # auto_now_add would stamp every row with the same instant
+        created_at = FileAnalysis._meta.get_field('created_at')
+        created_at.auto_now_add = False
+        try:
+            written = 0
+            start = time.perf_counter()
+            while written < options['rows']:
+                count = min(options['batch_size'], options['rows'] - written)
+                batch = []
+                for i in range(count):
+                    owner = heavy if written + i < options['heavy_rows'] else rng.choice(others)
+                    stamp = now - timedelta(microseconds=rng.randrange(span))
+                    batch.append(FileAnalysis(
+                        user=owner,
+                        original_filename=f'file_{written + i}.jpg',
+                        file_type='image/jpeg',
+                        file_size=rng.randrange(10000, 5000000),
+                        status=rng.choice(['analyzed', 'cleaned', 'cleaned', 'cleaned', 'failed']),
+                        risk_score=rng.randrange(100),
+                        created_at=stamp,
+                        updated_at=stamp,
+                    ))
+                FileAnalysis.objects.bulk_create(batch)
+                written += count
+            elapsed = time.perf_counter() - start
+        finally:
+            created_at.auto_now_add = True
+
+        self.stdout.write(f"Inserted {written} rows in {elapsed:.1f}s ({written / elapsed:,.0f} rows/s)")
+        return heavy
+
+    def time_request(self, paginator_class, queryset, user, query, repeat):
+        factory = APIRequestFactory()
+        timings = []
+        for _ in range(repeat):
+            request = Request(factory.get('/api/analyses/', query))
+            request.user = user
+            start = time.perf_counter()
+            page = paginator_class().paginate_queryset(queryset, request)
+            list(page)
+            timings.append(time.perf_counter() - start)
+        return min(timings) * 1000
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            heavy = self.populate(options)
+            queryset = FileAnalysis.objects.filter(user=heavy).order_by('-created_at', '-id')
+            page_size = AnalysisCursorPagination.page_size
+
+            self.stdout.write(f"\nHeavy user: {options['heavy_rows']} analyses, page size {page_size}")
+            self.stdout.write(f"{'page':>8}{'offset ms':>12}{'cursor ms':>12}")
+
+            pages = [1, 10, 100, 1000]
+            last_page = options['heavy_rows'] // page_size
+            if last_page > 1000:
+                pages.append(last_page)
+
+            for page in pages:
+                if page > last_page:
+                    break
+                offset_ms = self.time_request(
+                    PageNumberPagination, queryset, heavy, {'page': page}, options['repeat']
+                )
+
+                # Cursor a client would hold after walking to this page
+                cursor_paginator = AnalysisCursorPagination()
+                cursor_query = {}
+                if page > 1:
+                    boundary = queryset[(page - 1) * page_size - 1]
+                    cursor_paginator.base_url = 'http://testserver/api/analyses/'
+                    next_url = cursor_paginator.encode_cursor(
+                        Cursor(offset=0, reverse=False, position=str(boundary.created_at))
+                    )
+                    cursor_query = dict(parse_qsl(urlsplit(next_url).query))
+                cursor_ms = self.time_request(
+                    AnalysisCursorPagination, queryset, heavy, cursor_query, options['repeat']
+                )
+
+                self.stdout.write(f"{page:>8}{offset_ms:>12.2f}{cursor_ms:>12.2f}")
+
+            plan = FileAnalysis.objects.filter(user=heavy, created_at__lt=timezone.now()) \
+                .order_by('-created_at', '-id')[:page_size + 1].explain()
+            self.stdout.write(f"\nCursor page plan:\n{plan}")
+
+            transaction.set_rollback(True)
+
+        self.stdout.write(self.style.SUCCESS('Done (synthetic rows rolled back)'))
@@ -0,0 +1,91 @@
+import io
+import time
+import tracemalloc
+from django.core.management.base import BaseCommand
+from main.utils.encryption_handler import EncryptionHandler
+from main.utils.pdf_protector import PDFProtector, PIKEPDF_AVAILABLE
+
+
+class Command(BaseCommand):
+    help = 'Benchmark PDF password protection: PyPDF2 page rebuild vs the in-place AES-256 engine'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--pages', type=int, default=500, help='Pages in the generated PDF')
+        parser.add_argument('--repeat', type=int, default=3, help='Timed runs per implementation')
+
+    def make_input(self, pages):
+        """A text PDF with one content stream per page"""
+        if PIKEPDF_AVAILABLE:
+            import pikepdf
+            pdf = pikepdf.new()
+            font = pdf.make_indirect(pikepdf.Dictionary(
+                Type=pikepdf.Name.Font, Subtype=pikepdf.Name.Type1, BaseFont=pikepdf.Name.Helvetica
+            ))
+            for number in range(pages):
+                lines = b''.join(
+                    b'(Page %d line %d: metadata removed from upload) Tj 0 -14 Td ' % (number, line)
+                    for line in range(50)
+                )
+                content = pdf.make_stream(b'BT /F1 11 Tf 50 780 Td ' + lines + b'ET')
+                pdf.pages.append(pikepdf.Page(pikepdf.Dictionary(
+                    Type=pikepdf.Name.Page,
+                    MediaBox=[0, 0, 595, 842],
+                    Resources=pikepdf.Dictionary(Font=pikepdf.Dictionary(F1=font)),
+                    Contents=content,
+                )))
+            output = io.BytesIO()
+            pdf.save(output)
+            return output.getvalue()
+
+        from PyPDF2 import PdfWriter
+        writer = PdfWriter()
+        for _ in range(pages):
+            writer.add_blank_page(width=595, height=842)
+        output = io.BytesIO()
+        writer.write(output)
+        return output.getvalue()
+
+    def run_rebuild(self, data, password):
+        return len(EncryptionHandler.password_protect_pdf(io.BytesIO(data), password).read())
+
+    def run_engine(self, data, password):
+        stream, size = PDFProtector.protect_stream(io.BytesIO(data), password)
+        for _ in stream:
+            pass
+        return size
+
+    def measure(self, func, data, password, repeat):
+        timings = []
+        output_size = 0
+        for _ in range(repeat):
+            start = time.perf_counter()
+            output_size = func(data, password)
+            timings.append(time.perf_counter() - start)
+
+        tracemalloc.start()
+        func(data, password)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        return min(timings), sum(timings) / len(timings), peak, output_size
+
+    def handle(self, *args, **options):
+        password = 'Benchmark#Pass1'
+        data = self.make_input(options['pages'])
+        size = len(data)
+        engine = 'pikepdf AES-256' if PIKEPDF_AVAILABLE else 'PyPDF2 RC4-128'
+
+        self.stdout.write(
+            f"Input: {options['pages']} pages, {size / 1024 / 1024:.1f} MB, "
+            f"{options['repeat']} runs each (engine: {engine})\n"
+        )
+        self.stdout.write(f"{'implementation':<16}{'best s':>10}{'mean s':>10}{'MB/s':>10}{'peak heap MB':>15}{'output MB':>12}")
+
+        for label, func in [('page rebuild', self.run_rebuild), ('protect_stream', self.run_engine)]:
+            best, mean, peak, output_size = self.measure(func, data, password, options['repeat'])
+            self.stdout.write(
+                f"{label:<16}{best:>10.3f}{mean:>10.3f}{size / best / 1024 / 1024:>10.1f}"
+                f"{peak / 1024 / 1024:>15.1f}{output_size / 1024 / 1024:>12.1f}"
+            )
+
+        self.stdout.write(self.style.SUCCESS('Done'))
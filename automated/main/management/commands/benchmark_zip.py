@@ -0,0 +1,73 @@
+import os
+import tempfile
+import time
+import tracemalloc
+from django.core.management.base import BaseCommand
+from main.utils.encryption_handler import EncryptionHandler
+
+
+class Command(BaseCommand):
+    help = 'Benchmark password-protected ZIP creation: streaming AES writer vs pyminizip'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--size-mb', type=int, default=50, help='Input size in MB')
+        parser.add_argument('--repeat', type=int, default=3, help='Timed runs per implementation')
+
+    def make_input(self, size):
+        """Half random (incompressible) and half text-like (compressible) data"""
+        temp = tempfile.NamedTemporaryFile(delete=False, suffix='.bin')
+        line = b'2024-01-01 12:00:00 INFO metadata removed from upload\n'
+        written = 0
+        while written < size:
+            block = os.urandom(512 * 1024) + line * (512 * 1024 // len(line))
+            block = block[:size - written]
+            temp.write(block)
+            written += len(block)
+        temp.close()
+        return temp.name
+
+    def run_pyminizip(self, path, password):
+        with open(path, 'rb') as f:
+            return len(EncryptionHandler.create_password_protected_zip(f, 'input.bin', password).read())
+
+    def run_streaming(self, path, password):
+        total = 0
+        with open(path, 'rb') as f:
+            for chunk in EncryptionHandler.create_password_protected_zip_stream([('input.bin', f)], password):
+                total += len(chunk)
+        return total
+
+    def measure(self, func, path, password, repeat):
+        timings = []
+        output_size = 0
+        for _ in range(repeat):
+            start = time.perf_counter()
+            output_size = func(path, password)
+            timings.append(time.perf_counter() - start)
+
+        tracemalloc.start()
+        func(path, password)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        return min(timings), sum(timings) / len(timings), peak, output_size
+
+    def handle(self, *args, **options):
+        size = options['size_mb'] * 1024 * 1024
+        password = 'Benchmark#Pass1'
+        path = self.make_input(size)
+
+        try:
+            self.stdout.write(f"Input: {options['size_mb']} MB, {options['repeat']} runs each\n")
+            self.stdout.write(f"{'implementation':<16}{'best s':>10}{'mean s':>10}{'MB/s':>10}{'peak heap MB':>15}{'output MB':>12}")
+
+            for label, func in [('pyminizip', self.run_pyminizip), ('streaming AES', self.run_streaming)]:
+                best, mean, peak, output_size = self.measure(func, path, password, options['repeat'])
+                self.stdout.write(
+                    f"{label:<16}{best:>10.3f}{mean:>10.3f}{size / best / 1024 / 1024:>10.1f}"
+                    f"{peak / 1024 / 1024:>15.1f}{output_size / 1024 / 1024:>12.1f}"
+                )
+
+            self.stdout.write(self.style.SUCCESS('Done'))
+        finally:
+            os.unlink(path)
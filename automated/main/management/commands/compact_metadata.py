@@ -0,0 +1,67 @@
+import time
+from itertools import groupby
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from main.models import FileAnalysis, MetadataEntry
+from main.utils.metadata_codec import MetadataCodec
+
+
+class Command(BaseCommand):
+    help = 'Move MetadataEntry rows into the compact metadata_blob on their FileAnalysis, in batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help='Analyses per transaction')
+        parser.add_argument('--limit', type=int, default=0, help='Stop after this many analyses (0 = all)')
+        parser.add_argument('--dry-run', action='store_true', help='Report sizes without writing')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        start = time.perf_counter()
+        analyses_done = entries_done = text_bytes = blob_bytes = 0
+        last_pk = None
+
+        while True:
+            # Keyset walk over analyses that still have rows and no blob
+            pending = FileAnalysis.objects.filter(metadata_blob__isnull=True, metadata_entries__isnull=False)
+            if last_pk is not None:
+                pending = pending.filter(pk__gt=last_pk)
+            pks = list(pending.order_by('pk').values_list('pk', flat=True).distinct()[:batch_size])
+            if not pks:
+                break
+            last_pk = pks[-1]
+
+            entries = MetadataEntry.objects.filter(file_analysis_id__in=pks) \
+                .order_by('file_analysis_id', '-risk_level', 'category') \
+                .only('id', 'file_analysis_id', 'key', 'value', 'category', 'risk_level', 'is_removed')
+
+            updated = []
+            for analysis_id, group in groupby(entries.iterator(), key=lambda e: e.file_analysis_id):
+                group = list(group)
+                blob = MetadataCodec.encode(group)
+                updated.append(FileAnalysis(pk=analysis_id, metadata_blob=blob))
+                entries_done += len(group)
+                text_bytes += sum(len(e.key) + len(e.value) + len(e.category) + len(e.risk_level) for e in group)
+                blob_bytes += len(blob)
+
+            if not options['dry_run']:
+                with transaction.atomic():
+                    FileAnalysis.objects.bulk_update(updated, ['metadata_blob'])
+                    MetadataEntry.objects.filter(file_analysis_id__in=[a.pk for a in updated]).delete()
+
+            analyses_done += len(updated)
+            elapsed = time.perf_counter() - start
+            self.stdout.write(
+                f"{analyses_done} analyses, {entries_done} entries "
+                f"({entries_done / elapsed:,.0f} entries/s)"
+            )
+
+            if options['limit'] and analyses_done >= options['limit']:
+                break
+
+        elapsed = time.perf_counter() - start
+        ratio = f", {text_bytes / blob_bytes:.1f}x smaller" if blob_bytes else ''
+        self.stdout.write(self.style.SUCCESS(
+            f"{'Would compact' if options['dry_run'] else 'Compacted'} {entries_done} entries from "
+            f"{analyses_done} analyses in {elapsed:.2f}s; text fields {text_bytes:,} bytes -> "
+            f"blobs {blob_bytes:,} bytes{ratio}"
+        ))
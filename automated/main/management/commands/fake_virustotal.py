@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand
+from main.benchmarks.fake_virustotal import FakeVirusTotalServer
+
+
+class Command(BaseCommand):
+    help = 'Serve a local VirusTotal stand-in (POST /files, GET /analyses/<id>) for load tests'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default='127.0.0.1')
+        parser.add_argument('--port', type=int, default=8765)
+        parser.add_argument('--latency', type=float, default=0.05, help='Seconds added to every response')
+        parser.add_argument('--jitter', type=float, default=0.0, help='Extra random latency, up to this many seconds')
+        parser.add_argument('--malicious-rate', type=float, default=0.0, help='Fraction of files reported malicious')
+        parser.add_argument('--pending-polls', type=int, default=0, help="Polls answered 'queued' before the verdict")
+        parser.add_argument('--error-rate', type=float, default=0.0, help='Fraction of requests answered 429/503')
+        parser.add_argument('--seed', type=int, default=1234)
+
+    def handle(self, *args, **options):
+        server = FakeVirusTotalServer(
+            options['host'], options['port'], latency=options['latency'], jitter=options['jitter'],
+            malicious_rate=options['malicious_rate'], pending_polls=options['pending_polls'],
+            error_rate=options['error_rate'], seed=options['seed'],
+        )
+        self.stdout.write(self.style.SUCCESS(f'Fake VirusTotal on {server.url}'))
+        self.stdout.write(f'Start the app with VIRUSTOTAL_BASE_URL={server.url} VIRUSTOTAL_API_KEY=test. Ctrl-C to stop.')
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.httpd.server_close()
+        counts = server.counts
+        self.stdout.write(f"\n{counts['uploads']} uploads, {counts['polls']} polls, {counts['errors']} injected errors")
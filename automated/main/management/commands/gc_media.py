@@ -0,0 +1,185 @@
+import os
+import shutil
+import time
+import uuid
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from main.models import FileAnalysis
+from main.utils.qr_generator import QRCodeGenerator
+
+
+def scan_files(root):
+    """Recursively yield os.DirEntry objects for regular files under root"""
+    stack = [root]
+    while stack:
+        directory = stack.pop()
+        try:
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    if entry.is_dir(follow_symlinks=False):
+                        stack.append(entry.path)
+                    elif entry.is_file(follow_symlinks=False):
+                        yield entry
+        except FileNotFoundError:
+            continue
+
+
+class Command(BaseCommand):
+    help = 'Find (and optionally delete) media files no analysis references, analyses whose files are gone, stale temp files and QR codes of deleted analyses'
+
+    FILE_FIELDS = ('original_file', 'cleaned_file')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--delete', action='store_true', help='Delete orphaned files, stale temp files and orphaned QR codes (default: report only)')
+        parser.add_argument('--clear-missing', action='store_true', help='Blank file fields that point to missing files')
+        parser.add_argument('--min-age-hours', type=float, default=1, help='Never treat files younger than this as orphans')
+        parser.add_argument('--temp-age-hours', type=float, default=24, help='Temp files older than this are stale')
+        parser.add_argument('--list', type=int, default=20, help='Print up to this many paths per category')
+        parser.add_argument('--chunk-size', type=int, default=5000)
+
+    def report(self, label, path, listed):
+        if listed < self.limit:
+            self.stdout.write(f"  {label}: {path}")
+        return listed + 1
+
+    def referenced_names(self, chunk_size):
+        """Stream (pk, field, name) for every stored file reference"""
+        rows = FileAnalysis.objects.order_by().values_list('pk', *self.FILE_FIELDS).iterator(chunk_size=chunk_size)
+        for row in rows:
+            for field, name in zip(self.FILE_FIELDS, row[1:]):
+                if name:
+                    yield row[0], field, name
+
+    def live_share_tokens(self, names, chunk_size):
+        """The directory names among `names` that are the share_token of an existing analysis"""
+        tokens = []
+        for name in names:
+            try:
+                if str(uuid.UUID(name)) == name:
+                    tokens.append(name)
+            except ValueError:
+                continue
+        live = set()
+        for index in range(0, len(tokens), chunk_size):
+            chunk = tokens[index:index + chunk_size]
+            live.update(str(t) for t in FileAnalysis.objects.filter(share_token__in=chunk).values_list('share_token', flat=True))
+        return live
+
+    def handle(self, *args, **options):
+        storage = FileAnalysis._meta.get_field('original_file').storage
+        try:
+            media_root = storage.path('')
+        except NotImplementedError:
+            raise CommandError('gc_media needs a local filesystem storage')
+
+        self.limit = options['list']
+        start = time.perf_counter()
+        now = time.time()
+
+        # 1. Referenced names from the database. Only 64-bit hashes are kept;
+        # a collision can only make an orphan look referenced, never the reverse.
+        referenced = set()
+        references = 0
+        for _, _, name in self.referenced_names(options['chunk_size']):
+            referenced.add(hash(name))
+            references += 1
+        self.stdout.write(f"{references} file references in the database")
+
+        # 2. Walk the upload directories
+        directories = set()
+        for field in self.FILE_FIELDS:
+            upload_to = FileAnalysis._meta.get_field(field).upload_to
+            directories.add(getattr(upload_to, 'prefix', upload_to).strip('/'))
+        present = set()
+        scanned = orphans = orphan_bytes = listed = 0
+        min_age = options['min_age_hours'] * 3600
+
+        for directory in sorted(directories):
+            for entry in scan_files(os.path.join(media_root, directory)):
+                scanned += 1
+                name = os.path.relpath(entry.path, media_root).replace(os.sep, '/')
+                name_hash = hash(name)
+                present.add(name_hash)
+
+                if name_hash in referenced:
+                    continue
+                stat = entry.stat(follow_symlinks=False)
+                if now - stat.st_mtime < min_age:
+                    # Upload in flight: the file is written before its row
+                    continue
+
+                orphans += 1
+                orphan_bytes += stat.st_size
+                listed = self.report('orphan', name, listed)
+                if options['delete']:
+                    try:
+                        os.unlink(entry.path)
+                    except OSError as e:
+                        self.stderr.write(f"Could not delete {name}: {e}")
+
+        self.stdout.write(
+            f"{scanned} files scanned, {orphans} orphans ({orphan_bytes / 1024 / 1024:.1f} MB)"
+            f"{' deleted' if options['delete'] else ''}"
+        )
+
+        # 3. References whose file is gone
+        missing = listed = 0
+        for pk, field, name in self.referenced_names(options['chunk_size']):
+            if hash(name) in present:
+                continue
+            if name.split('/', 1)[0] not in directories and storage.exists(name):
+                # Stored outside the scanned directories
+                continue
+            missing += 1
+            listed = self.report('missing', f"{pk} {field} {name}", listed)
+            if options['clear_missing']:
+                updates = {field: ''}
+                if field == 'cleaned_file':
+                    updates['cleaned_file_sha256'] = ''
+                FileAnalysis.objects.filter(pk=pk).update(**updates)
+        self.stdout.write(f"{missing} references to missing files{' cleared' if options['clear_missing'] else ''}")
+
+        # 4. Stale temporary files from interrupted uploads and processing
+        stale = stale_bytes = listed = 0
+        temp_age = options['temp_age_hours'] * 3600
+        temp_dir = str(getattr(settings, 'TEMP_DIR', ''))
+        if temp_dir and os.path.isdir(temp_dir):
+            for entry in scan_files(temp_dir):
+                stat = entry.stat(follow_symlinks=False)
+                if now - stat.st_mtime < temp_age:
+                    continue
+                stale += 1
+                stale_bytes += stat.st_size
+                listed = self.report('stale temp', entry.path, listed)
+                if options['delete']:
+                    try:
+                        os.unlink(entry.path)
+                    except OSError as e:
+                        self.stderr.write(f"Could not delete {entry.path}: {e}")
+        self.stdout.write(
+            f"{stale} stale temp files ({stale_bytes / 1024 / 1024:.1f} MB)"
+            f"{' deleted' if options['delete'] else ''}"
+        )
+
+        # 5. Cached QR codes whose analysis is gone (one directory per share token)
+        qr_root = os.path.join(media_root, QRCodeGenerator.CACHE_DIR)
+        try:
+            with os.scandir(qr_root) as entries:
+                cached = [entry for entry in entries if entry.is_dir(follow_symlinks=False)]
+        except FileNotFoundError:
+            cached = []
+        live = self.live_share_tokens([entry.name for entry in cached], options['chunk_size'])
+        stale_qr = listed = 0
+        for entry in cached:
+            if entry.name in live:
+                continue
+            stale_qr += 1
+            listed = self.report('orphan QR codes', os.path.relpath(entry.path, media_root), listed)
+            if options['delete']:
+                shutil.rmtree(entry.path, ignore_errors=True)
+        self.stdout.write(f"{stale_qr} orphaned QR code directories{' deleted' if options['delete'] else ''}")
+
+        elapsed = time.perf_counter() - start
+        self.stdout.write(self.style.SUCCESS(
+            f"Done in {elapsed:.2f}s ({scanned / elapsed if elapsed else 0:,.0f} files/s)"
+        ))
@@ -0,0 +1,255 @@
+import json
+import logging
+import random
+import shutil
+import tempfile
+import threading
+import time
+import numpy as np
+import requests
+from concurrent.futures import ThreadPoolExecutor
+from django.core.management.base import BaseCommand, CommandError
+from django.core.servers.basehttp import ThreadedWSGIServer, WSGIRequestHandler
+from django.core.wsgi import get_wsgi_application
+from django.test.utils import override_settings
+from main.benchmarks.corpus import SyntheticCorpus
+from main.benchmarks.fake_virustotal import FakeVirusTotalServer
+from main.models import FileAnalysis
+
+
+ENDPOINTS = ('analyze', 'clean', 'encrypt', 'share')
+# What the upload serializer accepts for analyze and clean-download
+SCANNABLE_TYPES = ('image/jpeg', 'image/png', 'application/pdf')
+
+
+class QuietRequestHandler(WSGIRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+class Command(BaseCommand):
+    help = (
+        'Replay a mixed synthetic corpus against analyze, clean-download, encrypt and share '
+        'and report requests/s and latency percentiles per endpoint'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--base-url', help='Running deployment to load, e.g. http://127.0.0.1:8000 (its VirusTotal '
+                                               'settings must point at `manage.py fake_virustotal`)')
+        parser.add_argument('--serve', action='store_true',
+                            help='Serve the app and a fake VirusTotal in this process (temporary MEDIA_ROOT; '
+                                 'analyses created by the run are deleted afterwards)')
+        parser.add_argument('--concurrency', type=int, default=8, help='Concurrent clients')
+        parser.add_argument('--duration', type=float, default=30.0, help='Seconds to run')
+        parser.add_argument('--requests', type=int, default=0, help='Stop after this many requests instead (0 = use --duration)')
+        parser.add_argument('--mix', default='analyze=1,clean=3,encrypt=2,share=2', help='Relative weight per endpoint')
+        parser.add_argument('--scale', type=float, default=0.1, help='Corpus size factor (see benchmark)')
+        parser.add_argument('--seed', type=int, default=1234)
+        parser.add_argument('--token', help='API token sent as "Authorization: Token <token>"')
+        parser.add_argument('--timeout', type=float, default=60.0, help='Per-request timeout in seconds')
+        parser.add_argument('--vt-latency', type=float, default=0.05, help='--serve: fake VirusTotal latency per call')
+        parser.add_argument('--vt-malicious-rate', type=float, default=0.0, help='--serve: fraction of files flagged')
+        parser.add_argument('--output', help='Write the report as JSON here')
+
+    def parse_mix(self, mix):
+        weights = {}
+        for item in mix.split(','):
+            name, _, weight = item.partition('=')
+            name = name.strip()
+            if name not in ENDPOINTS:
+                raise CommandError(f"Unknown endpoint '{name}' in --mix; choose from {', '.join(ENDPOINTS)}")
+            try:
+                weights[name] = float(weight or 1)
+            except ValueError:
+                raise CommandError(f"Bad weight in --mix: {item}")
+        if not any(weights.values()):
+            raise CommandError('--mix has no positive weight')
+        return weights
+
+    def handle(self, *args, **options):
+        if bool(options['base_url']) == bool(options['serve']):
+            raise CommandError('Pass exactly one of --base-url or --serve')
+        weights = self.parse_mix(options['mix'])
+        # Filled as analyses succeed, so --serve can clean up even after an error
+        self.analysis_ids = []
+
+        files = SyntheticCorpus(options['seed'], options['scale']).files()
+        if not options['serve']:
+            self.run(options['base_url'].rstrip('/'), files, weights, options)
+            return
+
+        media_root = tempfile.mkdtemp(prefix='loadtest_media_')
+        # One access line per request would compete with the app for the GIL
+        access_logger = logging.getLogger('main.access')
+        access_level = access_logger.level
+        access_logger.setLevel(logging.WARNING)
+        vt = FakeVirusTotalServer(latency=options['vt_latency'], malicious_rate=options['vt_malicious_rate'],
+                                  seed=options['seed']).start()
+        try:
+            with override_settings(MEDIA_ROOT=media_root, VIRUSTOTAL_BASE_URL=vt.url,
+                                   VIRUSTOTAL_API_KEY='loadtest', VIRUSTOTAL_POLL_DELAY=0):
+                httpd = ThreadedWSGIServer(('127.0.0.1', 0), QuietRequestHandler)
+                httpd.daemon_threads = True
+                httpd.set_app(get_wsgi_application())
+                threading.Thread(target=httpd.serve_forever, name='loadtest-app', daemon=True).start()
+                try:
+                    self.stdout.write(f'Serving the app on port {httpd.server_port}, fake VirusTotal on {vt.url}')
+                    self.run(f'http://127.0.0.1:{httpd.server_port}', files, weights, options)
+                finally:
+                    httpd.shutdown()
+                    httpd.server_close()
+                    _, deleted = FileAnalysis.objects.filter(pk__in=self.analysis_ids).delete()
+                    self.stdout.write(f"Removed {deleted.get('main.FileAnalysis', 0)} analyses created by the run")
+        finally:
+            access_logger.setLevel(access_level)
+            vt.stop()
+            shutil.rmtree(media_root, ignore_errors=True)
+
+    def request(self, session, endpoint, base_url, files, share_tokens, rng, timeout):
+        """One request; returns (status, bytes received, analysis id or None)"""
+        if endpoint == 'share':
+            token = rng.choice(share_tokens)
+            # Alternate between the share page's JSON and the cleaned download
+            method = session.get if rng.random() < 0.5 else session.post
+            response = method(f'{base_url}/api/share/{token}/', timeout=timeout)
+            return response.status_code, len(response.content), None
+
+        name, content_type, data = rng.choice(
+            files if endpoint == 'encrypt' else [f for f in files if f[1] in SCANNABLE_TYPES]
+        )
+        upload = {'file': (name, data, content_type)}
+        if endpoint == 'encrypt':
+            response = session.post(f'{base_url}/api/encrypt/', files=upload,
+                                    data={'password': 'Load#Test-2024', 'method': 'encrypt'}, timeout=timeout)
+        elif endpoint == 'clean':
+            response = session.post(f'{base_url}/api/clean-download/', files=upload,
+                                    data={'platform': rng.choice(['general', 'instagram', 'twitter'])}, timeout=timeout)
+        else:
+            response = session.post(f'{base_url}/api/analyze/', files=upload,
+                                    data={'platform': 'general'}, timeout=timeout)
+            if response.status_code < 300:
+                body = response.json()
+                if body.get('share_token'):
+                    share_tokens.append(body['share_token'])
+                return response.status_code, len(response.content), body.get('analysis_id')
+        return response.status_code, len(response.content), None
+
+    def run(self, base_url, files, weights, options):
+        headers = {'Authorization': f"Token {options['token']}"} if options['token'] else {}
+        share_tokens = []
+        analysis_ids = self.analysis_ids
+
+        # Share links come from analyses, so make a few before timing starts
+        if weights.get('share'):
+            with requests.Session() as session:
+                session.headers.update(headers)
+                rng = random.Random(options['seed'])
+                for _ in range(5):
+                    try:
+                        _, _, analysis_id = self.request(session, 'analyze', base_url, files, share_tokens, rng, options['timeout'])
+                    except requests.RequestException as e:
+                        raise CommandError(f'Cannot reach {base_url}: {e}')
+                    if analysis_id:
+                        analysis_ids.append(analysis_id)
+            if not share_tokens:
+                self.stdout.write(self.style.WARNING('No analysis succeeded during setup; share requests are skipped'))
+                weights = {name: weight for name, weight in weights.items() if name != 'share'}
+
+        names = list(weights)
+        cumulative = np.cumsum([weights[name] for name in names]).tolist()
+        samples = {name: [] for name in ENDPOINTS}
+        lock = threading.Lock()
+        issued = [0]
+        deadline = time.perf_counter() + options['duration']
+
+        def worker(index):
+            rng = random.Random(options['seed'] * 1000 + index)
+            with requests.Session() as session:
+                session.headers.update(headers)
+                while True:
+                    with lock:
+                        if options['requests'] and issued[0] >= options['requests']:
+                            return
+                        issued[0] += 1
+                    if not options['requests'] and time.perf_counter() >= deadline:
+                        return
+                    endpoint = rng.choices(names, cum_weights=cumulative)[0]
+                    start = time.perf_counter()
+                    try:
+                        status, size, analysis_id = self.request(
+                            session, endpoint, base_url, files, share_tokens, rng, options['timeout']
+                        )
+                    except requests.RequestException as e:
+                        status, size, analysis_id = type(e).__name__, 0, None
+                    elapsed = time.perf_counter() - start
+                    with lock:
+                        samples[endpoint].append((elapsed, status, size))
+                        if analysis_id:
+                            analysis_ids.append(analysis_id)
+
+        self.stdout.write(
+            f"{options['concurrency']} clients, mix {options['mix']}, "
+            + (f"{options['requests']} requests" if options['requests'] else f"{options['duration']:.0f}s")
+        )
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=options['concurrency']) as pool:
+            list(pool.map(worker, range(options['concurrency'])))
+        wall = time.perf_counter() - started
+
+        report = self.summarize(samples, wall, options)
+        self.print_report(report)
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump(report, f, indent=2)
+
+    def summarize(self, samples, wall, options):
+        endpoints = {}
+        everything = []
+        for name, rows in samples.items():
+            if not rows:
+                continue
+            everything += rows
+            endpoints[name] = self.stats(rows, wall)
+        return {
+            'base_url': options['base_url'] or 'in-process',
+            'options': {key: options[key] for key in ('concurrency', 'duration', 'requests', 'mix', 'scale', 'seed')},
+            'wall_seconds': round(wall, 3),
+            'endpoints': endpoints,
+            'total': self.stats(everything, wall) if everything else None,
+        }
+
+    def stats(self, rows, wall):
+        latencies = np.array([row[0] for row in rows]) * 1000
+        statuses = {}
+        for _, status, _ in rows:
+            statuses[str(status)] = statuses.get(str(status), 0) + 1
+        errors = sum(count for status, count in statuses.items() if not (status.isdigit() and int(status) < 400))
+        return {
+            'requests': len(rows),
+            'errors': errors,
+            'requests_per_s': round(len(rows) / wall, 2),
+            'latency_ms': {
+                'mean': round(float(latencies.mean()), 2),
+                'p50': round(float(np.percentile(latencies, 50)), 2),
+                'p90': round(float(np.percentile(latencies, 90)), 2),
+                'p99': round(float(np.percentile(latencies, 99)), 2),
+                'max': round(float(latencies.max()), 2),
+            },
+            'bytes_received': sum(row[2] for row in rows),
+            'statuses': statuses,
+        }
+
+    def print_report(self, report):
+        self.stdout.write(
+            f"\n{'endpoint':<10}{'requests':>10}{'errors':>8}{'req/s':>9}{'p50 ms':>10}{'p90 ms':>10}{'p99 ms':>10}{'max ms':>10}  statuses"
+        )
+        rows = list(report['endpoints'].items()) + ([('total', report['total'])] if report['total'] else [])
+        for name, stats in rows:
+            latency = stats['latency_ms']
+            line = (
+                f"{name:<10}{stats['requests']:>10}{stats['errors']:>8}{stats['requests_per_s']:>9.1f}"
+                f"{latency['p50']:>10.1f}{latency['p90']:>10.1f}{latency['p99']:>10.1f}{latency['max']:>10.1f}  "
+                + ' '.join(f'{status}:{count}' for status, count in sorted(stats['statuses'].items()))
+            )
+            self.stdout.write(self.style.WARNING(line) if stats['errors'] else line)
+        self.stdout.write(self.style.SUCCESS(f"\n{report['wall_seconds']:.1f}s wall clock"))
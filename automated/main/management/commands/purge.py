@@ -0,0 +1,114 @@
+import time
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils import timezone
+from main.models import FileAnalysis, UserStats
+from main.utils.retention import RETENTION_POLICIES
+
+
+class Command(BaseCommand):
+    help = 'Apply retention policies: delete old analyses and stored files in batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--policy', action='append', default=[],
+            help='Only run this policy (repeatable): ' + ', '.join(p.name for p in RETENTION_POLICIES)
+        )
+        parser.add_argument('--batch-size', type=int, default=500, help='Analyses per transaction')
+        parser.add_argument('--dry-run', action='store_true', help='Report what would be removed without deleting (policies may overlap in the counts)')
+        parser.add_argument('--vacuum', action='store_true', help='Run VACUUM afterwards (SQLite) to return space to the OS')
+
+    def delete_files(self, names):
+        storage = FileAnalysis._meta.get_field('original_file').storage
+        for name in names:
+            try:
+                storage.delete(name)
+            except Exception as e:
+                self.stderr.write(f"Could not delete {name}: {e}")
+
+    def file_sizes(self, names):
+        storage = FileAnalysis._meta.get_field('original_file').storage
+        total = 0
+        for name in names:
+            try:
+                total += storage.size(name)
+            except Exception:
+                pass
+        return total
+
+    def run_policy(self, policy, now, options):
+        start = time.perf_counter()
+        rows = files = freed = 0
+        last_pk = None
+        fields = ['original_file', 'cleaned_file'] if policy.action == 'delete' else [policy.action]
+
+        while True:
+            # Keyset walk by pk, so dry runs and partial failures still move forward
+            batch_query = policy.queryset(now).order_by('pk')
+            if last_pk is not None:
+                batch_query = batch_query.filter(pk__gt=last_pk)
+            batch = list(batch_query.values_list('pk', *fields)[:options['batch_size']].iterator())
+            if not batch:
+                break
+            last_pk = batch[-1][0]
+
+            pks = [row[0] for row in batch]
+            names = [name for row in batch for name in row[1:] if name]
+            freed += self.file_sizes(names)
+            rows += len(pks)
+            files += len(names)
+
+            if not options['dry_run']:
+                with transaction.atomic():
+                    if policy.action == 'delete':
+                        # Settle dashboard stats for the whole batch instead of once per row
+                        analyses = list(FileAnalysis.objects.filter(pk__in=pks).only(
+                            'user', 'status', 'risk_score', 'metadata_count', 'file_size', 'metadata_blob'
+                        ))
+                        UserStats.forget_analyses(analyses, UserStats.entry_categories(analyses))
+                        with UserStats.untracked():
+                            FileAnalysis.objects.filter(pk__in=pks).delete()
+                    else:
+                        FileAnalysis.objects.filter(pk__in=pks).update(**{policy.action: ''})
+                    # Storage is not transactional: only remove files once the rows are gone
+                    transaction.on_commit(lambda names=names: self.delete_files(names))
+
+        elapsed = time.perf_counter() - start
+        verb = 'would touch' if options['dry_run'] else 'processed'
+        self.stdout.write(
+            f"  {verb} {rows} analyses, {files} files ({freed / 1024 / 1024:.1f} MB) in {elapsed:.2f}s "
+            f"({rows / elapsed if elapsed else 0:,.0f} rows/s)"
+        )
+        return rows, files, freed
+
+    def handle(self, *args, **options):
+        names = {p.name for p in RETENTION_POLICIES}
+        unknown = set(options['policy']) - names
+        if unknown:
+            raise CommandError(f"Unknown policy: {', '.join(sorted(unknown))}")
+
+        policies = [
+            p for p in RETENTION_POLICIES
+            if p.enabled and (not options['policy'] or p.name in options['policy'])
+        ]
+        if not policies:
+            self.stdout.write('No retention policies enabled')
+            return
+
+        now = timezone.now()
+        totals = [0, 0, 0]
+        for policy in policies:
+            self.stdout.write(f"Policy {policy}")
+            for index, value in enumerate(self.run_policy(policy, now, options)):
+                totals[index] += value
+
+        if options['vacuum'] and not options['dry_run'] and connection.vendor == 'sqlite':
+            start = time.perf_counter()
+            with connection.cursor() as cursor:
+                cursor.execute('VACUUM')
+            self.stdout.write(f"VACUUM finished in {time.perf_counter() - start:.2f}s")
+
+        self.stdout.write(self.style.SUCCESS(
+            f"{'Dry run: ' if options['dry_run'] else ''}{totals[0]} analyses, "
+            f"{totals[1]} files, {totals[2] / 1024 / 1024:.1f} MB"
+        ))
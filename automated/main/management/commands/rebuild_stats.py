@@ -0,0 +1,92 @@
+import time
+from collections import defaultdict
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Count, Q, Sum
+from django.db.models.functions import Coalesce
+from main.models import FileAnalysis, MetadataEntry, UserStats
+from main.utils.metadata_codec import MetadataCodec
+from main.utils.risk_analyzer import RiskAnalyzer
+
+
+class Command(BaseCommand):
+    help = 'Rebuild per-user dashboard stats (UserStats) from analyses and metadata entries'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', type=str, help='Only rebuild stats for this username')
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def risk_band_filters(self):
+        """Q filter per risk band, matching RiskAnalyzer.get_risk_band"""
+        filters = {}
+        upper = None
+        for band, threshold in RiskAnalyzer.RISK_BANDS:
+            condition = Q(risk_score__gte=threshold) if threshold else Q()
+            if upper is not None:
+                condition &= Q(risk_score__lt=upper)
+            filters[band] = condition
+            upper = threshold
+        return filters
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        analyses = FileAnalysis.objects.filter(user__isnull=False, status__in=UserStats.STATUSES)
+        entries = MetadataEntry.objects.filter(
+            file_analysis__user__isnull=False,
+            file_analysis__status__in=['analyzed', 'cleaned']
+        )
+        existing = UserStats.objects.all()
+
+        if options['user']:
+            try:
+                user = User.objects.get(username=options['user'])
+            except User.DoesNotExist:
+                raise CommandError(f"User not found: {options['user']}")
+            analyses = analyses.filter(user=user)
+            entries = entries.filter(file_analysis__user=user)
+            existing = existing.filter(user=user)
+
+        scored = ~Q(status='failed')
+        aggregates = {
+            'total_files': Count('id'),
+            'total_risk_score': Coalesce(Sum('risk_score', filter=scored), 0),
+            'metadata_count': Coalesce(Sum('metadata_count', filter=scored), 0),
+            'bytes_cleaned': Coalesce(Sum('file_size', filter=Q(status='cleaned')), 0),
+        }
+        for status in UserStats.STATUSES:
+            aggregates[f'{status}_count'] = Count('id', filter=Q(status=status))
+        for band, condition in self.risk_band_filters().items():
+            aggregates[f'risk_{band}'] = Count('id', filter=scored & condition)
+
+        rows = {
+            row.pop('user'): row
+            for row in analyses.order_by().values('user').annotate(**aggregates).iterator()
+        }
+
+        categories = defaultdict(lambda: defaultdict(int))
+        for row in entries.order_by().values('file_analysis__user', 'category').annotate(count=Count('id')).iterator():
+            category = row['category'] if row['category'] in UserStats.CATEGORIES else 'other'
+            categories[row['file_analysis__user']][category] += row['count']
+        
+        # Analyses stored in compact mode keep their entries in metadata_blob
+        compact = analyses.filter(scored, metadata_blob__isnull=False).values_list('user', 'metadata_blob')
+        for user_id, blob in compact.iterator():
+            for entry in MetadataCodec.decode(blob):
+                category = entry['category'] if entry['category'] in UserStats.CATEGORIES else 'other'
+                categories[user_id][category] += 1
+
+        stats = []
+        for user_id, values in rows.items():
+            for category, count in categories.get(user_id, {}).items():
+                values[f'category_{category}'] = count
+            stats.append(UserStats(user_id=user_id, **values))
+
+        with transaction.atomic():
+            deleted, _ = existing.delete()
+            UserStats.objects.bulk_create(stats, batch_size=options['batch_size'])
+
+        elapsed = time.perf_counter() - start
+        self.stdout.write(self.style.SUCCESS(
+            f"Rebuilt stats for {len(stats)} users (replaced {deleted}) in {elapsed:.2f}s"
+        ))
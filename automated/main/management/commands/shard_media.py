@@ -0,0 +1,102 @@
+import os
+import shutil
+import time
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from main.models import FileAnalysis
+from main.utils.storage import is_sharded_name
+
+
+class Command(BaseCommand):
+    help = 'Move stored files from the old flat upload directories into the sharded layout, in batches'
+
+    FILE_FIELDS = ('original_file', 'cleaned_file')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help='Analyses per transaction')
+        parser.add_argument('--limit', type=int, default=0, help='Stop after this many analyses (0 = all)')
+        parser.add_argument('--dry-run', action='store_true', help='Report what would move without touching anything')
+
+    def link(self, source, target):
+        """Give the file its new name without removing the old one yet"""
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        try:
+            os.link(source, target)
+        except OSError:
+            # Hard links unsupported (or across devices): fall back to a copy
+            shutil.copy2(source, target)
+
+    def unlink(self, paths):
+        for path in paths:
+            try:
+                os.unlink(path)
+            except OSError as e:
+                self.stderr.write(f"Could not remove {path}: {e}")
+
+    def handle(self, *args, **options):
+        storage = FileAnalysis._meta.get_field('original_file').storage
+        try:
+            storage.path('')
+        except NotImplementedError:
+            raise CommandError('shard_media needs a local filesystem storage')
+
+        start = time.perf_counter()
+        analyses = moved = missing = moved_bytes = 0
+        last_pk = None
+
+        while True:
+            batch = FileAnalysis.objects.order_by('pk').only('pk', *self.FILE_FIELDS)
+            if last_pk is not None:
+                batch = batch.filter(pk__gt=last_pk)
+            batch = list(batch[:options['batch_size']])
+            if not batch:
+                break
+            last_pk = batch[-1].pk
+
+            updated, old_paths = [], []
+            for analysis in batch:
+                changed = False
+                for field in self.FILE_FIELDS:
+                    file = getattr(analysis, field)
+                    if not file.name or is_sharded_name(file.name):
+                        continue
+                    source = storage.path(file.name)
+                    if not os.path.exists(source):
+                        missing += 1
+                        continue
+
+                    # Same upload_to as new uploads, so the name is unique by construction
+                    upload_to = analysis._meta.get_field(field).upload_to
+                    new_name = upload_to(analysis, os.path.basename(file.name))
+                    moved += 1
+                    moved_bytes += os.path.getsize(source)
+                    if options['dry_run']:
+                        continue
+
+                    self.link(source, storage.path(new_name))
+                    old_paths.append(source)
+                    file.name = new_name
+                    changed = True
+                if changed:
+                    updated.append(analysis)
+
+            if updated:
+                with transaction.atomic():
+                    FileAnalysis.objects.bulk_update(updated, list(self.FILE_FIELDS))
+                    # The rows now point at the new names; drop the old ones only after commit.
+                    # A crash before this leaves a stray old copy for gc_media, never a broken row.
+                    transaction.on_commit(lambda paths=old_paths: self.unlink(paths))
+
+            analyses += len(batch)
+            elapsed = time.perf_counter() - start
+            self.stdout.write(f"{analyses} analyses checked, {moved} files ({moved / elapsed:,.0f} files/s)")
+
+            if options['limit'] and analyses >= options['limit']:
+                break
+
+        elapsed = time.perf_counter() - start
+        self.stdout.write(self.style.SUCCESS(
+            f"{'Would move' if options['dry_run'] else 'Moved'} {moved} files "
+            f"({moved_bytes / 1024 / 1024:.1f} MB) from {analyses} analyses in {elapsed:.2f}s; "
+            f"{missing} references to missing files skipped"
+        ))
@@ -1,8 +1,14 @@
 import logging
+import time
+from django.conf import settings
 from django.utils.deprecation import MiddlewareMixin
+from django.utils.functional import SimpleLazyObject
 from django.http import JsonResponse
+from .utils.log_pipeline import RequestContext
+from .utils.timing import RequestTiming
 
 logger = logging.getLogger(__name__)
+access_logger = logging.getLogger('main.access')
 
 class FileUploadValidationMiddleware(MiddlewareMixin):
     
@@ -18,13 +24,43 @@ class FileUploadValidationMiddleware(MiddlewareMixin):
 
 
 class RequestLoggingMiddleware(MiddlewareMixin):
+    """
+    Gives each request an id (the caller's X-Request-ID, or a new one) that
+    is attached to every log record and echoed in the response, and logs
+    one access line when the response is ready.
+    """
     
     def process_request(self, request):
-        logger.info(f'{request.method} {request.path} - User: {request.user}')
+        request.request_id, request._log_token = RequestContext.start(request.META.get('HTTP_X_REQUEST_ID'))
+        request._log_start = time.perf_counter()
         return None
     
     def process_response(self, request, response):
-        logger.info(f'{request.method} {request.path} - Status: {response.status_code}')
+        token = getattr(request, '_log_token', None)
+        if token is None:
+            return response
+        del request._log_token
+        
+        fields = {
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            'duration_ms': round((time.perf_counter() - request._log_start) * 1000, 2),
+        }
+        # Only when authentication already ran; never trigger the lookup here.
+        # DRF replaces request.user with the authenticated user.
+        user = request.__dict__.get('user')
+        if isinstance(user, SimpleLazyObject):
+            user = request.__dict__.get('_cached_user')
+        if user is not None and user.is_authenticated:
+            fields['user_id'] = user.pk
+        if getattr(request, '_server_timings', None):
+            fields['timings'] = request._server_timings
+        
+        level = logging.ERROR if response.status_code >= 500 else logging.INFO
+        access_logger.log(level, '%s %s %s', request.method, request.path, response.status_code, extra=fields)
+        response['X-Request-ID'] = request.request_id
+        RequestContext.stop(token)
         return response
 
 
@@ -41,3 +77,45 @@ class CORSExtensionMiddleware(MiddlewareMixin):
         
         return response
     
+
+
+class ServerTimingMiddleware(MiddlewareMixin):
+    """
+    Reports the request's RequestTiming spans as a Server-Timing header
+    when SERVER_TIMING_ENABLED is on. With ?timings=1, JSON API responses
+    also get a 'timings' field ({span: milliseconds}).
+    """
+    
+    def process_request(self, request):
+        if getattr(settings, 'SERVER_TIMING_ENABLED', False):
+            request._timing_token = RequestTiming.start()
+            request._timing_start = time.perf_counter()
+        return None
+    
+    def process_template_response(self, request, response):
+        # DRF responses are still unrendered here, so their data can change
+        if hasattr(request, '_timing_token') and request.GET.get('timings') and isinstance(getattr(response, 'data', None), dict):
+            response.data['timings'] = RequestTiming.totals(self.current_spans(request))
+        return response
+    
+    def process_response(self, request, response):
+        token = getattr(request, '_timing_token', None)
+        if token is None:
+            return response
+        del request._timing_token
+        
+        spans = RequestTiming.stop(token)
+        spans.append(('total', (time.perf_counter() - request._timing_start) * 1000))
+        # Also picked up by RequestLoggingMiddleware's access line
+        request._server_timings = RequestTiming.totals(spans)
+        response['Server-Timing'] = RequestTiming.header(request._server_timings)
+        # Let the extension and cross-origin pages read it
+        response['Timing-Allow-Origin'] = '*'
+        exposed = response.get('Access-Control-Expose-Headers')
+        response['Access-Control-Expose-Headers'] = f'{exposed}, Server-Timing' if exposed else 'Server-Timing'
+        return response
+    
+    def current_spans(self, request):
+        spans = RequestTiming.spans()
+        spans.append(('total', (time.perf_counter() - request._timing_start) * 1000))
+        return spans
@@ -0,0 +1,18 @@
+# Generated by Django 3.2.25 on 2026-10-19 07:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='fileanalysis',
+            name='cleaned_file_sha256',
+            field=models.CharField(blank=True, default='', max_length=64),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 3.2.25 on 2026-10-19 07:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0002_fileanalysis_cleaned_file_sha256'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='fileanalysis',
+            index=models.Index(fields=['user', '-created_at'], name='main_fa_user_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='fileanalysis',
+            index=models.Index(fields=['status'], name='main_fa_status_idx'),
+        ),
+    ]
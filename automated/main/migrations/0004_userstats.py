@@ -0,0 +1,43 @@
+# Generated by Django 3.2.25 on 2026-10-19 07:55
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('main', '0003_fileanalysis_history_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserStats',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to='auth.user')),
+                ('total_files', models.IntegerField(default=0)),
+                ('analyzed_count', models.IntegerField(default=0)),
+                ('cleaned_count', models.IntegerField(default=0)),
+                ('failed_count', models.IntegerField(default=0)),
+                ('risk_low', models.IntegerField(default=0)),
+                ('risk_medium', models.IntegerField(default=0)),
+                ('risk_high', models.IntegerField(default=0)),
+                ('total_risk_score', models.BigIntegerField(default=0)),
+                ('metadata_count', models.BigIntegerField(default=0)),
+                ('category_location', models.IntegerField(default=0)),
+                ('category_device', models.IntegerField(default=0)),
+                ('category_personal', models.IntegerField(default=0)),
+                ('category_author', models.IntegerField(default=0)),
+                ('category_timestamp', models.IntegerField(default=0)),
+                ('category_camera', models.IntegerField(default=0)),
+                ('category_software', models.IntegerField(default=0)),
+                ('category_other', models.IntegerField(default=0)),
+                ('bytes_cleaned', models.BigIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name_plural': 'User stats',
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 3.2.25 on 2026-10-19 07:57
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0004_userstats'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='fileanalysis',
+            name='metadata_blob',
+            field=models.BinaryField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 3.2.25 on 2026-10-19 08:03
+
+from django.db import migrations, models
+import main.utils.storage
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0005_fileanalysis_metadata_blob'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='fileanalysis',
+            name='cleaned_file',
+            field=models.FileField(blank=True, max_length=255, null=True, storage=main.utils.storage.ShardedFileSystemStorage(), upload_to=main.utils.storage.ShardedUploadTo('cleaned_files')),
+        ),
+        migrations.AlterField(
+            model_name='fileanalysis',
+            name='original_file',
+            field=models.FileField(blank=True, max_length=255, null=True, storage=main.utils.storage.ShardedFileSystemStorage(), upload_to=main.utils.storage.ShardedUploadTo('original_files')),
+        ),
+    ]
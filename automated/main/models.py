@@ -1,7 +1,22 @@
+from django.conf import settings
 from django.db import models
+from django.db.models import F
+from django.utils import timezone
 from django.contrib.auth.models import User
+import contextvars
 import uuid
 import json
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from .utils.risk_analyzer import RiskAnalyzer
+from .utils.metadata_codec import MetadataCodec
+from .utils.storage import ShardedFileSystemStorage, ShardedUploadTo
+
+
+sharded_storage = ShardedFileSystemStorage()
+
+# Set while a caller that settles UserStats itself deletes analyses
+_stats_untracked = contextvars.ContextVar('user_stats_untracked', default=False)
 
 
 class FileAnalysis(models.Model):
@@ -23,14 +38,22 @@ class FileAnalysis(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     user = models.ForeignKey(User, on_delete=models.CASCADE, null=True, blank=True)
     original_filename = models.CharField(max_length=255)
-    original_file = models.FileField(upload_to='original_files/', null=True, blank=True)
-    cleaned_file = models.FileField(upload_to='cleaned_files/', null=True, blank=True)
+    original_file = models.FileField(
+        upload_to=ShardedUploadTo('original_files'), storage=sharded_storage,
+        max_length=255, null=True, blank=True
+    )
+    cleaned_file = models.FileField(
+        upload_to=ShardedUploadTo('cleaned_files'), storage=sharded_storage,
+        max_length=255, null=True, blank=True
+    )
+    cleaned_file_sha256 = models.CharField(max_length=64, blank=True, default='')  # ETag source, filled on first download
     file_type = models.CharField(max_length=100)
     file_size = models.BigIntegerField()
     platform = models.CharField(max_length=50, choices=PLATFORM_CHOICES, default='general')
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
     risk_score = models.IntegerField(default=0)
     metadata_count = models.IntegerField(default=0)
+    metadata_blob = models.BinaryField(null=True, blank=True, editable=False)  # compact entries, see MetadataCodec
     share_token = models.UUIDField(default=uuid.uuid4, editable=False, unique=True)
     is_public = models.BooleanField(default=False)
     created_at = models.DateTimeField(auto_now_add=True)
@@ -41,10 +64,34 @@ class FileAnalysis(models.Model):
         indexes = [
             models.Index(fields=['share_token']),
             models.Index(fields=['created_at']),
+            # History pages: WHERE user_id = ? ORDER BY created_at DESC
+            models.Index(fields=['user', '-created_at'], name='main_fa_user_created_idx'),
+            # Queue-style scans for pending/failed analyses
+            models.Index(fields=['status'], name='main_fa_status_idx'),
         ]
     
     def __str__(self):
         return f"{self.original_filename} - {self.status}"
+    
+    def get_metadata_entries(self):
+        """Entries from the compact blob if present, otherwise the MetadataEntry rows"""
+        if self.metadata_blob:
+            return [MetadataEntry(file_analysis=self, **entry) for entry in MetadataCodec.decode(self.metadata_blob)]
+        return list(self.metadata_entries.all())
+    
+    def store_metadata_entries(self, entries):
+        """
+        Persist new (unsaved) entries. With METADATA_STORAGE='compact' they are
+        encoded onto metadata_blob, numbered 1..n, and written by the next
+        save() of the analysis; otherwise each becomes a MetadataEntry row.
+        """
+        if getattr(settings, 'METADATA_STORAGE', 'rows') == 'compact':
+            for number, entry in enumerate(entries, 1):
+                entry.id = number
+            self.metadata_blob = MetadataCodec.encode(entries)
+        else:
+            for entry in entries:
+                entry.save()
 
 
 class MetadataEntry(models.Model):
@@ -103,4 +150,142 @@ class PlatformRule(models.Model):
         self.risky_metadata_keys = json.dumps(keys_list)
     
     def __str__(self):
-        return f"Rules for {self.platform}"
\ No newline at end of file
+        return f"Rules for {self.platform}"
+
+
+class UserStats(models.Model):
+    """
+    Per-user dashboard totals, kept up to date as analyses finish so the
+    dashboard reads one row instead of aggregating the whole history.
+    Counts cover the analyses that still exist: deleting one (API, purge,
+    account deletion) takes it back out, and `manage.py rebuild_stats`
+    recomputes the same totals from FileAnalysis and MetadataEntry.
+    """
+    STATUSES = ('analyzed', 'cleaned', 'failed')
+    RISK_BANDS = tuple(band for band, _ in RiskAnalyzer.RISK_BANDS)
+    CATEGORIES = tuple(RiskAnalyzer.RISK_WEIGHTS)  # categories MetadataExtractor assigns
+    
+    user = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True, related_name='stats')
+    total_files = models.IntegerField(default=0)
+    analyzed_count = models.IntegerField(default=0)
+    cleaned_count = models.IntegerField(default=0)
+    failed_count = models.IntegerField(default=0)
+    risk_low = models.IntegerField(default=0)
+    risk_medium = models.IntegerField(default=0)
+    risk_high = models.IntegerField(default=0)
+    total_risk_score = models.BigIntegerField(default=0)
+    metadata_count = models.BigIntegerField(default=0)
+    category_location = models.IntegerField(default=0)
+    category_device = models.IntegerField(default=0)
+    category_personal = models.IntegerField(default=0)
+    category_author = models.IntegerField(default=0)
+    category_timestamp = models.IntegerField(default=0)
+    category_camera = models.IntegerField(default=0)
+    category_software = models.IntegerField(default=0)
+    category_other = models.IntegerField(default=0)
+    bytes_cleaned = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        verbose_name_plural = 'User stats'
+    
+    @property
+    def scored_count(self):
+        return self.analyzed_count + self.cleaned_count
+    
+    @property
+    def average_risk_score(self):
+        if not self.scored_count:
+            return 0
+        return round(self.total_risk_score / self.scored_count, 1)
+    
+    @classmethod
+    def _deltas(cls, file_analysis, categories=()):
+        """What one finished analysis adds to its owner's totals, as {field: amount}"""
+        deltas = Counter({'total_files': 1, f'{file_analysis.status}_count': 1})
+        
+        if file_analysis.status != 'failed':
+            band = RiskAnalyzer.get_risk_band(file_analysis.risk_score)
+            deltas[f'risk_{band}'] += 1
+            deltas['total_risk_score'] += file_analysis.risk_score
+            deltas['metadata_count'] += file_analysis.metadata_count
+            
+            for category in categories:
+                deltas[f"category_{category if category in cls.CATEGORIES else 'other'}"] += 1
+        
+        if file_analysis.status == 'cleaned':
+            deltas['bytes_cleaned'] += file_analysis.file_size
+        
+        return deltas
+    
+    @classmethod
+    def record_analysis(cls, file_analysis, categories=()):
+        """
+        Add one finished analysis (status analyzed, cleaned or failed) to
+        its owner's totals with a single atomic UPDATE.
+        categories: the category of each metadata entry found.
+        """
+        if not file_analysis.user_id or file_analysis.status not in cls.STATUSES:
+            return
+        
+        updates = {field: F(field) + amount for field, amount in cls._deltas(file_analysis, categories).items()}
+        updates['updated_at'] = timezone.now()
+        
+        cls.objects.get_or_create(user_id=file_analysis.user_id)
+        cls.objects.filter(user_id=file_analysis.user_id).update(**updates)
+    
+    @classmethod
+    def entry_categories(cls, analyses):
+        """
+        {analysis pk: [category of each metadata entry]} for the analyses
+        whose entries count towards stats. Read it before the entries are
+        deleted; one query covers all row-stored analyses.
+        """
+        scored = [a for a in analyses if a.user_id and a.status in ('analyzed', 'cleaned')]
+        categories = {a.pk: [] for a in scored}
+        
+        row_stored = [a.pk for a in scored if not a.metadata_blob]
+        if row_stored:
+            entries = MetadataEntry.objects.filter(file_analysis_id__in=row_stored).order_by()
+            for analysis_id, category in entries.values_list('file_analysis_id', 'category').iterator():
+                categories[analysis_id].append(category)
+        
+        for analysis in scored:
+            if analysis.metadata_blob:
+                categories[analysis.pk] = [entry['category'] for entry in MetadataCodec.decode(analysis.metadata_blob)]
+        return categories
+    
+    @classmethod
+    def forget_analyses(cls, analyses, categories):
+        """
+        Take deleted analyses back out of their owners' totals, with one
+        atomic UPDATE per owner, so the counters keep matching rebuild_stats.
+        categories: entry_categories() of the same analyses.
+        """
+        per_user = defaultdict(Counter)
+        for analysis in analyses:
+            if analysis.user_id and analysis.status in cls.STATUSES:
+                per_user[analysis.user_id].update(cls._deltas(analysis, categories.get(analysis.pk, ())))
+        
+        now = timezone.now()
+        for user_id, deltas in per_user.items():
+            updates = {field: F(field) - amount for field, amount in deltas.items()}
+            updates['updated_at'] = now
+            cls.objects.filter(user_id=user_id).update(**updates)
+    
+    @staticmethod
+    @contextmanager
+    def untracked():
+        """Deletes inside this block leave UserStats alone; the caller settles them with forget_analyses()"""
+        token = _stats_untracked.set(True)
+        try:
+            yield
+        finally:
+            _stats_untracked.reset(token)
+    
+    @staticmethod
+    def tracking():
+        return not _stats_untracked.get()
+    
+    def __str__(self):
+        return f"Stats for {self.user}"
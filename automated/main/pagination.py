@@ -0,0 +1,50 @@
+from functools import lru_cache
+from django.db.models import Q
+from rest_framework.pagination import CursorPagination
+
+
+class _PositionFilterQuerySet:
+    """
+    Mixed into the queryset handed to CursorPagination.paginate_queryset.
+
+    DRF (checked against 3.15) filters on the cursor position with
+    Q(created_at__lt=position) | Q(created_at__isnull=True). created_at is
+    NOT NULL, and that OR branch stops the database from using the index as
+    a range: every page would scan all newer rows first. The null branch is
+    dropped here; the rest of DRF's pagination runs unchanged.
+    """
+    position_field = None
+
+    def filter(self, *args, **kwargs):
+        null_branch = (f'{self.position_field}__isnull', True)
+        args = [
+            Q(*(child for child in q.children if child != null_branch))
+            if isinstance(q, Q) and q.connector == Q.OR and null_branch in q.children else q
+            for q in args
+        ]
+        return super().filter(*args, **kwargs)
+
+
+@lru_cache(maxsize=None)
+def _position_filter_class(queryset_class, position_field):
+    return type(queryset_class.__name__, (_PositionFilterQuerySet, queryset_class), {'position_field': position_field})
+
+
+class AnalysisCursorPagination(CursorPagination):
+    """
+    Keyset pagination for analysis history.
+
+    Each page is a range scan on the (user, -created_at) index starting
+    after the previous page's last row, so page 1000 costs the same as
+    page 1 and no COUNT(*) is run. id breaks ties between rows created
+    in the same instant.
+    """
+    page_size = 10
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    ordering = ('-created_at', '-id')
+
+    def paginate_queryset(self, queryset, request, view=None):
+        queryset = queryset.all()
+        queryset.__class__ = _position_filter_class(queryset.__class__, self.ordering[0].lstrip('-'))
+        return super().paginate_queryset(queryset, request, view)
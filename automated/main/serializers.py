@@ -1,6 +1,7 @@
 from rest_framework import serializers
-from .models import FileAnalysis, MetadataEntry, PlatformRule
+from .models import FileAnalysis, MetadataEntry, PlatformRule, UserStats
 import json
+from urllib.parse import urljoin
 from django.contrib.auth.models import User
 from django.contrib.auth.password_validation import validate_password
 from rest_framework.validators import UniqueValidator
@@ -131,8 +132,12 @@ class MetadataEntrySerializer(serializers.ModelSerializer):
         fields = ['id', 'key', 'value', 'category', 'risk_level', 'is_removed']
 
 
-class FileAnalysisSerializer(serializers.ModelSerializer):
-    metadata_entries = MetadataEntrySerializer(many=True, read_only=True)
+class FileAnalysisListSerializer(serializers.ModelSerializer):
+    """
+    Summary representation for listings: no nested metadata entries.
+    The absolute base URL is resolved once per serializer instead of
+    calling build_absolute_uri four times per row.
+    """
     original_file_url = serializers.SerializerMethodField()
     cleaned_file_url = serializers.SerializerMethodField()
     share_url = serializers.SerializerMethodField()
@@ -143,37 +148,54 @@ class FileAnalysisSerializer(serializers.ModelSerializer):
         fields = [
             'id', 'original_filename', 'file_type', 'file_size',
             'platform', 'status', 'risk_score', 'metadata_count',
-            'metadata_entries', 'original_file_url', 'cleaned_file_url',
+            'original_file_url', 'cleaned_file_url',
             'share_token', 'share_url', 'qr_code_url', 'is_public',
             'created_at', 'updated_at'
         ]
         read_only_fields = ['status', 'risk_score', 'metadata_count', 'share_token']
     
+    def absolute_url(self, location):
+        # Same result as request.build_absolute_uri(location), computed per row
+        # with a plain urljoin against the request URL resolved once
+        if not hasattr(self, '_request_url'):
+            request = self.context.get('request')
+            self._request_url = request.build_absolute_uri(request.path) if request else None
+        if self._request_url is None:
+            return None
+        return urljoin(self._request_url, location)
+    
     def get_original_file_url(self, obj):
         if obj.original_file:
-            request = self.context.get('request')
-            if request:
-                return request.build_absolute_uri(obj.original_file.url)
+            return self.absolute_url(obj.original_file.url)
         return None
     
     def get_cleaned_file_url(self, obj):
         if obj.cleaned_file:
-            request = self.context.get('request')
-            if request:
-                return request.build_absolute_uri(obj.cleaned_file.url)
+            return self.absolute_url(obj.cleaned_file.url)
         return None
     
     def get_share_url(self, obj):
-        request = self.context.get('request')
-        if request:
-            return request.build_absolute_uri(f'/share/{obj.share_token}/')
-        return None
+        return self.absolute_url(f'/share/{obj.share_token}/')
     
     def get_qr_code_url(self, obj):
-        request = self.context.get('request')
-        if request:
-            return request.build_absolute_uri(f'/api/analyses/{obj.id}/qr_code/')
-        return None
+        return self.absolute_url(f'/api/analyses/{obj.id}/qr_code/')
+
+
+class FileAnalysisSerializer(FileAnalysisListSerializer):
+    metadata_entries = serializers.SerializerMethodField()
+    
+    class Meta(FileAnalysisListSerializer.Meta):
+        fields = [
+            'id', 'original_filename', 'file_type', 'file_size',
+            'platform', 'status', 'risk_score', 'metadata_count',
+            'metadata_entries', 'original_file_url', 'cleaned_file_url',
+            'share_token', 'share_url', 'qr_code_url', 'is_public',
+            'created_at', 'updated_at'
+        ]
+    
+    def get_metadata_entries(self, obj):
+        # Same shape whether the entries are rows or a compact blob
+        return MetadataEntrySerializer(obj.get_metadata_entries(), many=True).data
 
 
 class FileUploadSerializer(serializers.Serializer):
@@ -182,6 +204,8 @@ class FileUploadSerializer(serializers.Serializer):
         choices=['general', 'instagram', 'facebook', 'twitter', 'linkedin'],
         default='general'
     )
+    # 'platform' removes only the keys the platform's rule flags, in place
+    clean_mode = serializers.ChoiceField(choices=['all', 'platform'], default='all')
     
     def validate_file(self, value):
         max_size = 50 * 1024 * 1024
@@ -224,4 +248,27 @@ class PlatformRuleSerializer(serializers.ModelSerializer):
         for attr, value in validated_data.items():
             setattr(instance, attr, value)
         instance.save()
-        return instance
\ No newline at end of file
+        return instance
+
+
+class UserStatsSerializer(serializers.ModelSerializer):
+    by_status = serializers.SerializerMethodField()
+    by_risk = serializers.SerializerMethodField()
+    by_category = serializers.SerializerMethodField()
+    average_risk_score = serializers.FloatField(read_only=True)
+    
+    class Meta:
+        model = UserStats
+        fields = [
+            'total_files', 'by_status', 'by_risk', 'by_category',
+            'average_risk_score', 'metadata_count', 'bytes_cleaned', 'updated_at'
+        ]
+    
+    def get_by_status(self, obj):
+        return {status: getattr(obj, f'{status}_count') for status in UserStats.STATUSES}
+    
+    def get_by_risk(self, obj):
+        return {band: getattr(obj, f'risk_{band}') for band in UserStats.RISK_BANDS}
+    
+    def get_by_category(self, obj):
+        return {category: getattr(obj, f'category_{category}') for category in UserStats.CATEGORIES}
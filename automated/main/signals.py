@@ -0,0 +1,33 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+from .models import FileAnalysis, PlatformRule, UserStats
+from .utils.platform_rules import PlatformRuleCache
+from .utils.qr_generator import QRCodeGenerator
+
+
+@receiver(post_save, sender=PlatformRule)
+@receiver(post_delete, sender=PlatformRule)
+def invalidate_platform_rules(sender, **kwargs):
+    # Clear now so this process sees its own change, and again after commit
+    # in case another thread reloaded the old rows in between
+    PlatformRuleCache.invalidate()
+    transaction.on_commit(PlatformRuleCache.invalidate)
+
+
+@receiver(pre_delete, sender=FileAnalysis)
+def remember_entry_categories(sender, instance, **kwargs):
+    # The entries are deleted before post_delete runs
+    if UserStats.tracking():
+        instance._stats_categories = UserStats.entry_categories([instance])
+
+
+@receiver(post_delete, sender=FileAnalysis)
+def forget_deleted_analysis(sender, instance, **kwargs):
+    if UserStats.tracking():
+        UserStats.forget_analyses([instance], getattr(instance, '_stats_categories', {}))
+
+
+@receiver(post_delete, sender=FileAnalysis)
+def delete_cached_qr_codes(sender, instance, **kwargs):
+    transaction.on_commit(lambda: QRCodeGenerator.delete_cached(instance.share_token))
@@ -0,0 +1,29 @@
+import logging
+from django.conf import settings
+from django.test.runner import DiscoverRunner
+
+
+class QuietTestRunner(DiscoverRunner):
+    """
+    DiscoverRunner that keeps the JSON log lines out of the test output.
+
+    The loggers configured in LOGGING get a NullHandler instead of their
+    handlers for the run, so records still reach assertLogs. With -v 2 or
+    more the logs are written as usual.
+    """
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self.saved_handlers = {}
+        if self.verbosity >= 2:
+            return
+        names = [''] + list(settings.LOGGING.get('loggers', {}))
+        for name in names:
+            logger = logging.getLogger(name or None)
+            self.saved_handlers[name] = logger.handlers[:]
+            logger.handlers = [logging.NullHandler()]
+
+    def teardown_test_environment(self, **kwargs):
+        for name, handlers in self.saved_handlers.items():
+            logging.getLogger(name or None).handlers = handlers
+        super().teardown_test_environment(**kwargs)
@@ -2,14 +2,72 @@ from django.test import TestCase
 
 # Create your tests here.
 from django.test import TestCase
+from django.core.files.base import ContentFile
 from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django.db import connection
+from django.contrib.auth.models import User
+from django.utils import timezone
+from datetime import timedelta
 from rest_framework.test import APITestCase, APIClient
 from rest_framework import status
-from .models import FileAnalysis, MetadataEntry, PlatformRule
+from .models import FileAnalysis, MetadataEntry, PlatformRule, UserStats
+from django.core.management import call_command
 from .utils.metadata_extractor import MetadataExtractor
 from .utils.risk_analyzer import RiskAnalyzer
+from .utils.qr_generator import QRCodeGenerator
+from .utils.storage import ShardedUploadTo, is_sharded_name
+from .utils.platform_rules import CompiledRule, PlatformRuleCache
+from .utils.exif_rewriter import ExifRewriter
+from .utils.metadata_remover import MetadataRemover
+from .utils.risk_scoring import VectorizedRiskScorer
+from .utils.metrics import PipelineMetrics, TimedStream
+from .utils.timing import RequestTiming
+from .utils.log_pipeline import AsyncLogHandler, RequestContext, RequestIdFilter, SamplingFilter
+from .utils.virustotal import VirusTotalClient, VirusTotalUnavailable
+from .benchmarks.cases import BenchmarkCases
+from .benchmarks.corpus import SyntheticCorpus
+from .benchmarks.fake_virustotal import EICAR, FakeVirusTotalServer
+from .benchmarks.harness import BenchmarkCase, BenchmarkHarness
+from prometheus_client import REGISTRY
+from .utils.metadata_codec import MetadataCodec
+from .utils.encryption_handler import EncryptionHandler
+from .utils.encrypted_container import EncryptedContainer, WebCryptoContainer
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+from cryptography.fernet import Fernet
 from PIL import Image
+from docx import Document
+from pptx import Presentation
+from lxml import etree
+from unittest import mock
+import hashlib
 import io
+import json
+import logging
+import os
+import shutil
+import tempfile
+import time
+import uuid
+import zipfile
+
+
+class TempMediaMixin:
+    """Runs each test against an empty temporary MEDIA_ROOT (self.media_root)"""
+    
+    def setUp(self):
+        super().setUp()
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        self.use_settings(MEDIA_ROOT=self.media_root)
+    
+    def use_settings(self, **options):
+        """override_settings for the rest of the test"""
+        override = override_settings(**options)
+        override.enable()
+        self.addCleanup(override.disable)
+
 
 class MetadataExtractorTests(TestCase):
     
@@ -22,7 +80,7 @@ class MetadataExtractorTests(TestCase):
     
     def test_extract_metadata_from_image(self):
         img_io = self.create_test_image()
-        metadata = MetadataExtractor.extract_from_image(img_io)
+        metadata = MetadataExtractor.extract_image_metadata(img_io)
         self.assertIsInstance(metadata, dict)
     
     def test_categorize_metadata(self):
@@ -56,10 +114,13 @@ class RiskAnalyzerTests(TestCase):
     
     def test_get_risk_recommendation(self):
         rec = RiskAnalyzer.get_risk_recommendation(85)
-        self.assertEqual(rec['level'], 'critical')
+        self.assertTrue(rec.startswith('Critical Risk:'))
         
         rec = RiskAnalyzer.get_risk_recommendation(25)
-        self.assertEqual(rec['level'], 'low')
+        self.assertTrue(rec.startswith('Medium Risk:'))
+        
+        rec = RiskAnalyzer.get_risk_recommendation(10)
+        self.assertTrue(rec.startswith('Low Risk:'))
 
 
 class FileAnalysisModelTests(TestCase):
@@ -123,10 +184,16 @@ class APITests(APITestCase):
     def test_analyze_file(self):
         test_file = self.create_test_image_file()
         
-        response = self.client.post('/api/analyze/', {
-            'file': test_file,
-            'platform': 'instagram'
-        }, format='multipart')
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        self.addCleanup(VirusTotalClient.reset)
+        with FakeVirusTotalServer() as vt, override_settings(
+            MEDIA_ROOT=media_root, VIRUSTOTAL_BASE_URL=vt.url, VIRUSTOTAL_API_KEY='test', VIRUSTOTAL_POLL_DELAY=0
+        ):
+            response = self.client.post('/api/analyze/', {
+                'file': test_file,
+                'platform': 'instagram'
+            }, format='multipart')
         
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertIn('analysis_id', response.data)
@@ -144,8 +211,18 @@ class APITests(APITestCase):
         self.assertEqual(response.status_code, status.HTTP_200_OK)
     
     def test_list_analyses(self):
+        # History is per user
+        response = self.client.get('/api/analyses/')
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+        
+        user = User.objects.create_user(username='lister', password='S3cret!pass')
+        FileAnalysis.objects.create(user=user, original_filename='mine.jpg', file_type='image/jpeg', file_size=1)
+        FileAnalysis.objects.create(original_filename='anonymous.jpg', file_type='image/jpeg', file_size=1)
+        self.client.force_authenticate(user)
+        
         response = self.client.get('/api/analyses/')
         self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([row['original_filename'] for row in response.data['results']], ['mine.jpg'])
     
     def test_get_platform_rules(self):
         response = self.client.get('/api/platform-rules/')
@@ -163,4 +240,1419 @@ class APITests(APITestCase):
             'platform': 'general'
         }, format='multipart')
         
-        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
\ No newline at end of file
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+class EncryptionAPITests(APITestCase):
+    
+    def setUp(self):
+        self.client = APIClient()
+        self.payload = os.urandom(200 * 1024 + 7)
+    
+    def encrypt(self, payload, password='S3cret!pass'):
+        response = self.client.post('/api/encrypt/', {
+            'file': SimpleUploadedFile('report.bin', payload),
+            'password': password,
+            'method': 'encrypt'
+        }, format='multipart')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        data = b''.join(response.streaming_content)
+        self.assertEqual(len(data), int(response['Content-Length']))
+        return data
+    
+    def decrypt(self, data, password='S3cret!pass'):
+        return self.client.post('/api/decrypt/', {
+            'file': SimpleUploadedFile('report_encrypted.enc', data),
+            'password': password
+        }, format='multipart')
+    
+    def test_encrypt_decrypt_roundtrip(self):
+        encrypted = self.encrypt(self.payload)
+        self.assertTrue(EncryptedContainer.is_container(encrypted))
+        
+        response = self.decrypt(encrypted)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(b''.join(response.streaming_content), self.payload)
+        self.assertIn('report.bin', response['Content-Disposition'])
+    
+    def test_wrong_password_rejected(self):
+        encrypted = self.encrypt(self.payload)
+        response = self.decrypt(encrypted, password='wrong')
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+    
+    def test_tampered_chunk_detected(self):
+        encrypted = bytearray(self.encrypt(self.payload))
+        encrypted[-100] ^= 0xFF
+        header = EncryptedContainer.read_header(io.BytesIO(bytes(encrypted)), 'S3cret!pass')
+        with self.assertRaises(ValueError):
+            b''.join(EncryptedContainer.decrypt_stream(io.BytesIO(bytes(encrypted)), header))
+    
+    def test_encrypt_file_roundtrip(self):
+        for encrypted in (
+            EncryptionHandler.encrypt_file(io.BytesIO(self.payload), 'S3cret!pass', 'report.bin'),
+            EncryptionHandler.protect_file(io.BytesIO(self.payload), 'report.bin', 'S3cret!pass', 'encrypt'),
+        ):
+            name, size, stream = EncryptionHandler.open_encrypted_file(encrypted, 'S3cret!pass')
+            self.assertEqual((name, size), ('report.bin', len(self.payload)))
+            self.assertEqual(b''.join(stream), self.payload)
+    
+    def test_untrusted_header_parameters_rejected(self):
+        encrypted = self.encrypt(self.payload)
+        # iterations sits at bytes 7-10, chunk_size at 34-37
+        for offset, value in ((7, 0xFFFFFFFF), (34, 0xFFFFFFFF), (34, 0)):
+            crafted = bytearray(encrypted)
+            crafted[offset:offset + 4] = value.to_bytes(4, 'big')
+            with mock.patch.object(EncryptedContainer, '_pbkdf2') as pbkdf2:
+                with self.assertRaisesMessage(ValueError, 'Unsupported container parameters'):
+                    EncryptedContainer.read_header(io.BytesIO(bytes(crafted)), 'S3cret!pass')
+            pbkdf2.assert_not_called()
+        
+        crafted[7:11] = (0xFFFFFFFF).to_bytes(4, 'big')
+        response = self.client.post('/api/decrypt/range/', {
+            'file': SimpleUploadedFile('report_encrypted.enc', bytes(crafted)),
+            'password': 'S3cret!pass'
+        }, format='multipart', HTTP_RANGE='bytes=0-10')
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+    
+    def test_legacy_fernet_file_still_decrypts(self):
+        key, salt = EncryptionHandler.generate_key_from_password('S3cret!pass')
+        name = b'old.txt'
+        legacy = salt + len(name).to_bytes(2, 'big') + name + Fernet(key).encrypt(b'legacy data')
+        
+        response = self.decrypt(legacy)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(b''.join(response.streaming_content), b'legacy data')
+    
+    def test_extension_format_interoperates(self):
+        # Build the file exactly as extension/crypto.js does with WebCrypto
+        salt, iv = os.urandom(16), os.urandom(12)
+        key = WebCryptoContainer.derive_key('S3cret!pass', salt)
+        from_extension = salt + iv + AESGCM(key).encrypt(iv, self.payload, None)
+        
+        response = self.decrypt(from_extension)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(b''.join(response.streaming_content), self.payload)
+        self.assertEqual(self.decrypt(from_extension, password='wrong').status_code, status.HTTP_401_UNAUTHORIZED)
+        
+        response = self.client.post('/api/encrypt/', {
+            'file': SimpleUploadedFile('report.bin', self.payload),
+            'password': 'S3cret!pass',
+            'format': 'extension'
+        }, format='multipart')
+        encrypted = b''.join(response.streaming_content)
+        self.assertEqual(len(encrypted), int(response['Content-Length']))
+        self.assertIn('report.bin.enc', response['Content-Disposition'])
+        
+        salt, iv = encrypted[:16], encrypted[16:28]
+        key = WebCryptoContainer.derive_key('S3cret!pass', salt)
+        self.assertEqual(AESGCM(key).decrypt(iv, encrypted[28:], None), self.payload)
+    
+    def test_range_decrypt_only_returns_requested_bytes(self):
+        encrypted = self.encrypt(self.payload)
+        
+        def request_range(value):
+            return self.client.post('/api/decrypt/range/', {
+                'file': SimpleUploadedFile('report_encrypted.enc', encrypted),
+                'password': 'S3cret!pass'
+            }, format='multipart', HTTP_RANGE=value)
+        
+        response = request_range('bytes=65530-131080')
+        self.assertEqual(response.status_code, status.HTTP_206_PARTIAL_CONTENT)
+        self.assertEqual(response['Content-Range'], f'bytes 65530-131080/{len(self.payload)}')
+        self.assertEqual(b''.join(response.streaming_content), self.payload[65530:131081])
+        
+        response = request_range('bytes=-10')
+        self.assertEqual(b''.join(response.streaming_content), self.payload[-10:])
+        
+        response = request_range(f'bytes={len(self.payload)}-')
+        self.assertEqual(response.status_code, status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE)
+    
+    def test_batch_encrypt_derives_password_key_once(self):
+        files = [
+            SimpleUploadedFile('a.txt', b'first file'),
+            SimpleUploadedFile('b.txt', self.payload),
+            SimpleUploadedFile('a.txt', b'same name'),
+        ]
+        
+        with mock.patch.object(
+            EncryptedContainer, '_pbkdf2', wraps=EncryptedContainer._pbkdf2
+        ) as pbkdf2:
+            response = self.client.post('/api/encrypt/batch/', {
+                'files': files,
+                'password': 'S3cret!pass'
+            }, format='multipart')
+            archive = zipfile.ZipFile(io.BytesIO(b''.join(response.streaming_content)))
+        
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(pbkdf2.call_count, 1)
+        self.assertEqual(
+            archive.namelist(),
+            ['a_encrypted.enc', 'b_encrypted.enc', 'a_1_encrypted.enc']
+        )
+        
+        # Every member is a standalone v2 container
+        response = self.decrypt(archive.read('b_encrypted.enc'))
+        self.assertEqual(b''.join(response.streaming_content), self.payload)
+        self.assertEqual(self.decrypt(archive.read('a_1_encrypted.enc'), password='wrong').status_code, 401)
+    
+    def test_zip_protect_streams_multiple_files(self):
+        response = self.client.post('/api/encrypt/', {
+            'file': [
+                SimpleUploadedFile('one.txt', b'one' * 1000),
+                SimpleUploadedFile('two.bin', self.payload),
+                SimpleUploadedFile('one.txt', b'again'),
+                SimpleUploadedFile('README', b'r'),
+                SimpleUploadedFile('README', b'r'),
+            ],
+            'password': 'S3cret!pass',
+            'method': 'zip'
+        }, format='multipart')
+        
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn('protected_files.zip', response['Content-Disposition'])
+        archive = zipfile.ZipFile(io.BytesIO(b''.join(response.streaming_content)))
+        self.assertEqual(archive.namelist(), ['one.txt', 'two.bin', 'one_1.txt', 'README', 'README_1'])
+        for info in archive.infolist():
+            # WinZip AES: encrypted flag set and compression method 99
+            self.assertTrue(info.flag_bits & 0x1)
+            self.assertEqual(info.compress_type, 99)
+        self.assertEqual(archive.getinfo('two.bin').file_size, len(self.payload))
+        self.assertEqual(archive.getinfo('one_1.txt').file_size, 5)
+    
+    def test_pdf_protect_applies_passwords_and_permissions(self):
+        from PyPDF2 import PdfWriter
+        writer = PdfWriter()
+        for _ in range(3):
+            writer.add_blank_page(width=200, height=200)
+        source = io.BytesIO()
+        writer.write(source)
+        
+        def protect(permissions):
+            return self.client.post('/api/encrypt/', {
+                'file': SimpleUploadedFile('report.pdf', source.getvalue()),
+                'password': 'S3cret!pass',
+                'owner_password': 'Own3r!pass',
+                'method': 'pdf',
+                'permissions': permissions
+            }, format='multipart')
+        
+        response = protect(['print'])
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['Content-Type'], 'application/pdf')
+        data = b''.join(response.streaming_content)
+        self.assertEqual(int(response['Content-Length']), len(data))
+        
+        import pikepdf
+        with self.assertRaises(pikepdf.PasswordError):
+            pikepdf.open(io.BytesIO(data))
+        with pikepdf.open(io.BytesIO(data), password='S3cret!pass') as pdf:
+            self.assertTrue(pdf.is_encrypted)
+            self.assertEqual(pdf.encryption.R, 6)
+            self.assertFalse(pdf.owner_password_matched)
+            self.assertEqual(len(pdf.pages), 3)
+            self.assertTrue(pdf.allow.print_highres)
+            self.assertFalse(pdf.allow.extract)
+        with pikepdf.open(io.BytesIO(data), password='Own3r!pass') as pdf:
+            self.assertTrue(pdf.owner_password_matched)
+        
+        
+        # A single multipart field may carry a comma-separated list
+        response = protect('print, extract')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        with pikepdf.open(io.BytesIO(b''.join(response.streaming_content)), password='S3cret!pass') as pdf:
+            self.assertTrue(pdf.allow.print_highres)
+            self.assertTrue(pdf.allow.extract)
+            self.assertFalse(pdf.allow.modify_other)
+        
+        self.assertEqual(protect(['print', 'extract,teleport']).status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class FileServingTests(TempMediaMixin, APITestCase):
+    
+    def setUp(self):
+        super().setUp()
+        
+        self.payload = os.urandom(100 * 1024)
+        self.analysis = FileAnalysis.objects.create(
+            original_filename='photo.jpg',
+            file_type='image/jpeg',
+            file_size=len(self.payload),
+            status='cleaned'
+        )
+        self.analysis.cleaned_file.save('photo_clean.jpg', ContentFile(self.payload))
+        self.url = f'/api/share/{self.analysis.share_token}/'
+    
+    def test_full_download_sets_validators(self):
+        response = self.client.post(self.url)
+        
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(b''.join(response.streaming_content), self.payload)
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+        self.assertEqual(response['ETag'], f'"{hashlib.sha256(self.payload).hexdigest()}"')
+        self.assertIn('Last-Modified', response)
+        self.assertIn('clean_photo.jpg', response['Content-Disposition'])
+        
+        # Hash is stored so later downloads don't re-read the file
+        self.analysis.refresh_from_db()
+        self.assertEqual(self.analysis.cleaned_file_sha256, hashlib.sha256(self.payload).hexdigest())
+    
+    def test_range_and_conditional_requests(self):
+        etag = self.client.post(self.url)['ETag']
+        
+        response = self.client.post(self.url, HTTP_RANGE='bytes=1000-1999')
+        self.assertEqual(response.status_code, status.HTTP_206_PARTIAL_CONTENT)
+        self.assertEqual(response['Content-Range'], f'bytes 1000-1999/{len(self.payload)}')
+        self.assertEqual(b''.join(response.streaming_content), self.payload[1000:2000])
+        
+        response = self.client.post(self.url, HTTP_RANGE='bytes=-10')
+        self.assertEqual(b''.join(response.streaming_content), self.payload[-10:])
+        
+        response = self.client.post(self.url, HTTP_RANGE=f'bytes={len(self.payload)}-')
+        self.assertEqual(response.status_code, status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE)
+        
+        # Stale If-Range falls back to the full body
+        response = self.client.post(self.url, HTTP_RANGE='bytes=0-9', HTTP_IF_RANGE='"stale"')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        
+        response = self.client.post(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(response['ETag'], etag)
+    
+    @override_settings(FILE_SERVE_MODE='x-accel-redirect', FILE_SERVE_ACCEL_PREFIX='/protected-media/')
+    def test_accel_redirect_offloads_body(self):
+        response = self.client.post(self.url)
+        
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.content, b'')
+        self.assertEqual(response['X-Accel-Redirect'], f'/protected-media/{self.analysis.cleaned_file.name}')
+        self.assertEqual(response['Content-Type'], 'image/jpeg')
+        self.assertIn('ETag', response)
+
+
+class QRCodeTests(TempMediaMixin, APITestCase):
+    
+    def setUp(self):
+        super().setUp()
+        self.use_settings(SITE_URL='https://share.example.com')
+        QRCodeGenerator.get_qr_code.cache_clear()
+        
+        self.user = User.objects.create_user(username='qr', password='S3cret!pass')
+        self.client.force_authenticate(self.user)
+        self.analysis = FileAnalysis.objects.create(
+            user=self.user,
+            original_filename='photo.jpg',
+            file_type='image/jpeg',
+            file_size=10
+        )
+        self.url = f'/api/analyses/{self.analysis.id}/qr_code/'
+    
+    def test_png_is_cached_and_revalidated(self):
+        with mock.patch.object(QRCodeGenerator, 'render', wraps=QRCodeGenerator.render) as render:
+            first = self.client.get(self.url, {'size': 200})
+            second = self.client.get(self.url, {'size': 200})
+            
+            # In-process cache cleared: the disk copy is used instead of re-rendering
+            QRCodeGenerator.get_qr_code.cache_clear()
+            third = self.client.get(self.url, {'size': 200})
+        
+        self.assertEqual(render.call_count, 1)
+        self.assertEqual(first.status_code, status.HTTP_200_OK)
+        self.assertEqual(first['Content-Type'], 'image/png')
+        self.assertIn('immutable', first['Cache-Control'])
+        self.assertEqual(first.content, second.content)
+        self.assertEqual(first.content, third.content)
+        self.assertLessEqual(Image.open(io.BytesIO(first.content)).size[0], 256)
+        
+        response = self.client.get(self.url, {'size': 200}, HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(response.content, b'')
+    
+    def test_svg_output(self):
+        response = self.client.get(self.url, {'output': 'svg'})
+        
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['Content-Type'], 'image/svg+xml')
+        self.assertIn(b'<svg', response.content)
+        self.assertNotEqual(response['ETag'], self.client.get(self.url)['ETag'])
+        self.assertEqual(self.client.get(self.url, {'output': 'gif'}).status_code, status.HTTP_400_BAD_REQUEST)
+    
+    def cached_files(self):
+        return sorted(
+            os.path.relpath(os.path.join(root, name), self.media_root)
+            for root, _, names in os.walk(os.path.join(self.media_root, QRCodeGenerator.CACHE_DIR)) for name in names
+        )
+    
+    def test_disk_cache_is_bounded_per_token(self):
+        etags = {
+            self.client.get(self.url, {'size': size}, HTTP_HOST=host)['ETag']
+            for size in (64, 100, 128, 129, 200, 256, 5000)
+            for host in ('testserver', 'attacker.example')
+        }
+        
+        # Host header ignored, sizes snapped up to 128, 256 and 1024
+        self.assertEqual(len(etags), 3)
+        files = self.cached_files()
+        self.assertEqual(len(files), 3)
+        self.assertTrue(all(f.startswith(os.path.join('qr_cache', str(self.analysis.share_token))) for f in files))
+        self.assertEqual(QRCodeGenerator.normalize(100, 'png'), (128, 'png'))
+        
+        with self.captureOnCommitCallbacks(execute=True):
+            self.analysis.delete()
+        self.assertEqual(self.cached_files(), [])
+    
+    def test_no_disk_cache_without_site_url(self):
+        with override_settings(SITE_URL=''):
+            response = self.client.get(self.url)
+        
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(self.cached_files(), [])
+
+
+class AnalysisListingTests(APITestCase):
+    
+    def setUp(self):
+        self.user = User.objects.create_user(username='lister', password='S3cret!pass')
+        self.client.force_authenticate(self.user)
+        
+        for i in range(12):
+            analysis = FileAnalysis.objects.create(
+                user=self.user,
+                original_filename=f'photo_{i}.jpg',
+                file_type='image/jpeg',
+                file_size=1024,
+                metadata_count=5
+            )
+            MetadataEntry.objects.bulk_create([
+                MetadataEntry(
+                    file_analysis=analysis,
+                    key=f'EXIF:Tag{j}',
+                    value='value',
+                    category='device',
+                    risk_level='low'
+                )
+                for j in range(5)
+            ])
+    
+    def test_list_query_count_is_constant(self):
+        # Cursor pagination: a single SELECT per page, no COUNT
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/analyses/')
+        
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotIn('count', response.data)
+        row = response.data['results'][0]
+        self.assertNotIn('metadata_entries', row)
+        self.assertEqual(row['metadata_count'], 5)
+        self.assertEqual(row['share_url'], f"http://testserver/share/{row['share_token']}/")
+        self.assertEqual(row['qr_code_url'], f"http://testserver/api/analyses/{row['id']}/qr_code/")
+    
+    def test_cursor_pages_cover_history_in_order(self):
+        seen = []
+        url = '/api/analyses/?page_size=5'
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            seen.extend(row['id'] for row in response.data['results'])
+            previous, url = response.data['previous'], response.data['next']
+        
+        # Walking back from the last page returns the page before it
+        response = self.client.get(previous)
+        self.assertEqual([row['id'] for row in response.data['results']], seen[5:10])
+        
+        expected = [
+            str(pk) for pk in FileAnalysis.objects.filter(user=self.user)
+            .order_by('-created_at', '-id').values_list('id', flat=True)
+        ]
+        self.assertEqual(seen, expected)
+    
+    def test_position_filter_is_a_plain_range(self):
+        # Guards the override of DRF's position filter: no "OR created_at IS NULL"
+        first = self.client.get('/api/analyses/?page_size=5').data
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(first['next'])
+        
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data['results']), 5)
+        sql = queries[0]['sql']
+        self.assertIn('"created_at" <', sql)
+        self.assertNotIn('IS NULL', sql)
+    
+    def test_detail_prefetches_entries(self):
+        analysis = FileAnalysis.objects.filter(user=self.user).first()
+        
+        with self.assertNumQueries(2):
+            response = self.client.get(f'/api/analyses/{analysis.id}/')
+        
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data['metadata_entries']), 5)
+
+
+class UserStatsTests(APITestCase):
+    
+    def setUp(self):
+        self.user = User.objects.create_user(username='stats', password='S3cret!pass')
+        self.client.force_authenticate(self.user)
+    
+    def finish(self, status_value, risk_score=0, categories=(), file_size=1000):
+        analysis = FileAnalysis.objects.create(
+            user=self.user,
+            original_filename='photo.jpg',
+            file_type='image/jpeg',
+            file_size=file_size,
+            status=status_value,
+            risk_score=risk_score,
+            metadata_count=len(categories)
+        )
+        MetadataEntry.objects.bulk_create([
+            MetadataEntry(file_analysis=analysis, key=f'k{i}', value='v', category=category, risk_level='low')
+            for i, category in enumerate(categories)
+        ])
+        UserStats.record_analysis(analysis, categories)
+        return analysis
+    
+    def test_stats_accumulate_and_match_rebuild(self):
+        self.finish('cleaned', 85, ['location', 'device', 'device'], file_size=4000)
+        self.finish('cleaned', 45, ['software'], file_size=2000)
+        self.finish('analyzed', 10, ['other', 'timestamp'])
+        self.finish('failed')
+        
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/stats/')
+        
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        data = response.data
+        self.assertEqual(data['total_files'], 4)
+        self.assertEqual(data['by_status'], {'analyzed': 1, 'cleaned': 2, 'failed': 1})
+        self.assertEqual(data['by_risk'], {'high': 1, 'medium': 1, 'low': 1})
+        self.assertEqual(data['by_category']['device'], 2)
+        self.assertEqual(data['by_category']['timestamp'], 1)
+        self.assertEqual(data['average_risk_score'], round((85 + 45 + 10) / 3, 1))
+        self.assertEqual(data['metadata_count'], 6)
+        self.assertEqual(data['bytes_cleaned'], 6000)
+        
+        # A full rebuild from the analyses gives the same totals
+        UserStats.objects.all().delete()
+        call_command('rebuild_stats', stdout=io.StringIO())
+        rebuilt = self.client.get('/api/stats/').data
+        data.pop('updated_at')
+        rebuilt.pop('updated_at')
+        self.assertEqual(rebuilt, data)
+    
+    def test_deletes_are_taken_back_out(self):
+        kept = self.finish('cleaned', 85, ['location', 'device'], file_size=4000)
+        deleted = self.finish('analyzed', 45, ['device', 'software'])
+        self.finish('failed')
+        
+        response = self.client.delete(f'/api/analyses/{deleted.id}/')
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        
+        data = self.client.get('/api/stats/').data
+        self.assertEqual(data['total_files'], 2)
+        self.assertEqual(data['by_status'], {'analyzed': 0, 'cleaned': 1, 'failed': 1})
+        self.assertEqual(data['by_category']['device'], 1)
+        self.assertEqual(data['by_category']['software'], 0)
+        self.assertEqual(data['metadata_count'], 2)
+        
+        # Matches what a rebuild computes from the remaining analyses
+        call_command('rebuild_stats', stdout=io.StringIO())
+        rebuilt = self.client.get('/api/stats/').data
+        data.pop('updated_at')
+        rebuilt.pop('updated_at')
+        self.assertEqual(rebuilt, data)
+        
+        kept.delete()
+        self.assertEqual(self.client.get('/api/stats/').data['total_files'], 1)
+        
+        self.user.delete()
+        self.assertFalse(UserStats.objects.exists())
+    
+    def test_late_analyze_failure_is_counted_once(self):
+        image = io.BytesIO()
+        Image.new('RGB', (16, 16)).save(image, format='JPEG')
+        upload = SimpleUploadedFile('photo.jpg', image.getvalue(), content_type='image/jpeg')
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        self.addCleanup(VirusTotalClient.reset)
+        
+        # The analysis is saved as cleaned before building the response fails
+        with FakeVirusTotalServer() as vt, override_settings(
+            MEDIA_ROOT=media_root, VIRUSTOTAL_BASE_URL=vt.url, VIRUSTOTAL_API_KEY='test', VIRUSTOTAL_POLL_DELAY=0
+        ), mock.patch('main.views.PlatformRuleCache.get', side_effect=RuntimeError('rules unavailable')), \
+                self.assertLogs('main.views', 'ERROR'):
+            response = self.client.post('/api/analyze/', {'file': upload}, format='multipart')
+        
+        self.assertEqual(response.status_code, status.HTTP_500_INTERNAL_SERVER_ERROR)
+        data = self.client.get('/api/stats/').data
+        self.assertEqual(data['total_files'], 1)
+        self.assertEqual(data['by_status'], {'analyzed': 0, 'cleaned': 0, 'failed': 1})
+        self.assertEqual(data['metadata_count'], 0)
+    
+    def test_new_user_gets_zeroes(self):
+        response = self.client.get('/api/stats/')
+        
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['total_files'], 0)
+        self.assertEqual(response.data['average_risk_score'], 0)
+
+
+class CompactMetadataTests(APITestCase):
+    
+    def setUp(self):
+        self.user = User.objects.create_user(username='compact', password='S3cret!pass')
+        self.client.force_authenticate(self.user)
+        self.analysis = FileAnalysis.objects.create(
+            user=self.user,
+            original_filename='photo.jpg',
+            file_type='image/jpeg',
+            file_size=1024,
+            metadata_count=4
+        )
+        self.entries = [
+            MetadataEntry(file_analysis=self.analysis, key='GPSInfo', value='51.5, -0.1', category='location', risk_level='critical'),
+            MetadataEntry(file_analysis=self.analysis, key='Make', value='Canon', category='device', risk_level='medium'),
+            MetadataEntry(file_analysis=self.analysis, key='Artist', value='Jane Ünicode', category='author', risk_level='high'),
+            MetadataEntry(file_analysis=self.analysis, key='Custom', value='x', category='unlisted', risk_level='low'),
+        ]
+        self.url = f'/api/analyses/{self.analysis.id}/'
+    
+    def test_compaction_keeps_serialized_entries(self):
+        self.analysis.store_metadata_entries(self.entries)
+        before = self.client.get(self.url).data['metadata_entries']
+        
+        call_command('compact_metadata', batch_size=1, stdout=io.StringIO())
+        
+        self.assertFalse(MetadataEntry.objects.filter(file_analysis=self.analysis).exists())
+        self.analysis.refresh_from_db()
+        self.assertIsNotNone(self.analysis.metadata_blob)
+        
+        with override_settings(METADATA_STORAGE='compact'):
+            # The detail view is a single-row read
+            with self.assertNumQueries(1):
+                after = self.client.get(self.url).data['metadata_entries']
+        
+        self.assertEqual(after, before)
+    
+    @override_settings(METADATA_STORAGE='compact')
+    def test_compact_mode_writes_blob_only(self):
+        self.analysis.store_metadata_entries(self.entries)
+        self.analysis.save()
+        
+        self.assertFalse(MetadataEntry.objects.filter(file_analysis=self.analysis).exists())
+        entries = self.client.get(self.url).data['metadata_entries']
+        self.assertEqual(sorted(e['id'] for e in entries), [1, 2, 3, 4])
+        self.assertEqual(
+            {e['key']: (e['category'], e['risk_level']) for e in entries}['Custom'],
+            ('unlisted', 'low')
+        )
+        self.assertEqual(entries[0]['key'], 'Make')  # -risk_level ordering, as with rows
+
+
+@override_settings(
+    RETENTION_ANONYMOUS_DAYS=7,
+    RETENTION_FAILED_DAYS=7,
+    RETENTION_ANALYSIS_DAYS=0,
+    RETENTION_ORIGINAL_FILE_DAYS=30,
+    RETENTION_CLEANED_FILE_DAYS=0
+)
+class PurgeTests(TempMediaMixin, TestCase):
+    
+    def setUp(self):
+        super().setUp()
+        
+        self.user = User.objects.create_user(username='retained', password='S3cret!pass')
+        self.anonymous_old = self.create(None, days_old=10)
+        self.anonymous_new = self.create(None, days_old=1)
+        self.user_old = self.create(self.user, days_old=40)
+        self.user_failed = self.create(self.user, days_old=10, status_value='failed')
+    
+    def create(self, user, days_old, status_value='cleaned'):
+        analysis = FileAnalysis.objects.create(
+            user=user,
+            original_filename='photo.jpg',
+            file_type='image/jpeg',
+            file_size=3,
+            status=status_value
+        )
+        analysis.original_file.save('photo.jpg', ContentFile(b'raw'), save=False)
+        analysis.cleaned_file.save('photo_clean.jpg', ContentFile(b'cln'), save=False)
+        analysis.save()
+        MetadataEntry.objects.create(file_analysis=analysis, key='Make', value='Canon', category='device', risk_level='medium')
+        FileAnalysis.objects.filter(pk=analysis.pk).update(created_at=timezone.now() - timedelta(days=days_old))
+        return analysis
+    
+    def exists(self, field_file):
+        return field_file.storage.exists(field_file.name)
+    
+    def test_dry_run_changes_nothing(self):
+        out = io.StringIO()
+        call_command('purge', dry_run=True, stdout=out)
+        
+        self.assertEqual(FileAnalysis.objects.count(), 4)
+        self.assertTrue(self.exists(self.anonymous_old.original_file))
+        self.assertIn('Dry run: 3 analyses', out.getvalue())
+    
+    def stats(self):
+        return UserStats.objects.filter(user=self.user).values(
+            *(f.name for f in UserStats._meta.fields if f.name != 'updated_at')
+        ).get()
+    
+    def test_purge_applies_policies_in_batches(self):
+        call_command('rebuild_stats', stdout=io.StringIO())
+        self.assertEqual(self.stats()['total_files'], 2)
+        
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command('purge', batch_size=1, stdout=io.StringIO())
+        
+        # Purged analyses leave the dashboard totals too
+        purged = self.stats()
+        self.assertEqual((purged['total_files'], purged['failed_count']), (1, 0))
+        call_command('rebuild_stats', stdout=io.StringIO())
+        self.assertEqual(self.stats(), purged)
+        
+        # Old anonymous and failed analyses go entirely, entries included
+        remaining = set(FileAnalysis.objects.values_list('pk', flat=True))
+        self.assertEqual(remaining, {self.anonymous_new.pk, self.user_old.pk})
+        self.assertEqual(MetadataEntry.objects.count(), 2)
+        self.assertFalse(self.exists(self.anonymous_old.original_file))
+        self.assertFalse(self.exists(self.user_failed.cleaned_file))
+        
+        # Past the original-file limit only the original is dropped
+        self.user_old.refresh_from_db()
+        self.assertFalse(self.user_old.original_file)
+        self.assertTrue(self.exists(self.user_old.cleaned_file))
+        self.assertTrue(self.exists(self.anonymous_new.original_file))
+
+
+class MediaGCTests(TempMediaMixin, TestCase):
+    
+    def setUp(self):
+        super().setUp()
+        self.temp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.temp_dir)
+        self.use_settings(TEMP_DIR=self.temp_dir)
+        
+        self.analysis = FileAnalysis.objects.create(original_filename='a.jpg', file_type='image/jpeg', file_size=3)
+        self.analysis.original_file.save('a.jpg', ContentFile(b'raw'), save=False)
+        self.analysis.cleaned_file.save('a_clean.jpg', ContentFile(b'cln'), save=False)
+        self.analysis.save()
+        
+        old = time.time() - 3 * 86400
+        self.orphan = self.write(os.path.join('cleaned_files', 'nested', 'orphan.jpg'), old)
+        self.fresh = self.write(os.path.join('original_files', 'uploading.jpg'), time.time())
+        self.stale_temp = self.write(os.path.join(self.temp_dir, 'upload.tmp'), old)
+        os.unlink(self.analysis.cleaned_file.path)
+        self.live_qr = self.write(os.path.join('qr_cache', str(self.analysis.share_token), 'code.png'), old)
+        self.orphan_qr = self.write(os.path.join('qr_cache', str(uuid.uuid4()), 'code.png'), old)
+    
+    def write(self, name, mtime):
+        path = os.path.join(self.media_root, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as f:
+            f.write(b'x' * 10)
+        os.utime(path, (mtime, mtime))
+        return path
+    
+    def test_report_only_keeps_files(self):
+        out = io.StringIO()
+        call_command('gc_media', stdout=out)
+        
+        output = out.getvalue()
+        self.assertIn('orphan: cleaned_files/nested/orphan.jpg', output)
+        self.assertNotIn('uploading.jpg', output)
+        self.assertIn(f'missing: {self.analysis.pk} cleaned_file', output)
+        self.assertIn('1 stale temp files', output)
+        self.assertIn('1 orphaned QR code directories', output)
+        self.assertTrue(os.path.exists(self.orphan))
+        self.assertTrue(os.path.exists(self.stale_temp))
+    
+    def test_delete_and_clear_missing(self):
+        call_command('gc_media', delete=True, clear_missing=True, stdout=io.StringIO())
+        
+        self.assertFalse(os.path.exists(self.orphan))
+        self.assertFalse(os.path.exists(self.stale_temp))
+        self.assertTrue(os.path.exists(self.fresh))
+        self.assertTrue(os.path.exists(self.analysis.original_file.path))
+        self.assertFalse(os.path.exists(self.orphan_qr))
+        self.assertTrue(os.path.exists(self.live_qr))
+        self.analysis.refresh_from_db()
+        self.assertFalse(self.analysis.cleaned_file)
+        self.assertTrue(self.analysis.original_file)
+
+
+class ShardedStorageTests(TempMediaMixin, TestCase):
+    
+    def setUp(self):
+        super().setUp()
+    
+    def test_upload_path_is_sharded_and_unique(self):
+        upload_to = ShardedUploadTo('original_files')
+        first = upload_to(None, 'photo.jpg')
+        second = upload_to(None, 'photo.jpg')
+        
+        self.assertNotEqual(first, second)
+        self.assertTrue(is_sharded_name(first))
+        self.assertRegex(first, r'^original_files/[0-9a-f]{2}/[0-9a-f]{2}/[0-9a-f]{32}_photo\.jpg$')
+        
+        long_name = upload_to(None, 'x' * 300 + '.jpeg')
+        self.assertEqual(len(long_name), 255)
+        self.assertTrue(long_name.endswith('.jpeg'))
+    
+    def test_saved_files_use_sharded_names(self):
+        analysis = FileAnalysis.objects.create(original_filename='a.jpg', file_type='image/jpeg', file_size=3)
+        analysis.original_file.save('a.jpg', ContentFile(b'raw'))
+        
+        self.assertTrue(is_sharded_name(analysis.original_file.name))
+        self.assertTrue(analysis.original_file.name.endswith('_a.jpg'))
+        with open(analysis.original_file.path, 'rb') as f:
+            self.assertEqual(f.read(), b'raw')
+    
+    def test_shard_media_relocates_flat_files(self):
+        analysis = FileAnalysis.objects.create(original_filename='a.jpg', file_type='image/jpeg', file_size=3)
+        os.makedirs(os.path.join(self.media_root, 'original_files'))
+        old_path = os.path.join(self.media_root, 'original_files', 'a.jpg')
+        with open(old_path, 'wb') as f:
+            f.write(b'raw')
+        FileAnalysis.objects.filter(pk=analysis.pk).update(original_file='original_files/a.jpg', cleaned_file='cleaned_files/gone.jpg')
+        
+        call_command('shard_media', dry_run=True, stdout=io.StringIO())
+        analysis.refresh_from_db()
+        self.assertEqual(analysis.original_file.name, 'original_files/a.jpg')
+        
+        out = io.StringIO()
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command('shard_media', batch_size=1, stdout=out)
+        
+        analysis.refresh_from_db()
+        self.assertTrue(is_sharded_name(analysis.original_file.name))
+        self.assertEqual(analysis.cleaned_file.name, 'cleaned_files/gone.jpg')
+        self.assertFalse(os.path.exists(old_path))
+        with open(analysis.original_file.path, 'rb') as f:
+            self.assertEqual(f.read(), b'raw')
+        self.assertIn('Moved 1 files', out.getvalue())
+        self.assertIn('1 references to missing files skipped', out.getvalue())
+
+
+class PlatformRuleCacheTests(APITestCase):
+    
+    def setUp(self):
+        PlatformRuleCache.clear()
+        self.addCleanup(PlatformRuleCache.clear)
+        self.rule = PlatformRule(platform='mastodon', description='Fediverse')
+        self.rule.set_risky_keys(['gps', 'Artist'])
+        self.rule.save()
+    
+    def test_compiled_rule_matching(self):
+        rule = CompiledRule('x', ['gps', 'Artist'])
+        
+        self.assertTrue(rule.matches('GPS GPSLatitude'))
+        self.assertTrue(rule.matches('artist'))
+        self.assertFalse(rule.matches('Orientation'))
+        self.assertEqual(rule.risky_keys(['Make', 'GPSInfo', 'Image Artist']), ['GPSInfo', 'Image Artist'])
+        self.assertFalse(CompiledRule('empty', []).matches('gps'))
+    
+    def test_by_platform_served_from_cache(self):
+        self.client.get('/api/platform-rules/by_platform/', {'platform': 'mastodon'})
+        
+        with self.assertNumQueries(0):
+            response = self.client.get('/api/platform-rules/by_platform/', {'platform': 'mastodon'})
+        self.assertEqual(response.data['risky_metadata_keys'], ['gps', 'Artist'])
+        self.assertEqual(response.data['description'], 'Fediverse')
+        
+        response = self.client.get('/api/platform-rules/by_platform/', {'platform': 'twitter'})
+        self.assertEqual(response.data['risky_metadata_keys'], list(RiskAnalyzer.PLATFORM_RISKY_KEYS['twitter']))
+    
+    def test_save_and_delete_invalidate(self):
+        self.assertTrue(PlatformRuleCache.get('mastodon').matches('gps'))
+        
+        self.rule.set_risky_keys(['serial'])
+        self.rule.save()
+        self.assertFalse(PlatformRuleCache.get('mastodon').matches('gps'))
+        self.assertTrue(PlatformRuleCache.get('mastodon').matches('BodySerialNumber'))
+        
+        self.rule.delete()
+        self.assertEqual(PlatformRuleCache.get('mastodon').platform, 'general')
+    
+    @override_settings(PLATFORM_RULE_CHECK_INTERVAL=0)
+    def test_other_process_changes_picked_up_by_version(self):
+        self.assertTrue(PlatformRuleCache.get('mastodon').matches('gps'))
+        
+        # Simulate another worker: change the row without this process's signals
+        PlatformRule.objects.filter(pk=self.rule.pk).update(risky_metadata_keys='["make"]')
+        self.assertTrue(PlatformRuleCache.get('mastodon').matches('gps'))
+        
+        # Its save() also moves updated_at, which is what the stamp reads
+        PlatformRule.objects.filter(pk=self.rule.pk).update(updated_at=timezone.now() + timedelta(seconds=1))
+        self.assertTrue(PlatformRuleCache.get('mastodon').matches('Make'))
+        self.assertEqual(RiskAnalyzer.get_platform_risky_keys('mastodon'), ['make'])
+
+
+class SelectiveRemovalTests(APITestCase):
+    
+    XMP = (
+        b'<x:xmpmeta xmlns:x="adobe:ns:meta/"><rdf:RDF xmlns:rdf="http://www.w3.org/1999/02/22-rdf-syntax-ns#">'
+        b'<rdf:Description rdf:about="" tiff:Orientation="6" exif:GPSLatitude="1,2N">'
+        b'<dc:creator><rdf:Seq><rdf:li>Jane Doe</rdf:li></rdf:Seq></dc:creator>'
+        b'</rdf:Description></rdf:RDF></x:xmpmeta>'
+    )
+    
+    def make_exif(self):
+        exif = Image.Exif()
+        exif[0x0112] = 6  # Orientation
+        exif[0x010F] = 'Canon'
+        exif[0x013B] = 'Jane Doe'  # Artist
+        exif.get_ifd(0x8825)[1] = 'N'
+        exif.get_ifd(0x8769)[0xA431] = 'SERIAL123'  # BodySerialNumber
+        return exif.tobytes()
+    
+    def make_image(self, fmt, **kwargs):
+        output = io.BytesIO()
+        Image.new('RGB', (32, 32), color='green').save(output, format=fmt, exif=self.make_exif(), **kwargs)
+        return output.getvalue()
+    
+    def test_jpeg_in_place(self):
+        data = self.make_image('JPEG', xmp=self.XMP)
+        rule = CompiledRule('test', ['gps', 'artist', 'serial', 'creator'])
+        
+        scrubbed, removed = ExifRewriter.scrub(data, 'image/jpeg', rule)
+        
+        self.assertEqual(len(scrubbed), len(data))
+        self.assertEqual(set(removed), {'Artist', 'BodySerialNumber', 'GPSInfo', 'dc:creator', 'exif:GPSLatitude'})
+        self.assertNotIn(b'Jane Doe', scrubbed)
+        self.assertNotIn(b'SERIAL123', scrubbed)
+        # Image data untouched
+        self.assertEqual(scrubbed[scrubbed.index(b'\xff\xda'):], data[data.index(b'\xff\xda'):])
+        
+        image = Image.open(io.BytesIO(scrubbed))
+        exif = image.getexif()
+        self.assertEqual(exif[0x0112], 6)
+        self.assertEqual(exif[0x010F], 'Canon')
+        self.assertNotIn(0x013B, exif)
+        self.assertEqual(dict(exif.get_ifd(0x8825)), {})
+        self.assertIn(b'tiff:Orientation="6"', image.info['xmp'])
+    
+    def test_png_exif_chunk(self):
+        data = self.make_image('PNG')
+        
+        scrubbed, removed = ExifRewriter.scrub(data, 'image/png', CompiledRule('test', ['artist']))
+        
+        self.assertEqual(removed, ['Artist'])
+        image = Image.open(io.BytesIO(scrubbed))
+        image.load()
+        self.assertNotIn(0x013B, image.getexif())
+        self.assertEqual(image.getexif()[0x0112], 6)
+    
+    def test_remove_selective_metadata(self):
+        data = self.make_image('JPEG')
+        
+        cleaned = MetadataRemover.remove_selective_metadata(io.BytesIO(data), 'image/jpeg', ['artist'])
+        self.assertNotIn(b'Jane Doe', cleaned.read())
+        
+        # No in-place path for GIF: everything is stripped instead
+        gif = io.BytesIO()
+        Image.new('RGB', (8, 8)).save(gif, format='GIF')
+        cleaned = MetadataRemover.remove_selective_metadata(gif, 'image/gif', ['artist'])
+        self.assertEqual(Image.open(cleaned).format, 'GIF')
+    
+    def test_truncated_input_falls_back_to_full_strip(self):
+        data = self.make_image('JPEG')
+        app1 = data.index(b'\xff\xe1')
+        png = self.make_image('PNG')
+        rule = CompiledRule('test', ['artist'])
+        
+        for truncated, file_type in (
+            (b'\xff\xd8\xff', 'image/jpeg'),
+            (b'\xff\xd8\xff\xe1\x00', 'image/jpeg'),
+            (data[:app1 + 40], 'image/jpeg'),  # APP1 cut short, EXIF included
+            (png[:len(png) // 2], 'image/png'),
+        ):
+            with self.assertRaises(ValueError):
+                ExifRewriter.scrub(truncated, file_type, rule)
+            
+            with mock.patch.object(MetadataRemover, 'remove_metadata', return_value=ContentFile(b'stripped')) as strip:
+                cleaned = MetadataRemover.remove_selective_metadata(io.BytesIO(truncated), file_type, rule)
+            strip.assert_called_once()
+            self.assertEqual(cleaned.read(), b'stripped')
+    
+    def test_clean_download_platform_mode(self):
+        PlatformRuleCache.clear()
+        self.addCleanup(PlatformRuleCache.clear)
+        upload = SimpleUploadedFile('photo.jpg', self.make_image('JPEG'), content_type='image/jpeg')
+        
+        response = self.client.post('/api/clean-download/', {
+            'file': upload, 'platform': 'linkedin', 'clean_mode': 'platform'
+        }, format='multipart')
+        
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        content = b''.join(response.streaming_content) if response.streaming else response.content
+        exif = Image.open(io.BytesIO(content)).getexif()
+        self.assertEqual(dict(exif.get_ifd(0x8825)), {})
+        self.assertEqual(exif[0x013B], 'Jane Doe')  # LinkedIn's default rule keeps Artist
+
+
+class RescoreTests(TestCase):
+    
+    def test_vectorized_matches_calculate_risk_score(self):
+        import random
+        rng = random.Random(7)
+        categories = list(RiskAnalyzer.RISK_WEIGHTS) + ['unknown']
+        analyses = [
+            [rng.choice(categories) for _ in range(rng.choice([0, 1, 2, 3, 6, 11, 25]))]
+            for _ in range(300)
+        ]
+        
+        groups = [index for index, entries in enumerate(analyses) for _ in entries]
+        codes = VectorizedRiskScorer.encode([c for entries in analyses for c in entries])
+        scores = VectorizedRiskScorer.score(groups, codes, len(analyses))
+        
+        expected = [RiskAnalyzer.calculate_risk_score([{'category': c} for c in entries]) for entries in analyses]
+        self.assertEqual(scores.tolist(), expected)
+    
+    def test_rescore_command(self):
+        stale = FileAnalysis.objects.create(original_filename='a.jpg', file_type='image/jpeg', file_size=1, status='cleaned', risk_score=3)
+        MetadataEntry.objects.create(file_analysis=stale, key='GPSInfo', value='x', category='location', risk_level='critical')
+        compact = FileAnalysis.objects.create(original_filename='b.jpg', file_type='image/jpeg', file_size=1, status='analyzed', risk_score=0)
+        compact.metadata_blob = MetadataCodec.encode([MetadataEntry(key='Make', value='x', category='device', risk_level='medium')])
+        compact.save()
+        failed = FileAnalysis.objects.create(original_filename='c.jpg', file_type='image/jpeg', file_size=1, status='failed', risk_score=0)
+        MetadataEntry.objects.create(file_analysis=failed, key='GPSInfo', value='x', category='location', risk_level='critical')
+        
+        out = io.StringIO()
+        call_command('rescore', chunk_size=1, no_stats=True, stdout=out)
+        
+        self.assertIn('Changed 2 of 2 scores', out.getvalue())
+        self.assertIn('rows/s', out.getvalue())
+        stale.refresh_from_db()
+        compact.refresh_from_db()
+        failed.refresh_from_db()
+        self.assertEqual(stale.risk_score, 85)
+        self.assertEqual(compact.risk_score, 40)
+        self.assertEqual(failed.risk_score, 0)
+
+
+class RiskMatrixTests(TempMediaMixin, APITestCase):
+    
+    def setUp(self):
+        super().setUp()
+        PlatformRuleCache.clear()
+        self.addCleanup(PlatformRuleCache.clear)
+        
+        self.user = User.objects.create_user(username='matrix', password='pass12345')
+        self.client.force_authenticate(self.user)
+        
+        exif = Image.Exif()
+        exif[0x010F] = 'Canon'  # Make
+        exif[0x013B] = 'Jane Doe'  # Artist
+        exif.get_ifd(0x8825)[1] = 'N'
+        output = io.BytesIO()
+        Image.new('RGB', (16, 16)).save(output, format='JPEG', exif=exif.tobytes())
+        
+        self.analysis = FileAnalysis.objects.create(
+            user=self.user, original_filename='photo.jpg', file_type='image/jpeg',
+            file_size=len(output.getvalue()), status='cleaned', risk_score=85, cleaned_file_sha256='stale'
+        )
+        self.analysis.original_file.save('photo.jpg', ContentFile(output.getvalue()), save=False)
+        self.analysis.cleaned_file.save('photo_clean.jpg', ContentFile(b'old'), save=False)
+        self.analysis.save()
+        for key, category in [('GPSInfo', 'location'), ('Make', 'device'), ('Artist', 'author')]:
+            MetadataEntry.objects.create(file_analysis=self.analysis, key=key, value='x', category=category, risk_level='high')
+        self.url = f'/api/analyses/{self.analysis.id}/risk-matrix/'
+    
+    def test_matrix_for_every_platform(self):
+        response = self.client.get(self.url)
+        
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        rows = {row['platform']: row for row in response.data['platforms']}
+        self.assertEqual(set(rows), set(RiskAnalyzer.PLATFORM_RISKY_KEYS))
+        self.assertCountEqual(rows['instagram']['risky_keys'], ['GPSInfo', 'Make'])
+        self.assertEqual(rows['instagram']['risk_score'], 85)
+        self.assertEqual(rows['twitter']['risky_keys'], ['GPSInfo'])
+        
+        other = User.objects.create_user(username='other', password='pass12345')
+        self.client.force_authenticate(other)
+        self.assertEqual(self.client.get(self.url).status_code, status.HTTP_404_NOT_FOUND)
+    
+    def test_commit_platform_recleans(self):
+        old_name = self.analysis.cleaned_file.name
+        
+        response = self.client.post(self.url, {'platform': 'twitter'}, format='json')
+        
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.data['recleaned'])
+        self.analysis.refresh_from_db()
+        self.assertEqual(self.analysis.platform, 'twitter')
+        self.assertEqual(self.analysis.cleaned_file_sha256, '')
+        self.assertFalse(self.analysis.cleaned_file.storage.exists(old_name))
+        with self.analysis.cleaned_file.open('rb') as f:
+            exif = Image.open(f).getexif()
+            self.assertEqual(dict(exif.get_ifd(0x8825)), {})
+            self.assertEqual(exif[0x013B], 'Jane Doe')  # not on Twitter's default list
+    
+    def test_commit_without_reclean_and_bad_platform(self):
+        response = self.client.post(self.url, {'platform': 'myspace'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        
+        response = self.client.post(self.url, {'platform': 'linkedin', 'reclean': False}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.analysis.refresh_from_db()
+        self.assertEqual(self.analysis.platform, 'linkedin')
+        self.assertEqual(self.analysis.cleaned_file_sha256, 'stale')
+
+
+class ServerTimingTests(TempMediaMixin, APITestCase):
+    
+    def setUp(self):
+        super().setUp()
+        PlatformRuleCache.clear()
+        self.addCleanup(PlatformRuleCache.clear)
+        
+        user = User.objects.create_user(username='timed', password='pass12345')
+        self.client.force_authenticate(user)
+        exif = Image.Exif()
+        exif.get_ifd(0x8825)[1] = 'N'
+        output = io.BytesIO()
+        Image.new('RGB', (16, 16)).save(output, format='JPEG', exif=exif.tobytes())
+        
+        analysis = FileAnalysis.objects.create(
+            user=user, original_filename='photo.jpg', file_type='image/jpeg',
+            file_size=len(output.getvalue()), status='cleaned'
+        )
+        analysis.original_file.save('photo.jpg', ContentFile(output.getvalue()), save=True)
+        # Re-cleaning for a platform runs the clean_selective span
+        self.url = f'/api/analyses/{analysis.id}/risk-matrix/?timings=1'
+    
+    @override_settings(SERVER_TIMING_ENABLED=True)
+    def test_server_timing_reports_stages(self):
+        response = self.client.post(self.url, {'platform': 'twitter'}, format='json')
+        
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertRegex(response['Server-Timing'], r'clean_selective;dur=[\d.]+, .*total;dur=[\d.]+')
+        self.assertIn('Server-Timing', response['Access-Control-Expose-Headers'])
+        self.assertIn('clean_selective', response.data['timings'])
+        self.assertFalse(RequestTiming.active())
+    
+    def test_server_timing_disabled(self):
+        response = self.client.post(self.url, {'platform': 'twitter'}, format='json')
+        
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotIn('Server-Timing', response)
+        self.assertNotIn('timings', response.data)
+
+
+class MetricsTests(APITestCase):
+    
+    def sample(self, name, **labels):
+        return REGISTRY.get_sample_value(name, labels) or 0
+    
+    def test_clean_pipeline_is_instrumented(self):
+        labels = {'pipeline': 'clean', 'stage': 'clean', 'file_type': 'image/jpeg', 'size_bucket': 'le_100KB'}
+        before = self.sample('automated_pipeline_stage_seconds_count', **labels)
+        image = io.BytesIO()
+        Image.new('RGB', (16, 16)).save(image, format='JPEG')
+        upload = SimpleUploadedFile('photo.jpg', image.getvalue(), content_type='image/jpeg')
+        
+        response = self.client.post('/api/clean-download/', {'file': upload}, format='multipart')
+        
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(self.sample('automated_pipeline_stage_seconds_count', **labels), before + 1)
+        self.assertEqual(self.sample('automated_pipeline_in_flight', pipeline='clean'), 0)
+        
+        response = self.client.get('/metrics')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn(b'automated_pipeline_stage_seconds_bucket{', response.content)
+        self.assertIn(b'automated_bytes_processed_total{file_type="image/jpeg",pipeline="clean"}', response.content)
+    
+    def test_file_type_labels_are_bounded(self):
+        self.assertEqual(PipelineMetrics.labels('image/JPEG; q=1', 10), ('image/jpeg', 'le_100KB'))
+        self.assertEqual(PipelineMetrics.labels('image/x-icon', 0)[0], 'image/other')
+        self.assertEqual(PipelineMetrics.labels('', 0)[0], 'other/other')
+        self.assertEqual({PipelineMetrics.labels(f'x{i}/a', 0)[0] for i in range(50)}, {'other/other'})
+    
+    def test_timed_stream_tracks_in_flight_and_failures(self):
+        def chunks():
+            yield b'abc'
+            raise ValueError('corrupt')
+        
+        stream = TimedStream(chunks(), 'decrypt', 'decrypt_stream', 'application/octet-stream', 3)
+        self.assertEqual(self.sample('automated_pipeline_in_flight', pipeline='decrypt'), 1)
+        failures = self.sample('automated_pipeline_failures_total', pipeline='decrypt', handler='decrypt_stream')
+        
+        self.assertEqual(next(stream), b'abc')
+        with self.assertRaises(ValueError):
+            next(stream)
+        stream.close()
+        
+        self.assertEqual(self.sample('automated_pipeline_in_flight', pipeline='decrypt'), 0)
+        self.assertEqual(self.sample('automated_pipeline_failures_total', pipeline='decrypt', handler='decrypt_stream'), failures + 1)
+    
+    @override_settings(METRICS_TOKEN='scrape-me')
+    def test_token_and_multiprocess_registry(self):
+        self.assertEqual(self.client.get('/metrics').status_code, status.HTTP_401_UNAUTHORIZED)
+        
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        with mock.patch.dict(os.environ, {'PROMETHEUS_MULTIPROC_DIR': directory}):
+            response = self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer scrape-me')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+
+class LogPipelineTests(APITestCase):
+    
+    def make_record(self, level=logging.INFO, **extra):
+        record = logging.makeLogRecord({'name': 'main.test', 'levelno': level, 'levelname': logging.getLevelName(level), 'msg': 'hello %s', 'args': ('world',)})
+        record.__dict__.update(extra)
+        return record
+    
+    def test_records_are_written_as_json_off_thread(self):
+        stream = io.StringIO()
+        handler = AsyncLogHandler(stream=stream)
+        handler.addFilter(RequestIdFilter())
+        
+        request_id, token = RequestContext.start('abc-123')
+        try:
+            handler.handle(self.make_record(stage='vt_poll'))
+        finally:
+            RequestContext.stop(token)
+        handler.close()
+        
+        entry = json.loads(stream.getvalue())
+        self.assertEqual(entry['msg'], 'hello world')
+        self.assertEqual(entry['request_id'], 'abc-123')
+        self.assertEqual(entry['stage'], 'vt_poll')
+    
+    def test_full_queue_drops_instead_of_blocking(self):
+        handler = AsyncLogHandler(queue_size=1, stream=io.StringIO())
+        handler.listener.stop()
+        for _ in range(3):
+            handler.handle(self.make_record())
+        self.assertEqual(handler.dropped, 2)
+        handler.listener = None
+        handler.close()
+    
+    def test_sampling_keeps_warnings_and_whole_requests(self):
+        self.assertFalse(SamplingFilter(0).filter(self.make_record()))
+        self.assertTrue(SamplingFilter(0).filter(self.make_record(logging.WARNING)))
+        self.assertTrue(SamplingFilter(0).filter(self.make_record(sample=False)))
+        
+        sampler = SamplingFilter(0.5)
+        kept = {sampler.filter(self.make_record(request_id='req-1')) for _ in range(20)}
+        self.assertEqual(len(kept), 1)
+    
+    def test_request_id_header(self):
+        response = self.client.get('/api/platform-rules/', HTTP_X_REQUEST_ID='trace-42')
+        self.assertEqual(response['X-Request-ID'], 'trace-42')
+        
+        response = self.client.get('/api/platform-rules/', HTTP_X_REQUEST_ID='bad id\n')
+        self.assertRegex(response['X-Request-ID'], r'^[0-9a-f]{32}$')
+        self.assertIsNone(RequestContext.request_id())
+
+
+class BenchmarkTests(TestCase):
+    
+    def test_corpus_is_deterministic(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        manifest = SyntheticCorpus(seed=7, scale=0.05).build(directory)
+        again = SyntheticCorpus(seed=7, scale=0.05).build(directory)
+        
+        self.assertEqual(manifest, again)
+        self.assertEqual(len(manifest['files']), 6)
+        with open(os.path.join(directory, 'photo_exif_gps.jpg'), 'rb') as f:
+            metadata = MetadataExtractor.extract_image_metadata(f)
+        self.assertIn('GPSInfo', metadata)
+        self.assertEqual(metadata['Artist'], 'Jane Doe')
+    
+    def test_harness_reports_percentiles_and_errors(self):
+        result = BenchmarkHarness.run(BenchmarkCase('noop', 'bytes', b'x' * 1024, len), iterations=5)
+        self.assertEqual(result['status'], 'ok')
+        self.assertEqual(result['iterations'], 5)
+        self.assertLessEqual(result['latency_ms']['p50'], result['latency_ms']['p99'])
+        self.assertEqual(result['output_bytes'], 1024)
+        
+        def broken(data):
+            raise ValueError('bad input')
+        result = BenchmarkHarness.run(BenchmarkCase('broken', 'bytes', b'', broken), isolate=False)
+        self.assertEqual(result['status'], 'error')
+        self.assertIn('bad input', result['error'])
+    
+    def test_office_removal_and_file_encryption_cases_run(self):
+        files = SyntheticCorpus(scale=0.05).files()
+        keys = {'MetadataRemover.remove_from_docx[site_visit.docx]', 'EncryptionHandler.encrypt_file[photo_exif_gps.jpg]'}
+        cases = [case for case in BenchmarkCases.all(files) if case.key in keys]
+        
+        self.assertEqual(len(cases), 2)
+        for case in cases:
+            result = BenchmarkHarness.run(case, isolate=False, iterations=1, warmup=0)
+            self.assertEqual(result['status'], 'ok', result.get('error'))
+
+
+class OfficeRemovalTests(TestCase):
+    
+    def core_xml(self, content):
+        with zipfile.ZipFile(io.BytesIO(content)) as archive:
+            return archive.read('docProps/core.xml')
+    
+    def assert_no_dates(self, core):
+        for tag in (b'dcterms:created', b'dcterms:modified', b'cp:lastPrinted'):
+            self.assertNotIn(tag, core)
+    
+    def test_docx_dates_removed(self):
+        doc = Document()
+        doc.core_properties.author = 'Jane Doe'
+        doc.core_properties.created = timezone.now()
+        doc.core_properties.modified = timezone.now()
+        doc.core_properties.last_printed = timezone.now()
+        source = io.BytesIO()
+        doc.save(source)
+        self.assertIn(b'dcterms:created', self.core_xml(source.getvalue()))
+        
+        core = self.core_xml(MetadataRemover.remove_from_docx(source).read())
+        
+        self.assert_no_dates(core)
+        self.assertNotIn(b'Jane Doe', core)
+    
+    def test_pptx_dates_removed(self):
+        prs = Presentation()
+        prs.core_properties.author = 'Jane Doe'
+        prs.core_properties.created = timezone.now()
+        prs.core_properties.modified = timezone.now()
+        source = io.BytesIO()
+        prs.save(source)
+        self.assertIn(b'dcterms:modified', self.core_xml(source.getvalue()))
+        
+        core = self.core_xml(MetadataRemover.remove_from_pptx(source).read())
+        
+        self.assert_no_dates(core)
+        self.assertNotIn(b'Jane Doe', core)
+    
+    def test_dates_removed_without_element_helpers(self):
+        # A plain lxml element has no _remove_* methods, so the tag fallback runs
+        element = etree.fromstring(
+            '<cp:coreProperties xmlns:cp="http://schemas.openxmlformats.org/package/2006/metadata/core-properties" '
+            'xmlns:dcterms="http://purl.org/dc/terms/" xmlns:dc="http://purl.org/dc/elements/1.1/">'
+            '<dc:title>Report</dc:title><dcterms:created>2024-01-01T00:00:00Z</dcterms:created>'
+            '<dcterms:modified>2024-01-02T00:00:00Z</dcterms:modified>'
+            '<cp:lastPrinted>2024-01-03T00:00:00Z</cp:lastPrinted></cp:coreProperties>'
+        )
+        
+        MetadataRemover.remove_core_dates(mock.Mock(_element=element))
+        
+        self.assertEqual([child.tag for child in element], ['{http://purl.org/dc/elements/1.1/}title'])
+
+
+class FakeVirusTotalTests(TempMediaMixin, APITestCase):
+    
+    def setUp(self):
+        super().setUp()
+        self.vt = FakeVirusTotalServer(pending_polls=1).start()
+        self.addCleanup(self.vt.stop)
+        self.addCleanup(VirusTotalClient.reset)
+        self.use_settings(VIRUSTOTAL_BASE_URL=self.vt.url, VIRUSTOTAL_API_KEY='test', VIRUSTOTAL_POLL_DELAY=0)
+    
+    def upload(self, extra=b''):
+        image = io.BytesIO()
+        Image.new('RGB', (16, 16)).save(image, format='JPEG')
+        return SimpleUploadedFile('photo.jpg', image.getvalue() + extra, content_type='image/jpeg')
+    
+    def test_verdicts(self):
+        self.assertEqual(FakeVirusTotalServer.file_content(b'plain', 'application/octet-stream'), b'plain')
+        with mock.patch.object(self.vt, 'pending_polls', 0):
+            response = self.client.post('/api/analyze/', {'file': self.upload(EICAR)}, format='multipart')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data['status'], 'blocked')
+        self.assertEqual(self.vt.counts, {'uploads': 1, 'polls': 1, 'errors': 0})
+    
+    def test_requires_api_key_and_reports_pending(self):
+        import requests
+        self.assertEqual(requests.post(f'{self.vt.url}/files', data=b'x').status_code, 401)
+        
+        upload = requests.post(f'{self.vt.url}/files', files={'file': ('a.txt', b'hello')}, headers={'x-apikey': 'k'})
+        analysis_url = f"{self.vt.url}/analyses/{upload.json()['data']['id']}"
+        first = requests.get(analysis_url, headers={'x-apikey': 'k'}).json()
+        second = requests.get(analysis_url, headers={'x-apikey': 'k'}).json()
+        self.assertEqual(first['data']['attributes']['status'], 'queued')
+        self.assertEqual(second['data']['attributes']['status'], 'completed')
+        self.assertEqual(second['data']['attributes']['stats']['malicious'], 0)
+
+
+@override_settings(
+    VIRUSTOTAL_API_KEY='test', VIRUSTOTAL_POLL_DELAY=0, VIRUSTOTAL_BACKOFF_BASE=0,
+    VIRUSTOTAL_MAX_RETRIES=3, VIRUSTOTAL_BREAKER_THRESHOLD=2, VIRUSTOTAL_BREAKER_COOLDOWN=60
+)
+class VirusTotalClientTests(TempMediaMixin, APITestCase):
+    
+    def serve(self, **options):
+        vt = FakeVirusTotalServer(**options).start()
+        self.addCleanup(vt.stop)
+        self.use_settings(VIRUSTOTAL_BASE_URL=vt.url)
+        self.addCleanup(VirusTotalClient.reset)
+        return vt
+    
+    def test_polls_until_completed(self):
+        vt = self.serve(pending_polls=2)
+        analysis_id, stats = VirusTotalClient.scan(io.BytesIO(b'clean file'), 'a.txt')
+        self.assertTrue(analysis_id)
+        self.assertEqual(stats['undetected'], 70)
+        self.assertEqual(vt.counts['polls'], 3)
+    
+    def test_poll_timeout(self):
+        self.serve(pending_polls=1000)
+        with override_settings(VIRUSTOTAL_POLL_TIMEOUT=0):
+            with self.assertRaisesMessage(VirusTotalUnavailable, "still 'queued'"):
+                VirusTotalClient.scan(io.BytesIO(b'x'), 'a.txt')
+    
+    def test_retries_transient_errors_and_reuses_connections(self):
+        vt = self.serve(error_rate=0.3, seed=3)
+        upload = io.BytesIO(b'abc')
+        upload.seek(1)
+        with self.assertLogs('main.utils.virustotal', 'WARNING') as logs:
+            for i in range(5):
+                VirusTotalClient.scan(io.BytesIO(b'file %d' % i), 'a.txt')
+            VirusTotalClient.upload(upload, 'a.txt')
+        self.assertGreater(vt.counts['errors'], 0)
+        self.assertEqual(len(logs.records), vt.counts['errors'])
+        self.assertIn('retrying', logs.output[0])
+        self.assertEqual(vt.counts['uploads'], 6)
+        self.assertIs(VirusTotalClient.session(), VirusTotalClient.session())
+        self.assertEqual(upload.tell(), 1)
+    
+    def test_read_timeout(self):
+        self.serve(latency=0.5)
+        with override_settings(VIRUSTOTAL_READ_TIMEOUT=0.05, VIRUSTOTAL_MAX_RETRIES=0):
+            with self.assertRaisesMessage(VirusTotalUnavailable, 'ReadTimeout'):
+                VirusTotalClient.upload(io.BytesIO(b'x'), 'a.txt')
+    
+    def test_client_errors_are_not_retried(self):
+        vt = self.serve()
+        with override_settings(VIRUSTOTAL_API_KEY=''):
+            with self.assertRaisesMessage(VirusTotalUnavailable, '401'):
+                VirusTotalClient.upload(io.BytesIO(b'x'), 'a.txt')
+        self.assertEqual(vt.counts['uploads'], 0)
+        self.assertFalse(VirusTotalClient.is_open())
+    
+    def test_circuit_breaker(self):
+        vt = self.serve(error_rate=1.0)
+        with self.assertLogs('main.utils.virustotal', 'WARNING') as logs:
+            for _ in range(2):
+                with self.assertRaisesMessage(VirusTotalUnavailable, '4 attempts'):
+                    VirusTotalClient.upload(io.BytesIO(b'x'), 'a.txt')
+        self.assertEqual(vt.counts['errors'], 8)
+        self.assertIn('VirusTotal circuit opened', logs.output[-1])
+        self.assertTrue(VirusTotalClient.is_open())
+        
+        with self.assertRaisesMessage(VirusTotalUnavailable, 'circuit is open'):
+            VirusTotalClient.upload(io.BytesIO(b'x'), 'a.txt')
+        self.assertEqual(vt.counts['errors'], 8)
+        
+        image = io.BytesIO()
+        Image.new('RGB', (8, 8)).save(image, format='JPEG')
+        with self.assertLogs(level='WARNING') as logs, self.assertLogs('django.request', 'ERROR'):
+            response = self.client.post('/api/analyze/', {
+                'file': SimpleUploadedFile('photo.jpg', image.getvalue(), content_type='image/jpeg')
+            }, format='multipart')
+        self.assertEqual(response.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+        self.assertIn('WARNING:main.views:VirusTotal unavailable', logs.output)
+        
+        # After the cooldown one trial call goes through and closes the circuit
+        vt.error_rate = 0
+        with override_settings(VIRUSTOTAL_BREAKER_COOLDOWN=0):
+            VirusTotalClient.upload(io.BytesIO(b'x'), 'a.txt')
+        self.assertFalse(VirusTotalClient.is_open())
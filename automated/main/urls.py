@@ -2,7 +2,9 @@ from django.urls import path, include
 from rest_framework.routers import DefaultRouter
 from .views import (
     DecryptFileView,
+    DecryptRangeView,
     EncryptFileView,
+    BatchEncryptFileView,
     FileAnalysisViewSet,
     AnalyzeFileView,
     CleanFileView,
@@ -12,6 +14,7 @@ from .views import (
     MakePublicView,
     PlatformRuleViewSet,
     HealthCheckView,
+    UserStatsView,
     ValidatePasswordView,
     RegisterView, LoginView, LogoutView, UserProfileView,
     UpdateProfileView, ChangePasswordView, DeleteAccountView,GoogleCallbackView, GoogleLoginView
@@ -41,8 +44,11 @@ urlpatterns = [
     path('share/<uuid:share_token>/', ShareFileView.as_view(), name='share-file'),
     path('make-public/<uuid:pk>/', MakePublicView.as_view(), name='make-public'),
     path('health/', HealthCheckView.as_view(), name='health-check'),
+    path('stats/', UserStatsView.as_view(), name='user-stats'),
     path('encrypt/', EncryptFileView.as_view(), name='encrypt-file'),
+    path('encrypt/batch/', BatchEncryptFileView.as_view(), name='encrypt-batch'),
     path('decrypt/', DecryptFileView.as_view(), name='decrypt-file'),
+    path('decrypt/range/', DecryptRangeView.as_view(), name='decrypt-range'),
     path('validate-password/', ValidatePasswordView.as_view(), name='validate-password'),
     
 ]
\ No newline at end of file
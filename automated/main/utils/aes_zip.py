@@ -0,0 +1,177 @@
+import hmac
+import os
+import struct
+import time
+import zlib
+import numpy as np
+from cryptography.hazmat.backends import default_backend
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
+from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
+
+
+class AESZipWriter:
+    """
+    Streaming writer for WinZip AES-256 encrypted ZIP archives (AE-2).
+
+    Each entry is deflated, encrypted and authenticated while it is read, and
+    written with a data descriptor, so the archive can be sent to the client as
+    it is produced. No temporary files are used and only one chunk of each
+    file is held in memory. The archives open in 7-Zip, WinZip and pyzipper.
+
+    Usage:
+        writer = AESZipWriter(password)
+        for name, file_obj in files:
+            yield from writer.write_file(name, file_obj)
+        yield writer.close()
+    """
+
+    READ_SIZE = 64 * 1024
+    SALT_LENGTH = 16           # AES-256
+    KDF_ITERATIONS = 1000      # fixed by the WinZip AES specification
+    MAC_LENGTH = 10
+    METHOD_AES = 99
+    VERSION_NEEDED = 51
+    FLAGS = 0x0001 | 0x0008 | 0x0800  # encrypted, data descriptor, UTF-8 name
+    MAX_SIZE = 0xFFFFFFFF      # no ZIP64 support; uploads are capped far below this
+
+    def __init__(self, password: str, compression_level: int = 5):
+        self.password = password.encode('utf-8')
+        self.compression_level = compression_level
+        self.offset = 0
+        self.entries = []
+        self.names = set()
+
+    def _derive_keys(self, salt: bytes) -> tuple:
+        kdf = PBKDF2HMAC(
+            algorithm=hashes.SHA1(),
+            length=66,
+            salt=salt,
+            iterations=AESZipWriter.KDF_ITERATIONS,
+            backend=default_backend()
+        )
+        key_material = kdf.derive(self.password)
+        return key_material[:32], key_material[32:64], key_material[64:]
+
+    @staticmethod
+    def _dos_datetime(timestamp: float) -> tuple:
+        t = time.localtime(timestamp)
+        dos_time = (t.tm_hour << 11) | (t.tm_min << 5) | (t.tm_sec // 2)
+        dos_date = ((max(t.tm_year, 1980) - 1980) << 9) | (t.tm_mon << 5) | t.tm_mday
+        return dos_time, dos_date
+
+    @staticmethod
+    def _aes_extra(method: int) -> bytes:
+        # 0x9901 AES extra field: vendor version AE-2, vendor 'AE', strength 3 (AES-256), real method
+        return struct.pack('<HHH2sBH', 0x9901, 7, 2, b'AE', 3, method)
+
+    def _emit(self, data: bytes) -> bytes:
+        self.offset += len(data)
+        return data
+
+    def unique_name(self, name: str) -> str:
+        """name, or name_1, name_2, ... before the extension when an entry already has it"""
+        stem, dot, extension = name.rpartition('.')
+        if not dot:
+            stem, extension = name, ''
+        candidate = name
+        counter = 1
+        while candidate in self.names:
+            candidate = f"{stem}_{counter}{dot}{extension}"
+            counter += 1
+        self.names.add(candidate)
+        return candidate
+
+    def write_file(self, name: str, file_obj, compress: bool = True):
+        """Yield the bytes of one encrypted entry read from file_obj; duplicate names get a suffix"""
+        name_bytes = self.unique_name(name).encode('utf-8')
+        method = zlib.DEFLATED if compress else 0
+        extra = AESZipWriter._aes_extra(method)
+        dos_time, dos_date = AESZipWriter._dos_datetime(time.time())
+        header_offset = self.offset
+
+        yield self._emit(struct.pack(
+            '<IHHHHHIIIHH',
+            0x04034b50, AESZipWriter.VERSION_NEEDED, AESZipWriter.FLAGS, AESZipWriter.METHOD_AES,
+            dos_time, dos_date, 0, 0, 0, len(name_bytes), len(extra)
+        ) + name_bytes + extra)
+
+        salt = os.urandom(AESZipWriter.SALT_LENGTH)
+        aes_key, mac_key, verifier = self._derive_keys(salt)
+        ecb = Cipher(algorithms.AES(aes_key), modes.ECB(), backend=default_backend()).encryptor()
+        mac = hmac.new(mac_key, digestmod='sha1')
+        compressor = zlib.compressobj(self.compression_level, zlib.DEFLATED, -15) if compress else None
+
+        yield self._emit(salt + verifier)
+        compressed_size = AESZipWriter.SALT_LENGTH + len(verifier)
+        uncompressed_size = 0
+        counter = 1
+        pending = b''
+
+        def encrypt(data: bytes) -> bytes:
+            # WinZip CTR: AES-ECB over a little-endian 128-bit counter starting at 1
+            nonlocal counter
+            block_count = -(-len(data) // 16)
+            counter_blocks = np.zeros((block_count, 2), dtype='<u8')
+            counter_blocks[:, 0] = np.arange(counter, counter + block_count, dtype='<u8')
+            counter += block_count
+            keystream = np.frombuffer(ecb.update(counter_blocks.tobytes()), dtype=np.uint8)
+            encrypted = (np.frombuffer(data, dtype=np.uint8) ^ keystream[:len(data)]).tobytes()
+            mac.update(encrypted)
+            return encrypted
+
+        if hasattr(file_obj, 'seek'):
+            file_obj.seek(0)
+
+        while True:
+            chunk = file_obj.read(AESZipWriter.READ_SIZE)
+            if not chunk:
+                break
+            uncompressed_size += len(chunk)
+            pending += compressor.compress(chunk) if compressor else chunk
+
+            # Encrypt whole blocks only so the counter stays aligned across chunks
+            aligned = len(pending) - len(pending) % 16
+            if aligned:
+                encrypted = encrypt(pending[:aligned])
+                pending = pending[aligned:]
+                compressed_size += len(encrypted)
+                yield self._emit(encrypted)
+
+        if compressor:
+            pending += compressor.flush()
+        if pending:
+            encrypted = encrypt(pending)
+            compressed_size += len(encrypted)
+            yield self._emit(encrypted)
+
+        auth_code = mac.digest()[:AESZipWriter.MAC_LENGTH]
+        compressed_size += len(auth_code)
+
+        if compressed_size > AESZipWriter.MAX_SIZE or uncompressed_size > AESZipWriter.MAX_SIZE:
+            raise ValueError("File too large for a ZIP archive without ZIP64")
+
+        # AE-2 stores no CRC; integrity is covered by the authentication code
+        yield self._emit(auth_code + struct.pack('<IIII', 0x08074b50, 0, compressed_size, uncompressed_size))
+
+        self.entries.append((name_bytes, extra, dos_time, dos_date, compressed_size, uncompressed_size, header_offset))
+
+    def close(self) -> bytes:
+        """Return the central directory and end-of-archive record"""
+        directory = []
+        for name_bytes, extra, dos_time, dos_date, compressed_size, uncompressed_size, header_offset in self.entries:
+            directory.append(struct.pack(
+                '<IHHHHHHIIIHHHHHII',
+                0x02014b50, AESZipWriter.VERSION_NEEDED, AESZipWriter.VERSION_NEEDED,
+                AESZipWriter.FLAGS, AESZipWriter.METHOD_AES, dos_time, dos_date,
+                0, compressed_size, uncompressed_size,
+                len(name_bytes), len(extra), 0, 0, 0, 0, header_offset
+            ) + name_bytes + extra)
+
+        directory = b''.join(directory)
+        end_record = struct.pack(
+            '<IHHHHIIH',
+            0x06054b50, 0, 0, len(self.entries), len(self.entries),
+            len(directory), self.offset, 0
+        )
+        return self._emit(directory + end_record)
@@ -1,7 +1,8 @@
 from .metadata_extractor import MetadataExtractor
 from .metadata_remover import MetadataRemover
 from .risk_analyzer import RiskAnalyzer
-from ..models import FileAnalysis, MetadataEntry
+from .platform_rules import PlatformRuleCache
+from ..models import FileAnalysis, MetadataEntry, UserStats
 from django.db import transaction
 
 class BatchProcessor:
@@ -46,14 +47,14 @@ class BatchProcessor:
             category = MetadataExtractor.categorize_metadata(key, value)
             risk_level = RiskAnalyzer.get_risk_level(category)
             
-            entry = MetadataEntry.objects.create(
+            metadata_entries.append(MetadataEntry(
                 file_analysis=file_analysis,
                 key=key,
                 value=value,
                 category=category,
                 risk_level=risk_level
-            )
-            metadata_entries.append(entry)
+            ))
+        file_analysis.store_metadata_entries(metadata_entries)
         
         metadata_entries_data = [
             {
@@ -71,11 +72,13 @@ class BatchProcessor:
         file_analysis.risk_score = risk_score
         file_analysis.status = 'analyzed'
         file_analysis.save()
+        UserStats.record_analysis(file_analysis, [e.category for e in metadata_entries])
         
         return {
             'analysis_id': file_analysis.id,
             'risk_score': risk_score,
-            'metadata_count': len(metadata_entries)
+            'metadata_count': len(metadata_entries),
+            'platform_risky_keys': PlatformRuleCache.get(platform).risky_keys(e.key for e in metadata_entries)
         }
     
     @staticmethod
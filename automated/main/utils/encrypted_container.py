@@ -0,0 +1,404 @@
+import hmac
+import os
+import struct
+import tempfile
+from cryptography.exceptions import InvalidTag
+from cryptography.hazmat.backends import default_backend
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+from cryptography.hazmat.primitives.kdf.hkdf import HKDF
+from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
+from .kdf_pool import run_kdf
+
+
+class EncryptedContainer:
+    """
+    Versioned, chunked AES-256-GCM container (format v2).
+
+    Layout (all integers big-endian):
+        magic           6 bytes   b'MRENC' + version byte
+        kdf             1 byte    1 = PBKDF2-SHA256(password, salt)
+                                  2 = HKDF-SHA256(PBKDF2-SHA256(password, master_salt), salt)
+        iterations      4 bytes
+        salt            16 bytes
+        nonce_prefix    7 bytes
+        chunk_size      4 bytes
+        plaintext_size  8 bytes
+        name_length     2 bytes
+        master_salt     16 bytes  kdf 2 only
+        name            name_length bytes (UTF-8)
+        verifier        32 bytes  HMAC-SHA256(verify_key, preceding header bytes)
+        chunks          AES-GCM(ciphertext + 16-byte tag) per chunk_size of plaintext
+
+    Each chunk nonce is nonce_prefix + 4-byte chunk counter + 1-byte final flag,
+    so chunks cannot be reordered, dropped or truncated, and the verifier is used
+    as associated data to bind every chunk to its header. A wrong password is
+    rejected by the verifier before any chunk is read.
+
+    kdf 2 lets a batch of files share one PBKDF2 run: the master key is derived
+    once and each file still gets its own salt, subkeys and nonce prefix.
+    """
+
+    MAGIC = b'MRENC'
+    VERSION = 2
+    KDF_PBKDF2 = 1
+    KDF_HKDF_MASTER = 2
+    ITERATIONS = 100000
+    SALT_LENGTH = 16
+    NONCE_PREFIX_LENGTH = 7
+    TAG_LENGTH = 16
+    VERIFIER_LENGTH = 32
+    DEFAULT_CHUNK_SIZE = 64 * 1024
+    # Headers come from uploaded files: anything else could pin a worker in
+    # PBKDF2 or make it allocate one huge chunk
+    MAX_CHUNK_SIZE = 4 * 1024 * 1024
+
+    # magic+version, kdf, iterations, salt, nonce prefix, chunk size, plaintext size, name length
+    _FIXED_HEADER = struct.Struct('>6sBI16s7sIQH')
+
+    @staticmethod
+    def is_container(prefix: bytes) -> bool:
+        """Check whether the leading bytes of a file belong to this format"""
+        return prefix[:6] == EncryptedContainer.MAGIC + bytes([EncryptedContainer.VERSION])
+
+    @staticmethod
+    def _pbkdf2(password: str, salt: bytes, iterations: int, length: int) -> bytes:
+        kdf = PBKDF2HMAC(
+            algorithm=hashes.SHA256(),
+            length=length,
+            salt=salt,
+            iterations=iterations,
+            backend=default_backend()
+        )
+        return run_kdf(kdf.derive, password.encode())
+
+    @staticmethod
+    def derive_keys(password: str, salt: bytes, iterations: int = ITERATIONS) -> tuple:
+        """Derive (encryption_key, verify_key) from password"""
+        key_material = EncryptedContainer._pbkdf2(password, salt, iterations, 64)
+        return key_material[:32], key_material[32:]
+
+    @staticmethod
+    def derive_master_key(password: str, master_salt: bytes = None, iterations: int = ITERATIONS) -> tuple:
+        """Run PBKDF2 once for a batch; returns (master_key, master_salt)"""
+        if master_salt is None:
+            master_salt = os.urandom(EncryptedContainer.SALT_LENGTH)
+        return EncryptedContainer._pbkdf2(password, master_salt, iterations, 32), master_salt
+
+    @staticmethod
+    def derive_file_keys(master_key: bytes, salt: bytes) -> tuple:
+        """Derive per-file (encryption_key, verify_key) from a master key with HKDF"""
+        key_material = HKDF(
+            algorithm=hashes.SHA256(),
+            length=64,
+            salt=salt,
+            info=b'MRENC v2 file keys',
+            backend=default_backend()
+        ).derive(master_key)
+        return key_material[:32], key_material[32:]
+
+    @staticmethod
+    def encrypted_size(plaintext_size: int, filename: str = 'file',
+                       chunk_size: int = DEFAULT_CHUNK_SIZE, master: bool = False) -> int:
+        """Exact size of the container for a given plaintext size"""
+        chunk_count = max(1, -(-plaintext_size // chunk_size))
+        header_size = (
+            EncryptedContainer._FIXED_HEADER.size
+            + (EncryptedContainer.SALT_LENGTH if master else 0)
+            + len(filename.encode('utf-8'))
+            + EncryptedContainer.VERIFIER_LENGTH
+        )
+        return header_size + plaintext_size + chunk_count * EncryptedContainer.TAG_LENGTH
+
+    @staticmethod
+    def _nonce(prefix: bytes, counter: int, final: bool) -> bytes:
+        return prefix + struct.pack('>IB', counter, 1 if final else 0)
+
+    @staticmethod
+    def encrypt_stream(file_obj, password: str, plaintext_size: int, filename: str = None,
+                       chunk_size: int = DEFAULT_CHUNK_SIZE, master: tuple = None):
+        """
+        Encrypt file_obj chunk by chunk, yielding the container as it is built.
+        Only one plaintext chunk and one ciphertext chunk are held in memory.
+        Pass master=(master_key, master_salt) from derive_master_key() to skip
+        the per-file PBKDF2 run; password is then unused.
+        """
+        filename_bytes = (filename or 'file').encode('utf-8')
+        salt = os.urandom(EncryptedContainer.SALT_LENGTH)
+        nonce_prefix = os.urandom(EncryptedContainer.NONCE_PREFIX_LENGTH)
+
+        if master:
+            master_key, master_salt = master
+            enc_key, verify_key = EncryptedContainer.derive_file_keys(master_key, salt)
+            kdf, extra = EncryptedContainer.KDF_HKDF_MASTER, master_salt
+        else:
+            enc_key, verify_key = EncryptedContainer.derive_keys(password, salt)
+            kdf, extra = EncryptedContainer.KDF_PBKDF2, b''
+
+        header = EncryptedContainer._FIXED_HEADER.pack(
+            EncryptedContainer.MAGIC + bytes([EncryptedContainer.VERSION]),
+            kdf,
+            EncryptedContainer.ITERATIONS,
+            salt,
+            nonce_prefix,
+            chunk_size,
+            plaintext_size,
+            len(filename_bytes)
+        ) + extra + filename_bytes
+        verifier = hmac.new(verify_key, header, 'sha256').digest()
+
+        def generate():
+            yield header + verifier
+
+            aesgcm = AESGCM(enc_key)
+            file_obj.seek(0)
+            counter = 0
+            total = 0
+            chunk = file_obj.read(chunk_size)
+
+            while True:
+                next_chunk = file_obj.read(chunk_size) if len(chunk) == chunk_size else b''
+                final = not next_chunk
+                total += len(chunk)
+                nonce = EncryptedContainer._nonce(nonce_prefix, counter, final)
+                yield aesgcm.encrypt(nonce, chunk, verifier)
+
+                if final:
+                    break
+                chunk = next_chunk
+                counter += 1
+
+            if total != plaintext_size:
+                raise ValueError("Encryption failed: input size changed while streaming")
+
+        return generate()
+
+    @staticmethod
+    def read_header(file_obj, password: str) -> dict:
+        """
+        Parse and verify the container header.
+        Raises ValueError on a wrong password before any chunk is read.
+        """
+        file_obj.seek(0)
+        fixed = file_obj.read(EncryptedContainer._FIXED_HEADER.size)
+        if len(fixed) != EncryptedContainer._FIXED_HEADER.size or not EncryptedContainer.is_container(fixed):
+            raise ValueError("Not an encrypted container")
+
+        (_, kdf, iterations, salt, nonce_prefix,
+         chunk_size, plaintext_size, name_length) = EncryptedContainer._FIXED_HEADER.unpack(fixed)
+
+        if (kdf not in (EncryptedContainer.KDF_PBKDF2, EncryptedContainer.KDF_HKDF_MASTER)
+                or iterations != EncryptedContainer.ITERATIONS
+                or not 0 < chunk_size <= EncryptedContainer.MAX_CHUNK_SIZE):
+            raise ValueError("Unsupported container parameters")
+
+        extra = file_obj.read(EncryptedContainer.SALT_LENGTH) if kdf == EncryptedContainer.KDF_HKDF_MASTER else b''
+        filename_bytes = file_obj.read(name_length)
+        verifier = file_obj.read(EncryptedContainer.VERIFIER_LENGTH)
+        if len(filename_bytes) != name_length or len(verifier) != EncryptedContainer.VERIFIER_LENGTH:
+            raise ValueError("Truncated container header")
+
+        if kdf == EncryptedContainer.KDF_HKDF_MASTER:
+            master_key, _ = EncryptedContainer.derive_master_key(password, extra, iterations)
+            enc_key, verify_key = EncryptedContainer.derive_file_keys(master_key, salt)
+        else:
+            enc_key, verify_key = EncryptedContainer.derive_keys(password, salt, iterations)
+        expected = hmac.new(verify_key, fixed + extra + filename_bytes, 'sha256').digest()
+        if not hmac.compare_digest(expected, verifier):
+            raise ValueError("Wrong password or corrupted file")
+
+        return {
+            'key': enc_key,
+            'verifier': verifier,
+            'nonce_prefix': nonce_prefix,
+            'chunk_size': chunk_size,
+            'plaintext_size': plaintext_size,
+            'filename': filename_bytes.decode('utf-8'),
+            'data_offset': len(fixed) + len(extra) + name_length + EncryptedContainer.VERIFIER_LENGTH,
+        }
+
+    @staticmethod
+    def decrypt_stream(file_obj, header: dict):
+        """
+        Yield decrypted chunks of a container whose header was verified by
+        read_header(). Every chunk is authenticated before it is yielded.
+        """
+        aesgcm = AESGCM(header['key'])
+        block_size = header['chunk_size'] + EncryptedContainer.TAG_LENGTH
+
+        file_obj.seek(header['data_offset'])
+        counter = 0
+        total = 0
+        block = file_obj.read(block_size)
+
+        while True:
+            next_block = file_obj.read(block_size) if len(block) == block_size else b''
+            final = not next_block
+            nonce = EncryptedContainer._nonce(header['nonce_prefix'], counter, final)
+            try:
+                chunk = aesgcm.decrypt(nonce, block, header['verifier'])
+            except InvalidTag:
+                raise ValueError("Decryption failed: corrupted or truncated file")
+
+            total += len(chunk)
+            yield chunk
+
+            if final:
+                break
+            block = next_block
+            counter += 1
+
+        if total != header['plaintext_size']:
+            raise ValueError("Decryption failed: corrupted or truncated file")
+
+    @staticmethod
+    def chunk_count(header: dict) -> int:
+        return max(1, -(-header['plaintext_size'] // header['chunk_size']))
+
+    @staticmethod
+    def chunk_offset(header: dict, index: int) -> int:
+        """Position of chunk `index` in the container; chunks are fixed-size, so no table is needed"""
+        return header['data_offset'] + index * (header['chunk_size'] + EncryptedContainer.TAG_LENGTH)
+
+    @staticmethod
+    def decrypt_range(file_obj, header: dict, start: int, end: int):
+        """
+        Yield plaintext bytes start..end (inclusive), decrypting and
+        authenticating only the chunks that cover the range.
+        """
+        aesgcm = AESGCM(header['key'])
+        chunk_size = header['chunk_size']
+        last_index = EncryptedContainer.chunk_count(header) - 1
+
+        for index in range(start // chunk_size, end // chunk_size + 1):
+            chunk_start = index * chunk_size
+            plain_length = min(chunk_size, header['plaintext_size'] - chunk_start)
+
+            file_obj.seek(EncryptedContainer.chunk_offset(header, index))
+            block = file_obj.read(plain_length + EncryptedContainer.TAG_LENGTH)
+            nonce = EncryptedContainer._nonce(header['nonce_prefix'], index, index == last_index)
+            try:
+                chunk = aesgcm.decrypt(nonce, block, header['verifier'])
+            except InvalidTag:
+                raise ValueError("Decryption failed: corrupted or truncated file")
+
+            yield chunk[max(start, chunk_start) - chunk_start:min(end + 1, chunk_start + plain_length) - chunk_start]
+
+
+class WebCryptoContainer:
+    """
+    The browser extension's format (extension/crypto.js):
+        salt (16) + iv (12) + AES-256-GCM ciphertext + tag (16)
+    with the key derived by PBKDF2-SHA256 over 100,000 iterations.
+
+    It is a single GCM message, so the tag is only known at the end. Encryption
+    streams directly; decryption streams into a spooled temporary file and only
+    releases plaintext once the tag has been verified.
+    """
+
+    SALT_LENGTH = 16
+    IV_LENGTH = 12
+    TAG_LENGTH = 16
+    ITERATIONS = 100000
+    READ_SIZE = 64 * 1024
+    SPOOL_MAX_SIZE = 10 * 1024 * 1024
+
+    @staticmethod
+    def derive_key(password: str, salt: bytes) -> bytes:
+        kdf = PBKDF2HMAC(
+            algorithm=hashes.SHA256(),
+            length=32,
+            salt=salt,
+            iterations=WebCryptoContainer.ITERATIONS,
+            backend=default_backend()
+        )
+        return run_kdf(kdf.derive, password.encode())
+
+    @staticmethod
+    def encrypted_size(plaintext_size: int) -> int:
+        return (
+            WebCryptoContainer.SALT_LENGTH
+            + WebCryptoContainer.IV_LENGTH
+            + plaintext_size
+            + WebCryptoContainer.TAG_LENGTH
+        )
+
+    @staticmethod
+    def encrypt_stream(file_obj, password: str):
+        """Encrypt file_obj into the extension format, yielding output as it is produced"""
+        salt = os.urandom(WebCryptoContainer.SALT_LENGTH)
+        iv = os.urandom(WebCryptoContainer.IV_LENGTH)
+        encryptor = Cipher(
+            algorithms.AES(WebCryptoContainer.derive_key(password, salt)),
+            modes.GCM(iv),
+            backend=default_backend()
+        ).encryptor()
+
+        def generate():
+            yield salt + iv
+            file_obj.seek(0)
+            while True:
+                chunk = file_obj.read(WebCryptoContainer.READ_SIZE)
+                if not chunk:
+                    break
+                yield encryptor.update(chunk)
+            yield encryptor.finalize() + encryptor.tag
+
+        return generate()
+
+    @staticmethod
+    def decrypt(file_obj, password: str) -> tuple:
+        """
+        Decrypt and authenticate file_obj.
+        Returns (plaintext_size, iterator of plaintext chunks); raises ValueError
+        on a wrong password or corrupted file before anything is returned.
+        """
+        file_obj.seek(0, os.SEEK_END)
+        total_size = file_obj.tell()
+        header_size = WebCryptoContainer.SALT_LENGTH + WebCryptoContainer.IV_LENGTH
+        ciphertext_size = total_size - header_size - WebCryptoContainer.TAG_LENGTH
+        if ciphertext_size < 0:
+            raise ValueError("Truncated encrypted file")
+
+        file_obj.seek(total_size - WebCryptoContainer.TAG_LENGTH)
+        tag = file_obj.read(WebCryptoContainer.TAG_LENGTH)
+        file_obj.seek(0)
+        salt = file_obj.read(WebCryptoContainer.SALT_LENGTH)
+        iv = file_obj.read(WebCryptoContainer.IV_LENGTH)
+
+        decryptor = Cipher(
+            algorithms.AES(WebCryptoContainer.derive_key(password, salt)),
+            modes.GCM(iv, tag),
+            backend=default_backend()
+        ).decryptor()
+
+        output = tempfile.SpooledTemporaryFile(max_size=WebCryptoContainer.SPOOL_MAX_SIZE)
+        try:
+            remaining = ciphertext_size
+            while remaining:
+                chunk = file_obj.read(min(WebCryptoContainer.READ_SIZE, remaining))
+                if not chunk:
+                    raise ValueError("Truncated encrypted file")
+                remaining -= len(chunk)
+                output.write(decryptor.update(chunk))
+            output.write(decryptor.finalize())
+        except InvalidTag:
+            output.close()
+            raise ValueError("Wrong password or corrupted file")
+        except Exception:
+            output.close()
+            raise
+
+        def generate():
+            try:
+                output.seek(0)
+                while True:
+                    chunk = output.read(WebCryptoContainer.READ_SIZE)
+                    if not chunk:
+                        break
+                    yield chunk
+            finally:
+                output.close()
+
+        return ciphertext_size, generate()
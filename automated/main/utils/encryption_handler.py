@@ -10,6 +10,31 @@ import base64
 from PyPDF2 import PdfReader, PdfWriter
 import zipfile
 import pyminizip
+from .encrypted_container import EncryptedContainer, WebCryptoContainer
+from .kdf_pool import run_kdf
+from .aes_zip import AESZipWriter
+from .pdf_protector import PDFProtector
+from .timing import RequestTiming
+import time
+
+
+class _ArchiveSink:
+    """Write-only file object that collects zipfile output for streaming"""
+    
+    def __init__(self):
+        self.chunks = []
+    
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+    
+    def flush(self):
+        pass
+    
+    def pop(self):
+        data = b''.join(self.chunks)
+        self.chunks = []
+        return data
 
 
 class EncryptionHandler:
@@ -27,58 +52,164 @@ class EncryptionHandler:
             iterations=100000,
             backend=default_backend()
         )
-        key = base64.urlsafe_b64encode(kdf.derive(password.encode()))
+        key = base64.urlsafe_b64encode(run_kdf(kdf.derive, password.encode()))
         return key, salt
     
     @staticmethod
+    @RequestTiming.timed('encrypt')
     def encrypt_file(file_obj, password: str, original_filename: str = None):
         """Encrypt any file with password and store original filename"""
         try:
-            file_obj.seek(0)
-            file_data = file_obj.read()
-            
-            # Store original filename (if not provided, use 'file')
-            if not original_filename:
-                original_filename = 'file'
-            
-            # Encode filename
-            filename_bytes = original_filename.encode('utf-8')
-            filename_length = len(filename_bytes).to_bytes(2, 'big')  # 2 bytes for length
-            
-            # Generate key from password
-            key, salt = EncryptionHandler.generate_key_from_password(password)
-            
-            # Encrypt the file
-            fernet = Fernet(key)
-            encrypted_data = fernet.encrypt(file_data)
-            
-            # Combine: salt + filename_length + filename + encrypted_data
-            output_data = salt + filename_length + filename_bytes + encrypted_data
-            
-            return ContentFile(output_data)
+            file_obj.seek(0, os.SEEK_END)
+            file_size = file_obj.tell()
+            stream, _ = EncryptionHandler.encrypt_file_stream(file_obj, password, original_filename, file_size)
+            return ContentFile(b''.join(stream))
         
         except Exception as e:
             raise Exception(f"Encryption failed: {str(e)}")
     
     @staticmethod
+    @RequestTiming.timed('encrypt_setup')
+    def encrypt_file_stream(file_obj, password: str, original_filename: str = None, file_size: int = None,
+                            container_format: str = 'v2'):
+        """
+        Encrypt without buffering the file.
+        
+        Formats:
+        - 'v2': Chunked AES-256-GCM container with the original filename (default)
+        - 'extension': The browser extension's AES-256-GCM layout (extension/crypto.js)
+        
+        Returns (iterator of output chunks, exact output size).
+        """
+        if not original_filename:
+            original_filename = 'file'
+        
+        if file_size is None:
+            file_size = file_obj.size
+        
+        if container_format == 'extension':
+            stream = WebCryptoContainer.encrypt_stream(file_obj, password)
+            return stream, WebCryptoContainer.encrypted_size(file_size)
+        
+        stream = EncryptedContainer.encrypt_stream(file_obj, password, file_size, original_filename)
+        return stream, EncryptedContainer.encrypted_size(file_size, original_filename)
+    
+    @staticmethod
+    def encrypt_files_archive(files, password: str):
+        """
+        Encrypt several uploads into one streamed ZIP of v2 containers.
+        
+        PBKDF2 runs once for the whole batch; every file gets HKDF subkeys,
+        its own salt and nonce prefix, and can be decrypted on its own.
+        """
+        master = EncryptedContainer.derive_master_key(password)
+        
+        def generate():
+            sink = _ArchiveSink()
+            used_names = set()
+            
+            with zipfile.ZipFile(sink, 'w', compression=zipfile.ZIP_STORED) as archive:
+                for uploaded_file in files:
+                    name_parts = uploaded_file.name.rsplit('.', 1)
+                    entry_name = f"{name_parts[0]}_encrypted.enc"
+                    counter = 1
+                    while entry_name in used_names:
+                        entry_name = f"{name_parts[0]}_{counter}_encrypted.enc"
+                        counter += 1
+                    used_names.add(entry_name)
+                    
+                    info = zipfile.ZipInfo(entry_name, date_time=time.localtime()[:6])
+                    info.compress_type = zipfile.ZIP_STORED
+                    
+                    stream = EncryptedContainer.encrypt_stream(
+                        uploaded_file, None, uploaded_file.size, uploaded_file.name, master=master
+                    )
+                    with archive.open(info, 'w') as entry:
+                        for chunk in stream:
+                            entry.write(chunk)
+                            yield sink.pop()
+                    yield sink.pop()
+            
+            yield sink.pop()
+        
+        return generate()
+    
+    @staticmethod
+    def is_legacy_fernet_file(file_obj) -> bool:
+        """Check for the pre-v2 layout: salt + filename length + filename + Fernet token"""
+        file_obj.seek(16)
+        length_bytes = file_obj.read(2)
+        if len(length_bytes) != 2:
+            return False
+        
+        try:
+            file_obj.read(int.from_bytes(length_bytes, 'big')).decode('utf-8')
+        except UnicodeDecodeError:
+            return False
+        
+        # Fernet tokens start with version byte 0x80 and a 64-bit timestamp
+        return file_obj.read(6) == b'gAAAAA'
+    
+    @staticmethod
+    @RequestTiming.timed('decrypt_open')
+    def open_encrypted_file(file_obj, password: str):
+        """
+        Detect the container format, check the password and return
+        (original_filename, decrypted_size, iterator of decrypted chunks).
+        
+        Detection order: v2 magic bytes, legacy Fernet layout, then the
+        extension's salt + iv + ciphertext layout, which has no magic of its own.
+        The original filename is None when the format does not store it.
+        """
+        file_obj.seek(0)
+        prefix = file_obj.read(6)
+        
+        if EncryptedContainer.is_container(prefix):
+            header = EncryptedContainer.read_header(file_obj, password)
+            return (
+                header['filename'],
+                header['plaintext_size'],
+                EncryptedContainer.decrypt_stream(file_obj, header)
+            )
+        
+        if EncryptionHandler.is_legacy_fernet_file(file_obj):
+            decrypted_file, original_filename = EncryptionHandler.decrypt_file(file_obj, password)
+            return original_filename, decrypted_file.size, iter([decrypted_file.read()])
+        
+        decrypted_size, stream = WebCryptoContainer.decrypt(file_obj, password)
+        return None, decrypted_size, stream
+    
+    @staticmethod
+    def open_seekable_file(file_obj, password: str):
+        """
+        Verify the password of a v2 container and return its header, which
+        indexes the fixed-size chunks for random access. Returns None for
+        formats that can only be decrypted as a whole.
+        """
+        file_obj.seek(0)
+        if not EncryptedContainer.is_container(file_obj.read(6)):
+            return None
+        return EncryptedContainer.read_header(file_obj, password)
+    
+    @staticmethod
+    def decrypt_range(file_obj, header: dict, start: int, end: int):
+        """Decrypt plaintext bytes start..end (inclusive) of a v2 container"""
+        return EncryptedContainer.decrypt_range(file_obj, header, start, end)
+    
+    @staticmethod
+    @RequestTiming.timed('decrypt')
     def decrypt_file(file_obj, password: str):
-        """Decrypt file with password and extract original filename"""
+        """Decrypt legacy Fernet file with password and extract original filename"""
         try:
             file_obj.seek(0)
-            encrypted_data = file_obj.read()
-            
-            # Extract salt (first 16 bytes)
-            salt = encrypted_data[:16]
-            
-            # Extract filename length (next 2 bytes)
-            filename_length = int.from_bytes(encrypted_data[16:18], 'big')
             
-            # Extract filename
-            filename_bytes = encrypted_data[18:18+filename_length]
-            original_filename = filename_bytes.decode('utf-8')
+            # Layout: salt (16) + filename length (2) + filename + Fernet token
+            salt = file_obj.read(16)
+            filename_length = int.from_bytes(file_obj.read(2), 'big')
+            original_filename = file_obj.read(filename_length).decode('utf-8')
             
-            # Extract encrypted content
-            encrypted_content = encrypted_data[18+filename_length:]
+            # Read the token directly instead of slicing it out of a full copy
+            encrypted_content = file_obj.read()
             
             # Generate key from password
             key, _ = EncryptionHandler.generate_key_from_password(password, salt)
@@ -93,8 +224,12 @@ class EncryptionHandler:
             raise Exception(f"Decryption failed: Wrong password or corrupted file")
     
     @staticmethod
+    @RequestTiming.timed('pdf_protect')
     def password_protect_pdf(file_obj, password: str):
-        """Add password protection to PDF"""
+        """
+        Add password protection to PDF by rebuilding every page with PyPDF2.
+        Superseded by password_protect_pdf_stream; kept for benchmarks.
+        """
         try:
             file_obj.seek(0)
             pdf_reader = PdfReader(file_obj)
@@ -118,8 +253,27 @@ class EncryptionHandler:
             raise Exception(f"PDF password protection failed: {str(e)}")
     
     @staticmethod
+    @RequestTiming.timed('pdf_protect')
+    def password_protect_pdf_stream(file_obj, password: str, owner_password: str = None, permissions=None):
+        """
+        Encrypt a PDF in place with AES-256 (pikepdf) and return
+        (iterator of output chunks, output size).
+        permissions: iterable or comma-separated names from PDFProtector.PERMISSIONS.
+        """
+        try:
+            return PDFProtector.protect_stream(file_obj, password, owner_password, permissions)
+        except ValueError:
+            raise
+        except Exception as e:
+            raise Exception(f"PDF password protection failed: {str(e)}")
+    
+    @staticmethod
+    @RequestTiming.timed('zip_protect')
     def create_password_protected_zip(file_obj, filename: str, password: str):
-        """Create password-protected ZIP file"""
+        """
+        Create password-protected ZIP file with pyminizip (ZipCrypto, temp files).
+        Superseded by create_password_protected_zip_stream; kept for benchmarks.
+        """
         try:
             file_obj.seek(0)
             
@@ -158,6 +312,23 @@ class EncryptionHandler:
             raise Exception(f"ZIP encryption failed: {str(e)}")
     
     @staticmethod
+    def create_password_protected_zip_stream(files, password: str):
+        """
+        Stream an AES-256 encrypted ZIP (WinZip AE-2) of one or more files.
+        files is an iterable of (archive_name, file_obj); output is yielded
+        as it is produced, straight from the upload chunks.
+        """
+        writer = AESZipWriter(password)
+        
+        def generate():
+            for name, file_obj in files:
+                yield from writer.write_file(name, file_obj)
+            yield writer.close()
+        
+        return generate()
+    
+    @staticmethod
+    @RequestTiming.timed('protect')
     def protect_file(file_obj, filename: str, password: str, method: str = 'encrypt'):
         """
         Main method to protect files with password
@@ -168,9 +339,11 @@ class EncryptionHandler:
         - 'zip': Create password-protected ZIP archive
         """
         if method == 'pdf' and 'pdf' in filename.lower():
-            return EncryptionHandler.password_protect_pdf(file_obj, password)
+            stream, _ = EncryptionHandler.password_protect_pdf_stream(file_obj, password)
+            return ContentFile(b''.join(stream))
         elif method == 'zip':
-            return EncryptionHandler.create_password_protected_zip(file_obj, filename, password)
+            stream = EncryptionHandler.create_password_protected_zip_stream([(filename, file_obj)], password)
+            return ContentFile(b''.join(stream))
         else:
             return EncryptionHandler.encrypt_file(file_obj, password, filename)
 
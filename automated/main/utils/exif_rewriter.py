@@ -0,0 +1,273 @@
+import re
+import struct
+import zlib
+from PIL.ExifTags import TAGS, GPSTAGS
+
+
+EXIF_HEADER = b'Exif\x00\x00'
+XMP_HEADER = b'http://ns.adobe.com/xap/1.0/\x00'
+XMP_EXTENSION_HEADER = b'http://ns.adobe.com/xmp/extension/\x00'
+PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+
+# Bytes per value for each TIFF field type
+TYPE_SIZES = {1: 1, 2: 1, 3: 2, 4: 4, 5: 8, 6: 1, 7: 1, 8: 2, 9: 4, 10: 8, 11: 4, 12: 8, 13: 4}
+
+EXIF_IFD, GPS_IFD, INTEROP_IFD = 0x8769, 0x8825, 0xA005
+# Tags that only describe layout; never removed on their own
+STRUCTURAL_TAGS = {EXIF_IFD, INTEROP_IFD, 0x0201, 0x0202}
+
+XMP_START_TAG = re.compile(rb'<([A-Za-z_][\w.-]*):([A-Za-z_][\w.-]*)\b[^>]*?(/?)>')
+XMP_ATTRIBUTE = re.compile(rb'\s([A-Za-z_][\w.-]*):([A-Za-z_][\w.-]*)\s*=\s*("[^"]*"|\'[^\']*\')')
+# Namespaces that hold the packet's structure rather than properties
+XMP_STRUCTURAL_PREFIXES = {b'x', b'rdf', b'xmlns', b'xml'}
+
+
+class ExifRewriter:
+    """
+    Removes selected EXIF and XMP tags from JPEG and PNG files without
+    decoding the image.
+
+    EXIF is edited in place: kept IFD entries are moved up over the removed
+    ones and removed values are zeroed, so no offsets change (maker notes
+    stay valid) and the APP1 segment keeps its size. XMP properties are
+    blanked with spaces, which leaves a valid packet of the same length.
+    Everything else, including the compressed image data, the ICC profile
+    and kept tags such as Orientation, is copied byte for byte.
+
+    `matcher` is anything with matches(name), usually a CompiledRule.
+    """
+
+    @staticmethod
+    def scrub(data, file_type, matcher):
+        """Returns (scrubbed bytes, removed tag names); ValueError if unsupported"""
+        file_type = file_type.lower()
+        try:
+            if 'jpeg' in file_type or 'jpg' in file_type:
+                return ExifRewriter.scrub_jpeg(data, matcher)
+            if 'png' in file_type:
+                return ExifRewriter.scrub_png(data, matcher)
+        except (IndexError, struct.error, zlib.error) as e:
+            # Backstop for malformed input the explicit checks below miss
+            raise ValueError(f"Corrupt {file_type} file: {e}")
+        raise ValueError(f"Selective removal not supported for {file_type}")
+
+    @staticmethod
+    def scrub_jpeg(data, matcher):
+        if data[:2] != b'\xff\xd8':
+            raise ValueError("Not a JPEG file")
+
+        chunks = [data[:2]]
+        removed = []
+        pos = 2
+        while pos < len(data):
+            if data[pos] != 0xFF:
+                raise ValueError(f"Corrupt JPEG: expected marker at byte {pos}")
+            if pos + 1 >= len(data):
+                raise ValueError("Truncated JPEG: file ends inside a marker")
+            marker = data[pos + 1]
+            if marker == 0xFF:
+                # Fill byte before a marker
+                chunks.append(data[pos:pos + 1])
+                pos += 1
+                continue
+            if marker == 0xDA or marker == 0xD9:
+                # Start of scan: the rest is image data, copied verbatim
+                chunks.append(data[pos:])
+                break
+            if 0xD0 <= marker <= 0xD7 or marker == 0x01:
+                chunks.append(data[pos:pos + 2])
+                pos += 2
+                continue
+
+            if pos + 4 > len(data):
+                raise ValueError(f"Truncated JPEG: segment length missing at byte {pos}")
+            length = struct.unpack('>H', data[pos + 2:pos + 4])[0]
+            if length < 2:
+                raise ValueError(f"Corrupt JPEG: segment length {length} at byte {pos}")
+            if pos + 2 + length > len(data):
+                # Copying the short segment through would keep its metadata
+                raise ValueError(f"Truncated JPEG: segment at byte {pos} runs past the end of the file")
+            segment = data[pos:pos + 2 + length]
+            pos += 2 + length
+
+            if marker == 0xE1:
+                payload = segment[4:]
+                if payload.startswith(EXIF_HEADER):
+                    tiff = bytearray(payload[len(EXIF_HEADER):])
+                    removed += ExifRewriter.scrub_tiff(tiff, matcher)
+                    segment = segment[:4] + EXIF_HEADER + bytes(tiff)
+                elif payload.startswith(XMP_HEADER):
+                    packet, xmp_removed = ExifRewriter.scrub_xmp(payload[len(XMP_HEADER):], matcher)
+                    removed += xmp_removed
+                    segment = segment[:4] + XMP_HEADER + packet
+                elif payload.startswith(XMP_EXTENSION_HEADER):
+                    # Extended XMP is split across segments at arbitrary
+                    # points and checksummed, so it is dropped rather than edited
+                    removed.append('ExtendedXMP')
+                    continue
+            chunks.append(segment)
+        else:
+            raise ValueError("Truncated JPEG: no image data")
+
+        return b''.join(chunks), removed
+
+    @staticmethod
+    def scrub_png(data, matcher):
+        if not data.startswith(PNG_SIGNATURE):
+            raise ValueError("Not a PNG file")
+
+        chunks = [PNG_SIGNATURE]
+        removed = []
+        pos = len(PNG_SIGNATURE)
+        while pos + 8 <= len(data):
+            length, chunk_type = struct.unpack('>I4s', data[pos:pos + 8])
+            if pos + 12 + length > len(data):
+                raise ValueError(f"Truncated PNG: {chunk_type!r} chunk at byte {pos} runs past the end of the file")
+            body = data[pos + 8:pos + 8 + length]
+            chunk = data[pos:pos + 12 + length]
+            pos += 12 + length
+
+            if chunk_type == b'eXIf':
+                tiff = bytearray(body)
+                removed += ExifRewriter.scrub_tiff(tiff, matcher)
+                chunk = ExifRewriter._png_chunk(chunk_type, bytes(tiff))
+            elif chunk_type in (b'tEXt', b'zTXt', b'iTXt'):
+                keyword = body.split(b'\x00', 1)[0]
+                if chunk_type == b'iTXt' and keyword == b'XML:com.adobe.xmp':
+                    body, xmp_removed = ExifRewriter._scrub_png_xmp(body, matcher)
+                    removed += xmp_removed
+                    chunk = ExifRewriter._png_chunk(chunk_type, body)
+                elif matcher.matches(keyword.decode('latin-1')):
+                    removed.append(keyword.decode('latin-1'))
+                    continue
+            chunks.append(chunk)
+            if chunk_type == b'IEND':
+                break
+        else:
+            raise ValueError("Truncated PNG: no IEND chunk")
+
+        return b''.join(chunks), removed
+
+    @staticmethod
+    def _png_chunk(chunk_type, body):
+        crc = zlib.crc32(chunk_type + body) & 0xFFFFFFFF
+        return struct.pack('>I4s', len(body), chunk_type) + body + struct.pack('>I', crc)
+
+    @staticmethod
+    def _scrub_png_xmp(body, matcher):
+        # keyword \0 compression-flag compression-method language \0 translated \0 text
+        keyword, rest = body.split(b'\x00', 1)
+        if len(rest) < 4:
+            raise ValueError("Corrupt PNG: short iTXt chunk")
+        compressed = rest[0] == 1
+        header_end = rest.index(b'\x00', rest.index(b'\x00', 2) + 1) + 1
+        header, text = rest[:header_end], rest[header_end:]
+        if compressed:
+            try:
+                text = zlib.decompress(text)
+            except zlib.error as e:
+                raise ValueError(f"Corrupt PNG: XMP does not decompress ({e})")
+        text, removed = ExifRewriter.scrub_xmp(text, matcher)
+        if compressed:
+            text = zlib.compress(text)
+        return keyword + b'\x00' + header + text, removed
+
+    @staticmethod
+    def scrub_tiff(tiff, matcher):
+        """Remove matching tags from a TIFF/EXIF block (bytearray, edited in place)"""
+        if tiff[:2] == b'II':
+            endian = '<'
+        elif tiff[:2] == b'MM':
+            endian = '>'
+        else:
+            raise ValueError("Corrupt EXIF: unknown byte order")
+        if len(tiff) < 8:
+            raise ValueError("Truncated EXIF header")
+
+        removed = []
+        visited = set()
+        ifd1 = ExifRewriter._scrub_ifd(tiff, endian, struct.unpack(endian + 'I', tiff[4:8])[0], TAGS, matcher, removed, visited)
+        # IFD1 describes the embedded thumbnail
+        ExifRewriter._scrub_ifd(tiff, endian, ifd1, TAGS, matcher, removed, visited)
+        return removed
+
+    @staticmethod
+    def _scrub_ifd(tiff, endian, offset, names, matcher, removed, visited, wipe=False):
+        """Rewrite one IFD without the matching entries; returns the next IFD offset"""
+        if not offset or offset in visited or offset + 2 > len(tiff):
+            return 0
+        visited.add(offset)
+
+        count = struct.unpack(endian + 'H', tiff[offset:offset + 2])[0]
+        entries_end = offset + 2 + 12 * count
+        if entries_end + 4 > len(tiff):
+            return 0
+        next_ifd = struct.unpack(endian + 'I', tiff[entries_end:entries_end + 4])[0]
+
+        kept = []
+        for index in range(count):
+            start = offset + 2 + 12 * index
+            entry = bytes(tiff[start:start + 12])
+            tag, field_type, value_count = struct.unpack(endian + 'HHI', entry[:8])
+            pointer = struct.unpack(endian + 'I', entry[8:])[0]
+            name = str(names.get(tag, tag))
+
+            remove = wipe or (tag not in STRUCTURAL_TAGS and matcher.matches(name))
+            if tag in (EXIF_IFD, GPS_IFD, INTEROP_IFD):
+                sub_names = GPSTAGS if tag == GPS_IFD else TAGS
+                ExifRewriter._scrub_ifd(tiff, endian, pointer, sub_names, matcher, removed, visited, wipe=remove)
+
+            if remove:
+                if not wipe:
+                    removed.append(name)
+                size = TYPE_SIZES.get(field_type, 1) * value_count
+                if size > 4 and pointer + size <= len(tiff):
+                    tiff[pointer:pointer + size] = bytes(size)
+            else:
+                kept.append(entry)
+
+        if wipe:
+            tiff[offset:entries_end + 4] = bytes(entries_end + 4 - offset)
+            return 0
+
+        # Same place, fewer entries; the freed tail is zeroed
+        rewritten = struct.pack(endian + 'H', len(kept)) + b''.join(kept) + struct.pack(endian + 'I', next_ifd)
+        tiff[offset:entries_end + 4] = rewritten + bytes(entries_end + 4 - offset - len(rewritten))
+        return next_ifd
+
+    @staticmethod
+    def scrub_xmp(packet, matcher):
+        """Blank matching XMP properties with spaces; returns (packet, removed)"""
+        packet = bytearray(packet)
+        removed = []
+
+        pos = 0
+        while True:
+            match = XMP_START_TAG.search(packet, pos)
+            if not match:
+                break
+            prefix, local, self_closing = match.groups()
+            name = (prefix + b':' + local).decode('utf-8', 'replace')
+            if prefix in XMP_STRUCTURAL_PREFIXES or not matcher.matches(name):
+                pos = match.end()
+                continue
+
+            end = match.end()
+            if not self_closing:
+                closing = re.compile(rb'</' + re.escape(prefix + b':' + local) + rb'\s*>').search(packet, end)
+                if closing is None:
+                    pos = match.end()
+                    continue
+                end = closing.end()
+            packet[match.start():end] = b' ' * (end - match.start())
+            removed.append(name)
+            pos = end
+
+        for match in list(XMP_ATTRIBUTE.finditer(packet)):
+            prefix, local = match.group(1), match.group(2)
+            name = (prefix + b':' + local).decode('utf-8', 'replace')
+            if prefix not in XMP_STRUCTURAL_PREFIXES and matcher.matches(name):
+                packet[match.start():match.end()] = b' ' * (match.end() - match.start())
+                removed.append(name)
+
+        return bytes(packet), removed
@@ -0,0 +1,182 @@
+import hashlib
+import mimetypes
+from urllib.parse import quote
+from django.conf import settings
+from django.http import FileResponse, HttpResponse, StreamingHttpResponse
+from django.utils.http import http_date, parse_etags, parse_http_date_safe, quote_etag
+from .http_range import parse_range_header, RangeNotSatisfiable
+
+
+class FileServer:
+    """
+    Serve stored files with byte ranges, conditional requests and optional
+    proxy offload.
+
+    Modes (settings.FILE_SERVE_MODE):
+        python            stream the bytes from Django (default)
+        x-accel-redirect  hand the file to nginx via an internal location
+                          at FILE_SERVE_ACCEL_PREFIX mapped to MEDIA_ROOT
+        x-sendfile        hand the absolute path to Apache/lighttpd
+
+    Conditional headers are answered here in every mode, so a client holding
+    the current ETag never reaches the proxy for the bytes. In offload modes
+    the proxy answers Range requests itself.
+    """
+
+    CHUNK_SIZE = 64 * 1024
+    MODES = ('python', 'x-accel-redirect', 'x-sendfile')
+
+    @staticmethod
+    def hash_file(field_file) -> str:
+        """SHA-256 of a stored file, read in chunks"""
+        digest = hashlib.sha256()
+        with field_file.open('rb') as f:
+            for chunk in iter(lambda: f.read(FileServer.CHUNK_SIZE), b''):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    @staticmethod
+    def cleaned_file_etag(file_analysis) -> str:
+        """
+        Strong ETag for a FileAnalysis' cleaned file. The content hash is
+        computed on first download and stored on the row.
+        """
+        if not file_analysis.cleaned_file_sha256:
+            file_analysis.cleaned_file_sha256 = FileServer.hash_file(file_analysis.cleaned_file)
+            type(file_analysis).objects.filter(pk=file_analysis.pk).update(
+                cleaned_file_sha256=file_analysis.cleaned_file_sha256
+            )
+        return quote_etag(file_analysis.cleaned_file_sha256)
+
+    @staticmethod
+    def serve_cleaned_file(request, file_analysis):
+        """Download response for a FileAnalysis' cleaned file"""
+        return FileServer.serve(
+            request,
+            file_analysis.cleaned_file,
+            filename=f"clean_{file_analysis.original_filename}",
+            content_type=file_analysis.file_type,
+            etag=FileServer.cleaned_file_etag(file_analysis),
+            last_modified=file_analysis.updated_at,
+        )
+
+    @staticmethod
+    def _content_disposition(filename: str, as_attachment: bool) -> str:
+        disposition = 'attachment' if as_attachment else 'inline'
+        try:
+            filename.encode('ascii')
+            file_expr = 'filename="{}"'.format(filename.replace('\\', '\\\\').replace('"', r'\"'))
+        except UnicodeEncodeError:
+            file_expr = "filename*=utf-8''{}".format(quote(filename))
+        return f'{disposition}; {file_expr}'
+
+    @staticmethod
+    def _not_modified(request, etag, last_modified) -> bool:
+        if_none_match = request.META.get('HTTP_IF_NONE_MATCH')
+        if if_none_match:
+            # Weak comparison, as required for If-None-Match
+            etags = parse_etags(if_none_match)
+            if '*' in etags:
+                return True
+            strip_weak = lambda value: value[2:] if value.startswith('W/') else value
+            return etag is not None and strip_weak(etag) in [strip_weak(e) for e in etags]
+
+        if_modified_since = parse_http_date_safe(request.META.get('HTTP_IF_MODIFIED_SINCE', ''))
+        if if_modified_since is not None and last_modified is not None:
+            return int(last_modified.timestamp()) <= if_modified_since
+
+        return False
+
+    @staticmethod
+    def _range_allowed(request, etag, last_modified) -> bool:
+        """If-Range: only serve a partial body if the validator still matches"""
+        if_range = request.META.get('HTTP_IF_RANGE')
+        if not if_range:
+            return True
+
+        if if_range.startswith('"'):
+            # Strong comparison only
+            return etag is not None and if_range == etag
+
+        since = parse_http_date_safe(if_range)
+        return since is not None and last_modified is not None and int(last_modified.timestamp()) == since
+
+    @staticmethod
+    def _ranged_iterator(file_obj, start: int, length: int):
+        try:
+            file_obj.seek(start)
+            while length > 0:
+                chunk = file_obj.read(min(FileServer.CHUNK_SIZE, length))
+                if not chunk:
+                    break
+                length -= len(chunk)
+                yield chunk
+        finally:
+            file_obj.close()
+
+    @staticmethod
+    def serve(request, field_file, filename: str, content_type: str = None, etag: str = None,
+              last_modified=None, as_attachment: bool = True):
+        """
+        Build the response for a stored FieldFile.
+
+        etag must already be quoted (see cleaned_file_etag). last_modified is
+        an aware datetime. The download endpoints use POST for historical
+        reasons, so conditional and Range headers are honoured for any method.
+        """
+        content_type = content_type or mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+        mode = getattr(settings, 'FILE_SERVE_MODE', 'python')
+        if mode not in FileServer.MODES:
+            raise ValueError(f"Unknown FILE_SERVE_MODE: {mode}")
+
+        validators = {}
+        if etag:
+            validators['ETag'] = etag
+        if last_modified:
+            validators['Last-Modified'] = http_date(last_modified.timestamp())
+
+        if FileServer._not_modified(request, etag, last_modified):
+            response = HttpResponse(status=304)
+            for header, value in validators.items():
+                response[header] = value
+            return response
+
+        if mode == 'x-accel-redirect':
+            response = HttpResponse(content_type=content_type)
+            prefix = getattr(settings, 'FILE_SERVE_ACCEL_PREFIX', '/protected-media/')
+            response['X-Accel-Redirect'] = prefix.rstrip('/') + '/' + quote(field_file.name.replace('\\', '/'))
+        elif mode == 'x-sendfile':
+            response = HttpResponse(content_type=content_type)
+            response['X-Sendfile'] = field_file.path
+        else:
+            size = field_file.size
+            byte_range = None
+            if FileServer._range_allowed(request, etag, last_modified):
+                try:
+                    byte_range = parse_range_header(request.META.get('HTTP_RANGE'), size)
+                except RangeNotSatisfiable:
+                    response = HttpResponse(status=416)
+                    response['Content-Range'] = f'bytes */{size}'
+                    response['Accept-Ranges'] = 'bytes'
+                    return response
+
+            if byte_range:
+                start, end = byte_range
+                response = StreamingHttpResponse(
+                    FileServer._ranged_iterator(field_file.open('rb'), start, end - start + 1),
+                    status=206,
+                    content_type=content_type
+                )
+                response['Content-Range'] = f'bytes {start}-{end}/{size}'
+                response['Content-Length'] = end - start + 1
+            else:
+                response = FileResponse(field_file.open('rb'), content_type=content_type)
+                response.block_size = FileServer.CHUNK_SIZE
+                response['Content-Length'] = size
+
+            response['Accept-Ranges'] = 'bytes'
+
+        response['Content-Disposition'] = FileServer._content_disposition(filename, as_attachment)
+        for header, value in validators.items():
+            response[header] = value
+        return response
@@ -0,0 +1,41 @@
+import re
+
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+class RangeNotSatisfiable(Exception):
+    pass
+
+
+def parse_range_header(header, size):
+    """
+    Parse a single-range HTTP Range header against a resource of `size` bytes.
+
+    Returns an inclusive (start, end) tuple, or None when the header is absent
+    or not a single byte range (the caller then serves the whole resource).
+    Raises RangeNotSatisfiable when the range lies outside the resource.
+    """
+    if not header:
+        return None
+
+    match = RANGE_RE.match(header.strip())
+    if not match:
+        return None
+
+    start, end = match.groups()
+    if not start and not end:
+        return None
+
+    if not start:
+        # Suffix range: the last N bytes
+        length = int(end)
+        if length == 0 or size == 0:
+            raise RangeNotSatisfiable()
+        return max(0, size - length), size - 1
+
+    start = int(start)
+    end = int(end) if end else size - 1
+    if start >= size or end < start:
+        raise RangeNotSatisfiable()
+
+    return start, min(end, size - 1)
@@ -0,0 +1,29 @@
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+import threading
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=getattr(settings, 'KDF_MAX_WORKERS', 2),
+                    thread_name_prefix='kdf'
+                )
+    return _executor
+
+
+def run_kdf(func, *args):
+    """
+    Run a password KDF on the shared, bounded KDF pool and wait for the result.
+
+    PBKDF2 with 100,000 iterations is pure CPU; funnelling every derivation
+    through a small pool caps how many cores a burst of encrypt/decrypt
+    requests can take, while the remaining workers keep serving other requests.
+    """
+    return _get_executor().submit(func, *args).result()
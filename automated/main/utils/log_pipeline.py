@@ -0,0 +1,139 @@
+import atexit
+import contextvars
+import json
+import logging
+import queue
+import random
+import re
+import sys
+import uuid
+import zlib
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+
+
+# Id of the request being handled, or None outside one
+_request_id = contextvars.ContextVar('log_request_id', default=None)
+
+REQUEST_ID_RE = re.compile(r'^[A-Za-z0-9._-]{1,64}$')
+
+# LogRecord attributes that are not extra fields
+RESERVED_ATTRS = set(vars(logging.LogRecord('', 0, '', 0, '', None, None))) | {'message', 'asctime', 'request_id'}
+
+
+class RequestContext:
+    """Request id carried into every log record of the request"""
+
+    @staticmethod
+    def start(request_id=None):
+        """Use a caller's X-Request-ID when it looks sane, otherwise a new id; returns (id, token)"""
+        if not request_id or not REQUEST_ID_RE.match(request_id):
+            request_id = uuid.uuid4().hex
+        return request_id, _request_id.set(request_id)
+
+    @staticmethod
+    def stop(token):
+        _request_id.reset(token)
+
+    @staticmethod
+    def request_id():
+        return _request_id.get()
+
+
+class RequestIdFilter(logging.Filter):
+    """Stamps records with the request id; must run in the logging thread, so it sits on the QueueHandler"""
+
+    def filter(self, record):
+        if not hasattr(record, 'request_id'):
+            record.request_id = _request_id.get()
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Keeps `rate` of the INFO and DEBUG records; warnings and errors always
+    pass. Records of one request are kept or dropped together (decided from
+    the request id) so a sampled request is never half logged. Pass
+    extra={'sample': False} to always keep a record.
+    """
+
+    def __init__(self, rate=1.0):
+        super().__init__()
+        self.rate = float(rate)
+
+    def filter(self, record):
+        if self.rate >= 1 or record.levelno >= logging.WARNING or not getattr(record, 'sample', True):
+            return True
+        request_id = getattr(record, 'request_id', None) or _request_id.get()
+        if request_id:
+            return zlib.crc32(request_id.encode()) / 0xFFFFFFFF < self.rate
+        return random.random() < self.rate
+
+
+class JSONFormatter(logging.Formatter):
+    """One JSON object per line: ts, level, logger, msg, request_id and any extra fields"""
+
+    def format(self, record):
+        entry = {
+            'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'msg': record.getMessage(),
+        }
+        if getattr(record, 'request_id', None):
+            entry['request_id'] = record.request_id
+        for key, value in vars(record).items():
+            if key not in RESERVED_ATTRS and key != 'sample':
+                entry[key] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry['exc'] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+class AsyncLogHandler(QueueHandler):
+    """
+    Hands records to a bounded queue drained by a QueueListener thread, so
+    formatting and stdout writes never happen on a request thread. When the
+    queue is full the record is dropped (and counted) instead of waiting;
+    the count is reported once there is room again.
+    """
+
+    def __init__(self, queue_size=10000, stream=None):
+        super().__init__(queue.Queue(maxsize=queue_size))
+        self.dropped = 0
+        target = logging.StreamHandler(stream or sys.stdout)
+        target.setFormatter(JSONFormatter())
+        self.listener = QueueListener(self.queue, target, respect_handler_level=False)
+        self.listener.start()
+        atexit.register(self.close)
+
+    def prepare(self, record):
+        # Resolve what depends on this thread (args, traceback) and keep the
+        # extra fields for the formatter, which runs on the listener thread
+        record = logging.makeLogRecord(vars(record))
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            if self.dropped:
+                self.queue.put_nowait(logging.makeLogRecord({
+                    'name': __name__, 'levelno': logging.WARNING, 'levelname': 'WARNING',
+                    'msg': 'Log queue full; dropped records', 'dropped': self.dropped,
+                }))
+                self.dropped = 0
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def close(self):
+        if self.listener is not None:
+            self.listener.stop()
+            self.listener = None
+        super().close()
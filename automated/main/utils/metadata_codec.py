@@ -0,0 +1,72 @@
+import json
+import zlib
+
+
+class MetadataCodec:
+    """
+    Compact encoding for an analysis' metadata entries.
+
+    All entries are stored as one zlib-compressed JSON array on the parent
+    FileAnalysis. Each entry is [id, key, value, category, risk_level,
+    is_removed]; category and risk_level are small integer codes (their
+    index below), with the raw string kept for anything not in the table.
+    """
+
+    VERSION = 1
+
+    # Append only: the index is the stored code
+    CATEGORIES = ('location', 'device', 'software', 'camera', 'personal', 'temporal', 'other', 'author', 'timestamp')
+    RISK_LEVELS = ('low', 'medium', 'high', 'critical')
+
+    COMPRESSION_LEVEL = 6
+
+    @staticmethod
+    def _code(value, table):
+        try:
+            return table.index(value)
+        except ValueError:
+            return value
+
+    @staticmethod
+    def _name(code, table):
+        return table[code] if isinstance(code, int) else code
+
+    @staticmethod
+    def encode(entries) -> bytes:
+        """Encode MetadataEntry instances (saved or not; id may be None)"""
+        # MetadataEntry.Meta.ordering: -risk_level, then category
+        entries = sorted(entries, key=lambda e: e.category)
+        entries = sorted(entries, key=lambda e: e.risk_level, reverse=True)
+
+        rows = [
+            [
+                entry.id,
+                str(entry.key),
+                str(entry.value),
+                MetadataCodec._code(entry.category, MetadataCodec.CATEGORIES),
+                MetadataCodec._code(entry.risk_level, MetadataCodec.RISK_LEVELS),
+                int(entry.is_removed),
+            ]
+            for entry in entries
+        ]
+        payload = json.dumps([MetadataCodec.VERSION, rows], separators=(',', ':'), ensure_ascii=False)
+        return zlib.compress(payload.encode('utf-8'), MetadataCodec.COMPRESSION_LEVEL)
+
+    @staticmethod
+    def decode(blob) -> list:
+        """Decode to a list of dicts with MetadataEntry field names"""
+        version, rows = json.loads(zlib.decompress(blob).decode('utf-8'))
+        if version != MetadataCodec.VERSION:
+            raise ValueError(f"Unsupported metadata blob version: {version}")
+
+        return [
+            {
+                'id': entry_id,
+                'key': key,
+                'value': value,
+                'category': MetadataCodec._name(category, MetadataCodec.CATEGORIES),
+                'risk_level': MetadataCodec._name(risk_level, MetadataCodec.RISK_LEVELS),
+                'is_removed': bool(is_removed),
+            }
+            for entry_id, key, value, category, risk_level, is_removed in rows
+        ]
@@ -2,6 +2,10 @@ from PIL import Image
 from PIL.ExifTags import TAGS, GPSTAGS
 import io
 import json
+import logging
+from .timing import RequestTiming
+
+logger = logging.getLogger(__name__)
 
 class MetadataExtractor:
     
@@ -47,6 +51,7 @@ class MetadataExtractor:
     ]
     
     @staticmethod
+    @RequestTiming.timed('extract')
     def extract_metadata(file, file_type):
         """
         Extract metadata based on file type
@@ -63,7 +68,7 @@ class MetadataExtractor:
                 return {}
         
         except Exception as e:
-            print(f"Metadata extraction error: {str(e)}")
+            logger.warning("Metadata extraction failed: %s", e, extra={'stage': 'extract', 'file_type': file_type})
             return {}
     
     @staticmethod
@@ -122,7 +127,7 @@ class MetadataExtractor:
                             metadata[tag] = f"<Unparseable: {type(value).__name__}>"
             
         except Exception as e:
-            print(f"Image metadata extraction error: {str(e)}")
+            logger.warning("Image metadata extraction failed: %s", e, extra={'stage': 'extract'})
         
         return metadata
     
@@ -179,10 +184,10 @@ class MetadataExtractor:
                 return metadata
             
             except ImportError:
-                print("PyPDF2 not installed, trying alternative methods")
+                logger.debug("PyPDF2 not installed, trying alternative methods")
         
         except Exception as e:
-            print(f"PyPDF2 extraction error: {str(e)}")
+            logger.warning("PyPDF2 extraction failed: %s", e, extra={'stage': 'extract'})
         
         # Try pikepdf as backup
         try:
@@ -226,9 +231,9 @@ class MetadataExtractor:
             return metadata
         
         except ImportError:
-            print("pikepdf not installed")
+            logger.debug("pikepdf not installed")
         except Exception as e:
-            print(f"pikepdf extraction error: {str(e)}")
+            logger.warning("pikepdf extraction failed: %s", e, extra={'stage': 'extract'})
         
         # Try PyMuPDF (fitz) as last resort
         try:
@@ -254,9 +259,9 @@ class MetadataExtractor:
             return metadata
         
         except ImportError:
-            print("PyMuPDF not installed")
+            logger.debug("PyMuPDF not installed")
         except Exception as e:
-            print(f"PyMuPDF extraction error: {str(e)}")
+            logger.warning("PyMuPDF extraction failed: %s", e, extra={'stage': 'extract'})
         
         return metadata
     
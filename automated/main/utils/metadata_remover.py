@@ -7,6 +7,9 @@ from pptx import Presentation
 import subprocess
 import tempfile
 import os
+from .exif_rewriter import ExifRewriter
+from .platform_rules import CompiledRule
+from .timing import RequestTiming
 
 try:
     from docx import Document
@@ -22,6 +25,25 @@ except ImportError:
 
 class MetadataRemover:
     
+    # docProps/core.xml dates, which the core-properties setters refuse to clear
+    CORE_DATE_ELEMENTS = {
+        'created': '{http://purl.org/dc/terms/}created',
+        'lastPrinted': '{http://schemas.openxmlformats.org/package/2006/metadata/core-properties}lastPrinted',
+        'modified': '{http://purl.org/dc/terms/}modified',
+    }
+    
+    @staticmethod
+    def remove_core_dates(core_properties):
+        """Drop the created, lastPrinted and modified elements of DOCX/PPTX core properties"""
+        element = core_properties._element
+        for name, tag in MetadataRemover.CORE_DATE_ELEMENTS.items():
+            remove = getattr(element, f'_remove_{name}', None)
+            if remove is not None:
+                remove()
+                continue
+            for child in element.findall(tag):
+                element.remove(child)
+    
     @staticmethod
     def remove_from_image(file_obj, file_format='JPEG'):
         file_obj.seek(0)
@@ -82,13 +104,11 @@ class MetadataRemover:
             core_properties.category = ''
             core_properties.comments = ''
             core_properties.content_status = ''
-            core_properties.created = None
             core_properties.identifier = ''
             core_properties.keywords = ''
             core_properties.language = ''
             core_properties.last_modified_by = ''
-            core_properties.last_printed = None
-            core_properties.modified = None
+            MetadataRemover.remove_core_dates(core_properties)
             core_properties.revision = 1
             core_properties.subject = ''
             core_properties.title = ''
@@ -116,13 +136,11 @@ class MetadataRemover:
             core_properties.category = ''
             core_properties.comments = ''
             core_properties.content_status = ''
-            core_properties.created = None
             core_properties.identifier = ''
             core_properties.keywords = ''
             core_properties.language = ''
             core_properties.last_modified_by = ''
-            core_properties.last_printed = None
-            core_properties.modified = None
+            MetadataRemover.remove_core_dates(core_properties)
             core_properties.revision = 1
             core_properties.subject = ''
             core_properties.title = ''
@@ -182,6 +200,7 @@ class MetadataRemover:
             raise Exception(f"Error removing video metadata: {str(e)}")
     
     @staticmethod
+    @RequestTiming.timed('clean')
     def remove_metadata(file_obj, file_type, original_filename=None):
         """Main method to route to appropriate handler"""
         file_type_lower = file_type.lower()
@@ -220,6 +239,18 @@ class MetadataRemover:
                 raise ValueError(f"Unsupported file type: {file_type}")
     
     @staticmethod
+    @RequestTiming.timed('clean_selective')
     def remove_selective_metadata(file_obj, file_type, keys_to_remove, original_filename=None):
-        """Remove metadata (currently removes all metadata for all file types)"""
-        return MetadataRemover.remove_metadata(file_obj, file_type, original_filename)
\ No newline at end of file
+        """
+        Remove only the listed metadata keys (or a CompiledRule's keys).
+        JPEG and PNG are rewritten in place by ExifRewriter, keeping the image
+        data and harmless tags; other types fall back to removing everything.
+        """
+        matcher = keys_to_remove if hasattr(keys_to_remove, 'matches') else CompiledRule('selected', keys_to_remove)
+        
+        file_obj.seek(0)
+        try:
+            scrubbed, _ = ExifRewriter.scrub(file_obj.read(), file_type, matcher)
+        except ValueError:
+            return MetadataRemover.remove_metadata(file_obj, file_type, original_filename)
+        return ContentFile(scrubbed)
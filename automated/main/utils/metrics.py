@@ -0,0 +1,184 @@
+import functools
+import os
+import time
+from contextlib import contextmanager
+
+try:
+    from prometheus_client import (
+        CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Gauge, Histogram, REGISTRY, generate_latest, multiprocess
+    )
+    PROMETHEUS_AVAILABLE = True
+except ImportError:
+    PROMETHEUS_AVAILABLE = False
+
+
+STAGE_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+SIZE_BUCKETS = (
+    (100 * 1024, 'le_100KB'),
+    (1024 * 1024, 'le_1MB'),
+    (10 * 1024 * 1024, 'le_10MB'),
+    (50 * 1024 * 1024, 'le_50MB'),
+)
+
+# Anything else is reported as '<major>/other', with majors outside
+# KNOWN_MAJOR_TYPES folded into 'other/other', to bound label cardinality
+KNOWN_MAJOR_TYPES = {'image', 'application', 'video', 'audio', 'text'}
+KNOWN_FILE_TYPES = {
+    'image/jpeg', 'image/png', 'image/gif', 'image/webp', 'image/tiff', 'image/bmp',
+    'application/pdf', 'application/zip', 'application/octet-stream',
+    'application/vnd.openxmlformats-officedocument.wordprocessingml.document',
+    'application/vnd.openxmlformats-officedocument.presentationml.presentation',
+    'video/mp4', 'video/quicktime', 'video/webm',
+}
+
+if PROMETHEUS_AVAILABLE:
+    STAGE_SECONDS = Histogram(
+        'automated_pipeline_stage_seconds', 'Time spent in each pipeline stage',
+        ['pipeline', 'stage', 'file_type', 'size_bucket'], buckets=STAGE_BUCKETS
+    )
+    BYTES_PROCESSED = Counter(
+        'automated_bytes_processed', 'Bytes of input processed by each pipeline',
+        ['pipeline', 'file_type']
+    )
+    FAILURES = Counter(
+        'automated_pipeline_failures', 'Pipeline failures by the handler that raised',
+        ['pipeline', 'handler']
+    )
+    IN_FLIGHT = Gauge(
+        'automated_pipeline_in_flight', 'Requests or streams currently being processed',
+        ['pipeline'], multiprocess_mode='livesum'
+    )
+
+
+class TimedStream:
+    """
+    Wraps a streaming response body: times it as one stage, counts the
+    input size once it completes and keeps it in the in-flight gauge until
+    Django closes it.
+    """
+
+    def __init__(self, chunks, pipeline, stage, file_type='', size=0):
+        self.chunks = iter(chunks)
+        self.pipeline = pipeline
+        self.stage = stage
+        self.file_type, self.size_bucket = PipelineMetrics.labels(file_type, size)
+        self.size = size or 0
+        self.start = time.perf_counter()
+        self.completed = False
+        self.closed = False
+        PipelineMetrics.adjust_in_flight(pipeline, 1)
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        try:
+            chunk = next(self.chunks)
+        except StopIteration:
+            self.completed = True
+            self.close()
+            raise
+        except Exception:
+            PipelineMetrics.record_failure(self.pipeline, self.stage)
+            self.close()
+            raise
+        return chunk
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        if hasattr(self.chunks, 'close'):
+            self.chunks.close()
+        PipelineMetrics.adjust_in_flight(self.pipeline, -1)
+        if PROMETHEUS_AVAILABLE:
+            STAGE_SECONDS.labels(self.pipeline, self.stage, self.file_type, self.size_bucket).observe(
+                time.perf_counter() - self.start
+            )
+            if self.completed:
+                BYTES_PROCESSED.labels(self.pipeline, self.file_type).inc(self.size)
+
+
+class PipelineMetrics:
+    """
+    Prometheus instrumentation for the analyze, clean, encrypt and decrypt
+    pipelines. Every helper is a no-op when prometheus-client is missing.
+
+    With several worker processes, set PROMETHEUS_MULTIPROC_DIR to an empty
+    directory shared by the workers (cleared on deploy); /metrics then
+    aggregates all of them. The server's child-exit hook should call
+    prometheus_client.multiprocess.mark_process_dead(pid) so the in-flight
+    gauge drops dead workers.
+    """
+
+    @staticmethod
+    def labels(file_type, size):
+        """(file_type, size_bucket) label values"""
+        file_type = (file_type or '').split(';')[0].strip().lower()
+        if file_type not in KNOWN_FILE_TYPES:
+            major = file_type.split('/')[0]
+            file_type = f"{major if major in KNOWN_MAJOR_TYPES else 'other'}/other"
+        for limit, bucket in SIZE_BUCKETS:
+            if (size or 0) <= limit:
+                return file_type, bucket
+        return file_type, 'gt_50MB'
+
+    @staticmethod
+    @contextmanager
+    def stage(pipeline, stage, file_type='', size=0):
+        """Time a block as one stage; an exception counts as a failure of that stage"""
+        if not PROMETHEUS_AVAILABLE:
+            yield
+            return
+        file_type, size_bucket = PipelineMetrics.labels(file_type, size)
+        start = time.perf_counter()
+        try:
+            yield
+        except Exception:
+            FAILURES.labels(pipeline, stage).inc()
+            raise
+        finally:
+            STAGE_SECONDS.labels(pipeline, stage, file_type, size_bucket).observe(time.perf_counter() - start)
+
+    @staticmethod
+    def track(pipeline):
+        """View method decorator: in-flight gauge plus an uncaught-error counter"""
+        def decorator(view_method):
+            @functools.wraps(view_method)
+            def wrapper(*args, **kwargs):
+                PipelineMetrics.adjust_in_flight(pipeline, 1)
+                try:
+                    return view_method(*args, **kwargs)
+                except Exception:
+                    PipelineMetrics.record_failure(pipeline, 'view')
+                    raise
+                finally:
+                    PipelineMetrics.adjust_in_flight(pipeline, -1)
+            return wrapper
+        return decorator
+
+    @staticmethod
+    def adjust_in_flight(pipeline, delta):
+        if PROMETHEUS_AVAILABLE:
+            IN_FLIGHT.labels(pipeline).inc(delta)
+
+    @staticmethod
+    def record_bytes(pipeline, file_type, size):
+        if PROMETHEUS_AVAILABLE:
+            BYTES_PROCESSED.labels(pipeline, PipelineMetrics.labels(file_type, size)[0]).inc(size or 0)
+
+    @staticmethod
+    def record_failure(pipeline, handler):
+        if PROMETHEUS_AVAILABLE:
+            FAILURES.labels(pipeline, handler).inc()
+
+    @staticmethod
+    def render():
+        """(body, content type) in the Prometheus text format"""
+        if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+            registry = CollectorRegistry()
+            multiprocess.MultiProcessCollector(registry)
+        else:
+            registry = REGISTRY
+        return generate_latest(registry), CONTENT_TYPE_LATEST
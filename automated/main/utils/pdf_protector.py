@@ -0,0 +1,123 @@
+import tempfile
+from PyPDF2 import PdfReader, PdfWriter
+from PyPDF2.constants import UserAccessPermissions
+
+try:
+    import pikepdf
+    PIKEPDF_AVAILABLE = True
+except ImportError:
+    PIKEPDF_AVAILABLE = False
+
+
+class PDFProtector:
+    """
+    Native PDF password protection.
+
+    With pikepdf (qpdf) the existing object graph is encrypted in place with
+    AES-256 (R6) and written once; no pages are copied or rebuilt. Without it,
+    PyPDF2 clones the document root and applies RC4-128, the strongest
+    algorithm PyPDF2 3.0 offers.
+    """
+
+    PERMISSIONS = ('print', 'modify', 'extract', 'annotate', 'fill_forms', 'assemble', 'accessibility')
+
+    # Same defaults as pikepdf: everything except reassembling pages
+    DEFAULT_PERMISSIONS = ('print', 'modify', 'extract', 'annotate', 'fill_forms', 'accessibility')
+
+    READ_SIZE = 64 * 1024
+    SPOOL_MAX_SIZE = 10 * 1024 * 1024
+
+    @staticmethod
+    def parse_permissions(permissions) -> tuple:
+        """Accept a comma-separated string or a list of them (repeated form fields); None means the defaults"""
+        if permissions is None:
+            return PDFProtector.DEFAULT_PERMISSIONS
+
+        if isinstance(permissions, str):
+            permissions = [permissions]
+        permissions = [p for item in permissions for p in str(item).split(',')]
+        permissions = tuple(p.strip().lower() for p in permissions if p.strip())
+
+        unknown = [p for p in permissions if p not in PDFProtector.PERMISSIONS]
+        if unknown:
+            raise ValueError(f"Unknown PDF permissions: {', '.join(unknown)}")
+
+        return permissions
+
+    @staticmethod
+    def _protect_pikepdf(file_obj, output, user_password, owner_password, permissions):
+        allow = pikepdf.Permissions(
+            accessibility='accessibility' in permissions,
+            extract='extract' in permissions,
+            modify_annotation='annotate' in permissions,
+            modify_assembly='assemble' in permissions,
+            modify_form='fill_forms' in permissions,
+            modify_other='modify' in permissions,
+            print_lowres='print' in permissions,
+            print_highres='print' in permissions,
+        )
+        with pikepdf.open(file_obj) as pdf:
+            pdf.save(
+                output,
+                encryption=pikepdf.Encryption(user=user_password, owner=owner_password, R=6, allow=allow),
+                object_stream_mode=pikepdf.ObjectStreamMode.preserve,
+            )
+
+    @staticmethod
+    def _protect_pypdf2(file_obj, output, user_password, owner_password, permissions):
+        flags = {
+            'print': UserAccessPermissions.PRINT | UserAccessPermissions.PRINT_TO_REPRESENTATION,
+            'modify': UserAccessPermissions.MODIFY,
+            'extract': UserAccessPermissions.EXTRACT,
+            'annotate': UserAccessPermissions.ADD_OR_MODIFY,
+            'fill_forms': UserAccessPermissions.FILL_FORM_FIELDS,
+            'assemble': UserAccessPermissions.ASSEMBLE_DOC,
+            'accessibility': UserAccessPermissions.EXTRACT_TEXT_AND_GRAPHICS,
+        }
+        permissions_flag = UserAccessPermissions(0)
+        for permission in permissions:
+            permissions_flag |= flags[permission]
+
+        pdf_writer = PdfWriter()
+        pdf_writer.clone_document_from_reader(PdfReader(file_obj))
+        pdf_writer.encrypt(
+            user_password=user_password,
+            owner_password=owner_password,
+            use_128bit=True,
+            permissions_flag=permissions_flag
+        )
+        pdf_writer.write(output)
+
+    @staticmethod
+    def protect_stream(file_obj, user_password: str, owner_password: str = None, permissions=None) -> tuple:
+        """
+        Encrypt a PDF and return (iterator of output chunks, output size).
+        The result is spooled (in memory up to 10MB, then on disk) and streamed.
+        """
+        permissions = PDFProtector.parse_permissions(permissions)
+        owner_password = owner_password or user_password
+
+        file_obj.seek(0)
+        output = tempfile.SpooledTemporaryFile(max_size=PDFProtector.SPOOL_MAX_SIZE)
+        try:
+            if PIKEPDF_AVAILABLE:
+                PDFProtector._protect_pikepdf(file_obj, output, user_password, owner_password, permissions)
+            else:
+                PDFProtector._protect_pypdf2(file_obj, output, user_password, owner_password, permissions)
+            size = output.tell()
+        except Exception:
+            output.close()
+            raise
+
+        def generate():
+            try:
+                output.seek(0)
+                while True:
+                    chunk = output.read(PDFProtector.READ_SIZE)
+                    if not chunk:
+                        break
+                    yield chunk
+            finally:
+                output.close()
+
+        return generate(), size
@@ -0,0 +1,127 @@
+import re
+import threading
+import time
+from django.conf import settings
+from django.db.models import Count, Max
+from .risk_analyzer import RiskAnalyzer
+
+
+class CompiledRule:
+    """
+    One platform's risky keys, prebuilt for matching metadata keys.
+
+    Matching is case-insensitive: a key matches when it equals one of the
+    rule's keys (frozenset lookup) or contains one of them as a substring
+    (one compiled alternation), so 'gps' also catches 'GPS GPSLatitude'.
+    """
+    __slots__ = ('platform', 'source_keys', 'keys', 'pattern', 'data')
+
+    def __init__(self, platform, keys, data=None):
+        self.platform = platform
+        self.source_keys = tuple(keys)
+        self.keys = frozenset(str(k).lower() for k in keys if k)
+        # Longest first so the alternation prefers the most specific key
+        alternatives = sorted(self.keys, key=len, reverse=True)
+        self.pattern = re.compile('|'.join(map(re.escape, alternatives))) if alternatives else None
+        self.data = data  # serialized PlatformRule, None for built-in defaults
+
+    def matches(self, key):
+        key = str(key).lower()
+        if key in self.keys:
+            return True
+        return self.pattern is not None and self.pattern.search(key) is not None
+
+    def risky_keys(self, keys):
+        return [key for key in keys if self.matches(key)]
+
+
+class PlatformRuleCache:
+    """
+    Process-local cache of active PlatformRules, compiled once per change.
+
+    Saving or deleting a PlatformRule clears this process's copy. Other
+    processes compare a version stamp read from the database (rule count and
+    latest updated_at) at most every PLATFORM_RULE_CHECK_INTERVAL seconds and
+    reload when it moved, so every worker picks up changes whatever CACHES is.
+    Bulk .update() calls that leave updated_at alone are not noticed.
+    """
+
+    _lock = threading.Lock()
+    _rules = None
+    _version = None
+    _checked_at = 0.0
+    _defaults = {}
+
+    @staticmethod
+    def _load():
+        from ..models import PlatformRule
+        from ..serializers import PlatformRuleSerializer
+
+        rules = {}
+        for rule in PlatformRule.objects.filter(is_active=True):
+            data = PlatformRuleSerializer(rule).data
+            rules[rule.platform] = CompiledRule(rule.platform, data['risky_metadata_keys'], data)
+        return rules
+
+    @staticmethod
+    def _current_version():
+        from ..models import PlatformRule
+
+        stamp = PlatformRule.objects.order_by().aggregate(count=Count('id'), updated=Max('updated_at'))
+        return stamp['count'], stamp['updated']
+
+    @staticmethod
+    def rules():
+        """All active rules as {platform: CompiledRule}"""
+        now = time.monotonic()
+        rules = PlatformRuleCache._rules
+        interval = getattr(settings, 'PLATFORM_RULE_CHECK_INTERVAL', 5)
+        if rules is not None and now - PlatformRuleCache._checked_at < interval:
+            return rules
+
+        with PlatformRuleCache._lock:
+            version = PlatformRuleCache._current_version()
+            if PlatformRuleCache._rules is None or version != PlatformRuleCache._version:
+                PlatformRuleCache._rules = PlatformRuleCache._load()
+                PlatformRuleCache._version = version
+            PlatformRuleCache._checked_at = now
+            return PlatformRuleCache._rules
+
+    @staticmethod
+    def all():
+        """Every platform with a rule: active DB rules over the built-in defaults"""
+        rules = {platform: PlatformRuleCache._default(platform) for platform in RiskAnalyzer.PLATFORM_RISKY_KEYS}
+        rules.update(PlatformRuleCache.rules())
+        return rules
+
+    @staticmethod
+    def get(platform='general'):
+        """
+        Rule for a platform: its active DB rule, else RiskAnalyzer's built-in
+        keys for it, else the 'general' rule
+        """
+        rules = PlatformRuleCache.rules()
+        rule = rules.get(platform)
+        if rule is not None:
+            return rule
+        if platform in RiskAnalyzer.PLATFORM_RISKY_KEYS:
+            return PlatformRuleCache._default(platform)
+        return rules.get('general') or PlatformRuleCache._default('general')
+
+    @staticmethod
+    def _default(platform):
+        defaults = PlatformRuleCache._defaults
+        if platform not in defaults:
+            defaults[platform] = CompiledRule(platform, RiskAnalyzer.PLATFORM_RISKY_KEYS[platform])
+        return defaults[platform]
+
+    @staticmethod
+    def clear():
+        """Drop this process's copy; the next read reloads from the database"""
+        with PlatformRuleCache._lock:
+            PlatformRuleCache._rules = None
+
+    @staticmethod
+    def invalidate():
+        """Clear this process; the others see the new stamp on their next check"""
+        PlatformRuleCache.clear()
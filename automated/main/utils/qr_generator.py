@@ -1,24 +1,129 @@
+import hashlib
+import logging
+import os
+import shutil
+import tempfile
 import qrcode
+import qrcode.image.svg
+from functools import lru_cache
 from io import BytesIO
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
 
 
 class QRCodeGenerator:
-    
+    """
+    QR codes for share links.
+
+    A share URL never changes for a given share_token, so rendered codes are
+    cached by (url, size, format): in process with an LRU, and, when a share
+    token is given, on disk under MEDIA_ROOT/qr_cache/<share_token>/ so other
+    workers and restarts reuse them. Sizes are snapped to SIZES, which bounds
+    each token's directory to one file per size and format; the directory goes
+    with the analysis. SVG output is drawn as a single vector path and never
+    touches Pillow.
+    """
+
+    FORMATS = {
+        'png': 'image/png',
+        'svg': 'image/svg+xml',
+    }
+    SIZES = (128, 256, 512, 1024)
+    BORDER = 4
+    CACHE_DIR = 'qr_cache'
+    CACHE_VERSION = 1  # bump when rendering changes to invalidate cached codes
+
     @staticmethod
-    def generate_qr_code(url, size=300):
+    def _make_qr(url, box_size=10, image_factory=None):
         qr = qrcode.QRCode(
             version=1,
             error_correction=qrcode.constants.ERROR_CORRECT_L,
-            box_size=10,
-            border=4,
+            box_size=box_size,
+            border=QRCodeGenerator.BORDER,
+            image_factory=image_factory,
         )
         qr.add_data(url)
         qr.make(fit=True)
-        
-        img = qr.make_image(fill_color="black", back_color="white")
-        
+        return qr
+
+    @staticmethod
+    def render(url, size=300, fmt='png') -> bytes:
+        """Render a QR code without caching"""
         buffer = BytesIO()
-        img.save(buffer, format='PNG')
-        buffer.seek(0)
-        
-        return buffer
\ No newline at end of file
+
+        if fmt == 'svg':
+            qr = QRCodeGenerator._make_qr(url, image_factory=qrcode.image.svg.SvgPathFillImage)
+            qr.make_image().save(buffer)
+        else:
+            qr = QRCodeGenerator._make_qr(url)
+            # Pick the largest whole-pixel module size that fits in `size`
+            modules = qr.modules_count + 2 * QRCodeGenerator.BORDER
+            qr.box_size = max(1, size // modules)
+            img = qr.make_image(fill_color="black", back_color="white")
+            img.save(buffer, format='PNG', optimize=True)
+
+        return buffer.getvalue()
+
+    @staticmethod
+    def normalize(size, fmt):
+        """Validate the format and snap the size up to one of SIZES; SVG is size independent"""
+        if fmt not in QRCodeGenerator.FORMATS:
+            raise ValueError(f"Unsupported QR format: {fmt}")
+        if fmt == 'svg':
+            return 0, fmt
+        size = int(size)
+        return next((bucket for bucket in QRCodeGenerator.SIZES if bucket >= size), QRCodeGenerator.SIZES[-1]), fmt
+
+    @staticmethod
+    def cache_key(url, size=300, fmt='png') -> str:
+        """Stable key for (url, size, format); also used as the ETag"""
+        size, fmt = QRCodeGenerator.normalize(size, fmt)
+        raw = f"{QRCodeGenerator.CACHE_VERSION}:{fmt}:{size}:{url}"
+        return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+    @staticmethod
+    def _cache_dir(share_token):
+        return os.path.join(settings.MEDIA_ROOT, QRCodeGenerator.CACHE_DIR, str(share_token))
+
+    @staticmethod
+    def delete_cached(share_token):
+        """Remove the codes cached on disk for a share token"""
+        shutil.rmtree(QRCodeGenerator._cache_dir(share_token), ignore_errors=True)
+
+    @staticmethod
+    @lru_cache(maxsize=512)
+    def get_qr_code(url, size=300, fmt='png', share_token=None) -> bytes:
+        """
+        Rendered QR code bytes, from memory, disk or a fresh render. Only
+        codes with a share_token are kept on disk; url must then be the
+        token's canonical share URL.
+        """
+        size, fmt = QRCodeGenerator.normalize(size, fmt)
+        if share_token is None:
+            return QRCodeGenerator.render(url, size, fmt)
+        key = QRCodeGenerator.cache_key(url, size, fmt)
+        path = os.path.join(QRCodeGenerator._cache_dir(share_token), f"{key}.{fmt}")
+
+        try:
+            with open(path, 'rb') as f:
+                return f.read()
+        except OSError:
+            pass
+
+        data = QRCodeGenerator.render(url, size, fmt)
+
+        # Write atomically so concurrent workers never read a partial file
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with tempfile.NamedTemporaryFile(dir=os.path.dirname(path), delete=False) as temp:
+                temp.write(data)
+            os.replace(temp.name, path)
+        except OSError as e:
+            logger.warning("QR cache write failed: %s", e)
+
+        return data
+
+    @staticmethod
+    def generate_qr_code(url, size=300):
+        return BytesIO(QRCodeGenerator.get_qr_code(url, size, 'png'))
@@ -0,0 +1,59 @@
+from datetime import timedelta
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+
+
+class RetentionPolicy:
+    """
+    One retention rule over FileAnalysis, applied by `manage.py purge`.
+
+    action 'delete' removes matching analyses with their metadata entries
+    and both stored files; 'original_file' or 'cleaned_file' only removes
+    that file and keeps the analysis. Age is taken from created_at and the
+    limit is read from the named setting in days (0 disables the rule).
+    """
+
+    ACTIONS = ('delete', 'original_file', 'cleaned_file')
+
+    def __init__(self, name, days_setting, action, filters=None):
+        if action not in RetentionPolicy.ACTIONS:
+            raise ValueError(f"Unknown retention action: {action}")
+        self.name = name
+        self.days_setting = days_setting
+        self.action = action
+        self.filters = filters
+
+    @property
+    def days(self):
+        return getattr(settings, self.days_setting, 0)
+
+    @property
+    def enabled(self):
+        return self.days > 0
+
+    def cutoff(self, now=None):
+        return (now or timezone.now()) - timedelta(days=self.days)
+
+    def queryset(self, now=None):
+        from ..models import FileAnalysis
+
+        queryset = FileAnalysis.objects.filter(created_at__lt=self.cutoff(now))
+        if self.filters is not None:
+            queryset = queryset.filter(self.filters)
+        if self.action != 'delete':
+            queryset = queryset.exclude(**{self.action: ''}).exclude(**{f'{self.action}__isnull': True})
+        return queryset
+
+    def __str__(self):
+        return f"{self.name} ({self.action} after {self.days} days)"
+
+
+# Row deletions run before file-only rules so their files are not handled twice
+RETENTION_POLICIES = [
+    RetentionPolicy('anonymous', 'RETENTION_ANONYMOUS_DAYS', 'delete', Q(user__isnull=True)),
+    RetentionPolicy('unfinished', 'RETENTION_FAILED_DAYS', 'delete', Q(status__in=['failed', 'pending'])),
+    RetentionPolicy('analyses', 'RETENTION_ANALYSIS_DAYS', 'delete'),
+    RetentionPolicy('original_files', 'RETENTION_ORIGINAL_FILE_DAYS', 'original_file'),
+    RetentionPolicy('cleaned_files', 'RETENTION_CLEANED_FILE_DAYS', 'cleaned_file'),
+]
@@ -11,6 +11,29 @@ class RiskAnalyzer:
         'other': 10
     }
     
+    # Score bands used by the dashboard and the history filters
+    RISK_BANDS = (
+        ('high', 70),
+        ('medium', 40),
+        ('low', 0),
+    )
+    
+    # Used when no active PlatformRule exists for a platform
+    PLATFORM_RISKY_KEYS = {
+        'instagram': ('GPSInfo', 'GPS', 'location', 'Make', 'Model'),
+        'facebook': ('GPSInfo', 'GPS', 'location', 'Author', 'Copyright'),
+        'twitter': ('GPSInfo', 'GPS', 'location', 'Software'),
+        'linkedin': ('GPSInfo', 'GPS', 'location', 'Author'),
+        'general': ('GPSInfo', 'GPS', 'location', 'Author', 'Copyright', 'Make', 'Model'),
+    }
+    
+    @staticmethod
+    def get_risk_band(risk_score):
+        for band, threshold in RiskAnalyzer.RISK_BANDS:
+            if risk_score >= threshold:
+                return band
+        return 'low'
+    
     @staticmethod
     def get_risk_level(category):
         weight = RiskAnalyzer.RISK_WEIGHTS.get(category, 10)
@@ -29,6 +52,7 @@ class RiskAnalyzer:
         """
         Calculate risk score based on presence of sensitive metadata categories
         and overall metadata exposure.
+        VectorizedRiskScorer applies the same rules in bulk; change both together.
         """
         if not metadata_entries:
             return 0
@@ -157,14 +181,35 @@ class RiskAnalyzer:
             'categories': categories
         }
     
+    @staticmethod
+    def get_platform_risk_matrix(metadata_entries, rules):
+        """
+        Risk per platform for one file: each platform is scored on the
+        entries its rule flags. metadata_entries are dicts with 'key' and
+        'category'; rules maps platform to a CompiledRule.
+        """
+        flagged = {platform: [] for platform in rules}
+        for entry in metadata_entries:
+            for platform, rule in rules.items():
+                if rule.matches(entry['key']):
+                    flagged[platform].append(entry)
+        
+        matrix = []
+        for platform in sorted(rules):
+            entries = flagged[platform]
+            risk_score = RiskAnalyzer.calculate_risk_score(entries)
+            matrix.append({
+                'platform': platform,
+                'risk_score': risk_score,
+                'risk_band': RiskAnalyzer.get_risk_band(risk_score),
+                'risky_count': len(entries),
+                'risky_keys': [entry['key'] for entry in entries],
+                'risk_recommendation': RiskAnalyzer.get_risk_recommendation(risk_score),
+            })
+        return matrix
+    
     @staticmethod
     def get_platform_risky_keys(platform='general'):
-        platform_rules = {
-            'instagram': ['GPSInfo', 'GPS', 'location', 'Make', 'Model'],
-            'facebook': ['GPSInfo', 'GPS', 'location', 'Author', 'Copyright'],
-            'twitter': ['GPSInfo', 'GPS', 'location', 'Software'],
-            'linkedin': ['GPSInfo', 'GPS', 'location', 'Author'],
-            'general': ['GPSInfo', 'GPS', 'location', 'Author', 'Copyright', 'Make', 'Model']
-        }
-        
-        return platform_rules.get(platform, platform_rules['general'])
\ No newline at end of file
+        """Risky keys for a platform from the active PlatformRules (cached)"""
+        from .platform_rules import PlatformRuleCache
+        return list(PlatformRuleCache.get(platform).source_keys)
@@ -0,0 +1,69 @@
+import numpy as np
+from .risk_analyzer import RiskAnalyzer
+
+
+class VectorizedRiskScorer:
+    """
+    RiskAnalyzer.calculate_risk_score for many analyses in one NumPy pass.
+
+    Entries are given as parallel arrays: the analysis each entry belongs
+    to (0..count-1), its category code from category_codes() and optionally
+    how many entries it stands for. Per-analysis tier counts come from
+    np.bincount and the score rules are applied with np.select, so the cost
+    per chunk is a handful of array operations whatever its size.
+
+    Must stay in step with calculate_risk_score; the tests compare both.
+    """
+
+    UNKNOWN_WEIGHT = 10
+
+    @staticmethod
+    def category_codes():
+        """({category: code}, weight per code); the last code is 'unknown'"""
+        categories = tuple(RiskAnalyzer.RISK_WEIGHTS)
+        weights = [RiskAnalyzer.RISK_WEIGHTS[c] for c in categories] + [VectorizedRiskScorer.UNKNOWN_WEIGHT]
+        return {category: code for code, category in enumerate(categories)}, np.array(weights, dtype=np.int64)
+
+    @staticmethod
+    def encode(categories, codes=None):
+        """Category names to an array of codes"""
+        if codes is None:
+            codes, _ = VectorizedRiskScorer.category_codes()
+        unknown = len(codes)
+        return np.fromiter((codes.get(c, unknown) for c in categories), dtype=np.intp, count=len(categories))
+
+    @staticmethod
+    def score(groups, category_codes, count, entry_counts=None, weights=None):
+        """
+        Risk score per analysis (int64 array of length count). entry_counts
+        lets one (analysis, category) pair stand for several entries.
+        """
+        if weights is None:
+            _, weights = VectorizedRiskScorer.category_codes()
+        groups = np.asarray(groups, dtype=np.intp)
+        entry_weights = weights[np.asarray(category_codes, dtype=np.intp)]
+        if entry_counts is None:
+            entry_counts = np.ones(len(groups), dtype=np.int64)
+        else:
+            entry_counts = np.asarray(entry_counts, dtype=np.int64)
+
+        def tally(mask):
+            return np.bincount(groups[mask], weights=entry_counts[mask], minlength=count).astype(np.int64)
+
+        critical = tally(entry_weights >= 80)
+        high = tally((entry_weights >= 60) & (entry_weights < 80))
+        medium = tally((entry_weights >= 40) & (entry_weights < 60))
+        low = tally(entry_weights < 40)
+        total = critical + high + medium + low
+
+        score = np.select(
+            [critical > 0, high > 0, medium > 0, low > 0],
+            [
+                np.minimum(95, 85 + (critical - 1) * 5),
+                np.minimum(75, 65 + (high - 1) * 3),
+                np.where(medium > 2, np.minimum(55, 40 + (medium - 2) * 3), 40),
+                np.where(low > 10, 25, np.where(low > 5, 15, 10)),
+            ],
+            default=0,
+        )
+        return np.where(total > 20, np.minimum(100, score + 5), score)
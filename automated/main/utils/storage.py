@@ -0,0 +1,60 @@
+import os
+import re
+import uuid
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+from django.utils.text import get_valid_filename
+
+
+@deconstructible
+class ShardedUploadTo:
+    """
+    upload_to that spreads files over nested directories:
+
+        <prefix>/<aa>/<bb>/<uuid4 hex>_<filename>
+
+    aa/bb are the first four hex digits of a fresh UUID, so each leaf
+    directory holds about 1/65536 of the files, and the full UUID in the
+    name makes collisions impossible without checking the disk.
+    """
+
+    def __init__(self, prefix):
+        self.prefix = prefix.strip('/')
+
+    def __call__(self, instance, filename, max_length=255):
+        key = uuid.uuid4().hex
+        directory = f"{self.prefix}/{key[:2]}/{key[2:4]}/{key}_"
+
+        # Keep the extension if the original name has to be shortened
+        filename = get_valid_filename(os.path.basename(filename)) or 'file'
+        room = max_length - len(directory)
+        if len(filename) > room:
+            root, ext = os.path.splitext(filename)
+            filename = root[:max(1, room - len(ext))] + ext[:room - 1]
+        return directory + filename
+
+    def __eq__(self, other):
+        return isinstance(other, ShardedUploadTo) and self.prefix == other.prefix
+
+
+SHARDED_NAME_RE = re.compile(r'^[^/]+/[0-9a-f]{2}/[0-9a-f]{2}/[0-9a-f]{32}_[^/]+$')
+
+
+def is_sharded_name(name):
+    return bool(SHARDED_NAME_RE.match(name or ''))
+
+
+@deconstructible
+class ShardedFileSystemStorage(FileSystemStorage):
+    """
+    FileSystemStorage that trusts names from ShardedUploadTo.
+
+    Django's get_available_name calls exists() in a loop and appends random
+    suffixes until a name is free. Sharded names already contain a UUID, so
+    that check is skipped for them; any other name behaves as before.
+    """
+
+    def get_available_name(self, name, max_length=None):
+        if is_sharded_name(name) and (max_length is None or len(name) <= max_length):
+            return name
+        return super().get_available_name(name, max_length)
@@ -0,0 +1,86 @@
+import contextvars
+import functools
+import re
+import time
+from contextlib import contextmanager
+
+
+# Spans of the current request, or None when timing is off for it
+_spans = contextvars.ContextVar('request_timing_spans', default=None)
+
+
+class RequestTiming:
+    """
+    Named spans for the current request, reported as a Server-Timing header
+    by ServerTimingMiddleware.
+
+    Spans live in a context variable that the middleware only sets when
+    SERVER_TIMING_ENABLED is on, so span()/timed() cost one ContextVar
+    lookup when it is off. Spans with the same name are summed.
+    """
+
+    @staticmethod
+    def start():
+        """Begin collecting for this request; returns a token for stop()"""
+        return _spans.set([])
+
+    @staticmethod
+    def stop(token):
+        """Stop collecting; returns [(name, milliseconds), ...]"""
+        spans = _spans.get()
+        _spans.reset(token)
+        return spans or []
+
+    @staticmethod
+    def active():
+        return _spans.get() is not None
+
+    @staticmethod
+    def spans():
+        """Spans recorded so far, without stopping"""
+        return list(_spans.get() or [])
+
+    @staticmethod
+    @contextmanager
+    def span(name):
+        spans = _spans.get()
+        if spans is None:
+            yield
+            return
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            spans.append((name, (time.perf_counter() - start) * 1000))
+
+    @staticmethod
+    def timed(name):
+        """Decorator form of span()"""
+        def decorator(func):
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                spans = _spans.get()
+                if spans is None:
+                    return func(*args, **kwargs)
+                start = time.perf_counter()
+                try:
+                    return func(*args, **kwargs)
+                finally:
+                    spans.append((name, (time.perf_counter() - start) * 1000))
+            return wrapper
+        return decorator
+
+    @staticmethod
+    def totals(spans):
+        """{name: total milliseconds} in first-seen order"""
+        totals = {}
+        for name, duration in spans:
+            totals[name] = totals.get(name, 0) + duration
+        return {name: round(duration, 2) for name, duration in totals.items()}
+
+    @staticmethod
+    def header(totals):
+        """Server-Timing header value"""
+        return ', '.join(
+            f"{re.sub(r'[^A-Za-z0-9_.-]', '_', name)};dur={duration}" for name, duration in totals.items()
+        )
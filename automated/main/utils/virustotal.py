@@ -0,0 +1,186 @@
+import logging
+import random
+import threading
+import time
+import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+from .timing import RequestTiming
+
+logger = logging.getLogger(__name__)
+
+RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+
+
+class VirusTotalUnavailable(Exception):
+    pass
+
+
+class VirusTotalClient:
+    """
+    The VirusTotal v3 calls made by /api/analyze/, over one pooled Session.
+
+    Every request has a connect and a read timeout. Connection errors,
+    timeouts, 429 and 5xx are retried up to VIRUSTOTAL_MAX_RETRIES times with
+    full-jitter exponential backoff (a Retry-After header is honoured, capped
+    at VIRUSTOTAL_BACKOFF_MAX). After VIRUSTOTAL_BREAKER_THRESHOLD calls in a
+    row have failed, the circuit opens: calls raise VirusTotalUnavailable at
+    once for VIRUSTOTAL_BREAKER_COOLDOWN seconds, then a single trial call
+    is let through and its result closes or reopens the circuit.
+    """
+
+    _lock = threading.Lock()
+    _session = None
+    _failures = 0
+    _opened_at = None
+
+    @staticmethod
+    def session():
+        if VirusTotalClient._session is None:
+            with VirusTotalClient._lock:
+                if VirusTotalClient._session is None:
+                    session = requests.Session()
+                    adapter = HTTPAdapter(
+                        pool_connections=1, pool_maxsize=settings.VIRUSTOTAL_POOL_SIZE, max_retries=0
+                    )
+                    session.mount('https://', adapter)
+                    session.mount('http://', adapter)
+                    VirusTotalClient._session = session
+        return VirusTotalClient._session
+
+    @staticmethod
+    def reset():
+        """Close the pooled connections and the circuit (tests, settings changes)"""
+        with VirusTotalClient._lock:
+            if VirusTotalClient._session is not None:
+                VirusTotalClient._session.close()
+            VirusTotalClient._session = None
+            VirusTotalClient._failures = 0
+            VirusTotalClient._opened_at = None
+
+    @staticmethod
+    def is_open():
+        with VirusTotalClient._lock:
+            return VirusTotalClient._opened_at is not None
+
+    @staticmethod
+    def _before_call():
+        with VirusTotalClient._lock:
+            opened_at = VirusTotalClient._opened_at
+            if opened_at is None:
+                return
+            remaining = settings.VIRUSTOTAL_BREAKER_COOLDOWN - (time.monotonic() - opened_at)
+            if remaining > 0:
+                raise VirusTotalUnavailable(f"VirusTotal circuit is open for another {remaining:.0f}s")
+            # Half-open: this call is the trial, everyone else keeps failing fast
+            VirusTotalClient._opened_at = time.monotonic()
+
+    @staticmethod
+    def _after_call(succeeded):
+        with VirusTotalClient._lock:
+            if succeeded:
+                VirusTotalClient._failures = 0
+                VirusTotalClient._opened_at = None
+                return
+            VirusTotalClient._failures += 1
+            if VirusTotalClient._failures >= settings.VIRUSTOTAL_BREAKER_THRESHOLD:
+                if VirusTotalClient._opened_at is None:
+                    logger.warning("VirusTotal circuit opened", extra={'failures': VirusTotalClient._failures})
+                VirusTotalClient._opened_at = time.monotonic()
+
+    @staticmethod
+    def backoff(attempt, retry_after=None):
+        """Seconds to wait before retry number `attempt` (0-based)"""
+        cap = settings.VIRUSTOTAL_BACKOFF_MAX
+        if retry_after is not None:
+            try:
+                return min(cap, max(0.0, float(retry_after)))
+            except ValueError:
+                pass
+        return random.uniform(0, min(cap, settings.VIRUSTOTAL_BACKOFF_BASE * 2 ** attempt))
+
+    @staticmethod
+    def request(method, path, **kwargs):
+        """One API call with timeouts, retries and the circuit breaker; returns the 2xx Response"""
+        VirusTotalClient._before_call()
+        session = VirusTotalClient.session()
+        url = f"{settings.VIRUSTOTAL_BASE_URL}{path}"
+        headers = {'x-apikey': settings.VIRUSTOTAL_API_KEY}
+        timeout = (settings.VIRUSTOTAL_CONNECT_TIMEOUT, settings.VIRUSTOTAL_READ_TIMEOUT)
+        retries = settings.VIRUSTOTAL_MAX_RETRIES
+
+        for attempt in range(retries + 1):
+            retry_after = None
+            try:
+                response = session.request(method, url, headers=headers, timeout=timeout, **kwargs)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                problem = f"{type(e).__name__}: {e}"
+            else:
+                if response.status_code < 400:
+                    VirusTotalClient._after_call(True)
+                    return response
+                if response.status_code not in RETRY_STATUSES:
+                    # A bad key or request will not get better by retrying, and says nothing about VT's health
+                    VirusTotalClient._after_call(True)
+                    raise VirusTotalUnavailable(f"VirusTotal returned {response.status_code} for {method} {path}")
+                problem = f"HTTP {response.status_code}"
+                retry_after = response.headers.get('Retry-After')
+
+            if attempt == retries:
+                break
+            pause = VirusTotalClient.backoff(attempt, retry_after)
+            logger.warning(
+                "VirusTotal call failed, retrying",
+                extra={'vt_path': path, 'attempt': attempt + 1, 'problem': problem, 'retry_in_s': round(pause, 3)}
+            )
+            time.sleep(pause)
+
+        VirusTotalClient._after_call(False)
+        raise VirusTotalUnavailable(f"VirusTotal {method} {path} failed after {retries + 1} attempts ({problem})")
+
+    @staticmethod
+    def upload(file_obj, filename):
+        """Submit a file for scanning; returns the analysis id"""
+        position = file_obj.tell()
+        data = file_obj.read()
+        file_obj.seek(position)
+        response = VirusTotalClient.request('POST', '/files', files={'file': (filename, data)})
+        try:
+            return response.json()['data']['id']
+        except (ValueError, KeyError, TypeError):
+            raise VirusTotalUnavailable("VirusTotal upload response has no analysis id")
+
+    @staticmethod
+    def analysis(analysis_id):
+        """The analysis attributes (status, stats, ...) as they are right now"""
+        response = VirusTotalClient.request('GET', f'/analyses/{analysis_id}')
+        try:
+            return response.json()['data']['attributes']
+        except (ValueError, KeyError, TypeError):
+            raise VirusTotalUnavailable(f"VirusTotal analysis {analysis_id} response has no attributes")
+
+    @staticmethod
+    def wait_for_stats(analysis_id):
+        """
+        Poll every VIRUSTOTAL_POLL_DELAY seconds until the analysis is
+        completed and return its stats; VirusTotalUnavailable if that takes
+        longer than VIRUSTOTAL_POLL_TIMEOUT.
+        """
+        deadline = time.monotonic() + settings.VIRUSTOTAL_POLL_TIMEOUT
+        while True:
+            with RequestTiming.span('vt_wait'):
+                time.sleep(settings.VIRUSTOTAL_POLL_DELAY)
+            attributes = VirusTotalClient.analysis(analysis_id)
+            if attributes.get('status') == 'completed' and 'stats' in attributes:
+                return attributes['stats']
+            if time.monotonic() >= deadline:
+                raise VirusTotalUnavailable(
+                    f"VirusTotal analysis {analysis_id} still '{attributes.get('status')}' "
+                    f"after {settings.VIRUSTOTAL_POLL_TIMEOUT:.0f}s"
+                )
+
+    @staticmethod
+    def scan(file_obj, filename):
+        """Upload and wait for the verdict; returns (analysis id, stats)"""
+        analysis_id = VirusTotalClient.upload(file_obj, filename)
+        return analysis_id, VirusTotalClient.wait_for_stats(analysis_id)
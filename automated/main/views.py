@@ -2,12 +2,13 @@ from rest_framework import viewsets, status, generics
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.views import APIView
-from django.http import FileResponse, StreamingHttpResponse
+from django.http import FileResponse, HttpResponse, StreamingHttpResponse
+from django.utils.http import parse_etags, quote_etag
 from django.core.files.base import ContentFile
-from .models import FileAnalysis, MetadataEntry, PlatformRule
+from .models import FileAnalysis, MetadataEntry, PlatformRule, UserStats
 from .serializers import (
-    FileAnalysisSerializer, MetadataEntrySerializer,
-    FileUploadSerializer, PlatformRuleSerializer
+    FileAnalysisSerializer, FileAnalysisListSerializer, MetadataEntrySerializer,
+    FileUploadSerializer, PlatformRuleSerializer, UserStatsSerializer
 )
 from rest_framework.permissions import IsAuthenticated, AllowAny
 from rest_framework.authtoken.models import Token
@@ -17,21 +18,30 @@ from .utils.metadata_extractor import MetadataExtractor
 from .utils.metadata_remover import MetadataRemover
 from .utils.risk_analyzer import RiskAnalyzer
 from .utils.qr_generator import QRCodeGenerator
+from .utils.platform_rules import PlatformRuleCache
+from .utils.metrics import PROMETHEUS_AVAILABLE, PipelineMetrics, TimedStream
+from .utils.timing import RequestTiming
+from .utils.virustotal import VirusTotalClient, VirusTotalUnavailable
 import io
+import mimetypes
 import os
 import tempfile
 from .utils.encryption_handler import EncryptionHandler, PasswordStrengthValidator
+from .utils.http_range import parse_range_header, RangeNotSatisfiable
+from .utils.file_server import FileServer
+from .pagination import AnalysisCursorPagination
 from .serializers import (
     RegisterSerializer, LoginSerializer, UserSerializer,
     ChangePasswordSerializer, UpdateProfileSerializer
 )
-import requests
+import logging
 from django.conf import settings
-import time
 
 from .utils.google_auth import GoogleOAuth
 from django.shortcuts import redirect
 
+logger = logging.getLogger(__name__)
+
 class GoogleLoginView(APIView):
     """
     Initiate Google OAuth login
@@ -110,9 +120,7 @@ class GoogleCallbackView(APIView):
             return redirect(frontend_url)
             
         except Exception as e:
-            import traceback
-            print("Google OAuth Error:", str(e))
-            print(traceback.format_exc())
+            logger.exception("Google OAuth Error")
             
             return Response(
                 {'error': f'Authentication failed: {str(e)}'},
@@ -182,9 +190,7 @@ class GoogleLoginTokenView(APIView):
             }, status=status.HTTP_200_OK)
             
         except Exception as e:
-            import traceback
-            print("Google Token Verification Error:", str(e))
-            print(traceback.format_exc())
+            logger.exception("Google Token Verification Error")
             
             return Response(
                 {'error': 'Invalid Google token'},
@@ -380,12 +386,42 @@ def file_iterator(file_object, chunk_size=8192):
         yield data
 
 
+def share_url(request, share_token):
+    """Public link for a share token, from SITE_URL when it is set"""
+    path = f'/share/{share_token}/'
+    if settings.SITE_URL:
+        return f'{settings.SITE_URL}{path}'
+    return request.build_absolute_uri(path)
+
+
+def clean_upload(file_obj, uploaded_file, platform, clean_mode):
+    """Strip everything, or with clean_mode 'platform' only the platform rule's keys"""
+    if clean_mode == 'platform':
+        return MetadataRemover.remove_selective_metadata(
+            file_obj, uploaded_file.content_type, PlatformRuleCache.get(platform), uploaded_file.name
+        )
+    return MetadataRemover.remove_metadata(file_obj, uploaded_file.content_type, uploaded_file.name)
+
+
 class FileAnalysisViewSet(viewsets.ModelViewSet):
     serializer_class = FileAnalysisSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = AnalysisCursorPagination
 
     def get_queryset(self):
-        return FileAnalysis.objects.filter(user=self.request.user)
+        queryset = FileAnalysis.objects.filter(user=self.request.user)
+        if self.action == 'list':
+            queryset = queryset.defer('metadata_blob')
+        elif self.action == 'retrieve' and getattr(settings, 'METADATA_STORAGE', 'rows') != 'compact':
+            # Compact analyses carry their entries on the row itself
+            queryset = queryset.prefetch_related('metadata_entries')
+        return queryset
+    
+    def get_serializer_class(self):
+        # Listings skip nested metadata entries; the dashboard only needs metadata_count
+        if self.action == 'list':
+            return FileAnalysisListSerializer
+        return FileAnalysisSerializer
 
     
     @action(detail=True, methods=['get'])
@@ -398,43 +434,112 @@ class FileAnalysisViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_404_NOT_FOUND
             )
         
-        # Check file size for streaming
-        file_size = file_analysis.cleaned_file.size
+        # Range, ETag/Last-Modified and proxy offload are handled by FileServer
+        return FileServer.serve_cleaned_file(request, file_analysis)
+    
+    @action(detail=True, methods=['get'])
+    def qr_code(self, request, pk=None):
+        file_analysis = self.get_object()
         
-        if file_size > 10 * 1024 * 1024:  # > 10MB, use streaming
-            response = StreamingHttpResponse(
-                file_iterator(file_analysis.cleaned_file.open('rb')),
-                content_type=file_analysis.file_type
+        url = share_url(request, file_analysis.share_token)
+        # The Host header is client controlled: only SITE_URL links are cached on disk
+        cache_token = file_analysis.share_token if settings.SITE_URL else None
+        # ?format= is taken by DRF's renderer negotiation
+        fmt = request.query_params.get('output', 'png')
+        
+        try:
+            size, fmt = QRCodeGenerator.normalize(request.query_params.get('size', 300), fmt)
+        except ValueError:
+            return Response(
+                {'error': f"output must be one of: {', '.join(QRCodeGenerator.FORMATS)}; size must be an integer"},
+                status=status.HTTP_400_BAD_REQUEST
             )
-            response['Content-Disposition'] = f'attachment; filename="clean_{file_analysis.original_filename}"'
-            response['Content-Length'] = file_size
+        
+        # The code for a share URL never changes, so clients may cache it forever
+        etag = quote_etag(QRCodeGenerator.cache_key(url, size, fmt))
+        cache_control = 'private, max-age=31536000, immutable'
+        
+        if etag in parse_etags(request.META.get('HTTP_IF_NONE_MATCH', '')):
+            response = HttpResponse(status=status.HTTP_304_NOT_MODIFIED)
         else:
-            response = FileResponse(
-                file_analysis.cleaned_file.open('rb'),
-                as_attachment=True,
-                filename=f"clean_{file_analysis.original_filename}"
+            response = HttpResponse(
+                QRCodeGenerator.get_qr_code(url, size, fmt, cache_token),
+                content_type=QRCodeGenerator.FORMATS[fmt]
             )
-            response['Content-Length'] = file_size
+            response['Content-Disposition'] = f'attachment; filename="qr_{file_analysis.id}.{fmt}"'
         
+        response['ETag'] = etag
+        response['Cache-Control'] = cache_control
         return response
     
-    @action(detail=True, methods=['get'])
-    def qr_code(self, request, pk=None):
+    @action(detail=True, methods=['get', 'post'], url_path='risk-matrix')
+    def risk_matrix(self, request, pk=None):
+        """
+        Risk for every platform rule from the stored metadata, no re-upload
+        GET  /api/analyses/<id>/risk-matrix/
+        POST /api/analyses/<id>/risk-matrix/ {"platform": "...", "reclean": true}
+             commits to a platform and re-cleans the original for its rule
+        """
         file_analysis = self.get_object()
+        rules = PlatformRuleCache.all()
+        entries = [{'key': e.key, 'category': e.category} for e in file_analysis.get_metadata_entries()]
+        matrix = RiskAnalyzer.get_platform_risk_matrix(entries, rules)
         
-        share_url = request.build_absolute_uri(f'/share/{file_analysis.share_token}/')
-        qr_image = QRCodeGenerator.generate_qr_code(share_url)
+        if request.method == 'GET':
+            return Response({
+                'analysis_id': str(file_analysis.id),
+                'platform': file_analysis.platform,
+                'risk_score': file_analysis.risk_score,
+                'platforms': matrix
+            })
         
-        return FileResponse(
-            qr_image,
-            as_attachment=True,
-            filename=f"qr_{file_analysis.id}.png",
-            content_type='image/png'
-        )
+        platform = request.data.get('platform')
+        if platform not in rules:
+            return Response(
+                {'error': f"platform must be one of: {', '.join(sorted(rules))}"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        reclean = str(request.data.get('reclean', 'true')).lower() not in ('false', '0', 'no')
+        old_name = None
+        
+        if reclean:
+            if not file_analysis.original_file:
+                return Response(
+                    {'error': 'Original file no longer available; upload it again to re-clean'},
+                    status=status.HTTP_409_CONFLICT
+                )
+            try:
+                with file_analysis.original_file.open('rb') as original:
+                    cleaned = MetadataRemover.remove_selective_metadata(
+                        original, file_analysis.file_type, rules[platform], file_analysis.original_filename
+                    )
+            except Exception as e:
+                logger.exception("Re-clean Error")
+                return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+            
+            stem, dot, ext = file_analysis.original_filename.rpartition('.')
+            clean_name = f"{stem}_clean.{ext}" if dot else f"{ext}_clean"
+            old_name = file_analysis.cleaned_file.name or None
+            file_analysis.cleaned_file.save(clean_name, cleaned, save=False)
+            # New content: FileServer recomputes the ETag hash on next download
+            file_analysis.cleaned_file_sha256 = ''
+        
+        file_analysis.platform = platform
+        file_analysis.save()
+        if old_name:
+            file_analysis.cleaned_file.storage.delete(old_name)
+        
+        return Response({
+            'analysis_id': str(file_analysis.id),
+            'platform': platform,
+            'recleaned': reclean,
+            'result': next(row for row in matrix if row['platform'] == platform)
+        })
 
 
 class AnalyzeFileView(APIView):
     
+    @PipelineMetrics.track('analyze')
     def post(self, request):
         serializer = FileUploadSerializer(data=request.data)
         
@@ -443,45 +548,28 @@ class AnalyzeFileView(APIView):
         
         uploaded_file = serializer.validated_data['file']
         platform = serializer.validated_data.get('platform', 'general')
+        clean_mode = serializer.validated_data.get('clean_mode', 'all')
+        stage_labels = (uploaded_file.content_type, uploaded_file.size)
         
         # ---------- VIRUSTOTAL VALIDATION (PRE-CHECK) ----------
-        print("🔍 VirusTotal pre-scan started for:", uploaded_file.name)
-
-        vt_response = requests.post(
-            "https://www.virustotal.com/api/v3/files",
-            headers={
-                "x-apikey": settings.VIRUSTOTAL_API_KEY
-            },
-            files={
-                "file": (uploaded_file.name, uploaded_file.read())
-            }
-        )
-
-        print("✅ VirusTotal upload status:", vt_response.status_code)
-
-        if vt_response.status_code != 200:
+        try:
+            with PipelineMetrics.stage('analyze', 'vt_upload', *stage_labels), RequestTiming.span('vt_upload'):
+                analysis_id = VirusTotalClient.upload(uploaded_file, uploaded_file.name)
+            logger.info("VirusTotal upload", extra={'stage': 'vt_upload', 'vt_analysis_id': analysis_id, 'file_size': uploaded_file.size})
+
+            with PipelineMetrics.stage('analyze', 'vt_poll', *stage_labels), RequestTiming.span('vt_poll'):
+                stats = VirusTotalClient.wait_for_stats(analysis_id)
+        except VirusTotalUnavailable as e:
+            logger.warning("VirusTotal unavailable", extra={'stage': 'vt', 'error': str(e)})
             return Response(
                 {"error": "Virus scanning service unavailable"},
                 status=status.HTTP_503_SERVICE_UNAVAILABLE
             )
 
-        analysis_id = vt_response.json()["data"]["id"]
-        print("🆔 VirusTotal analysis_id:", analysis_id)
-
-        time.sleep(5)
-
-        analysis_response = requests.get(
-            f"https://www.virustotal.com/api/v3/analyses/{analysis_id}",
-            headers={
-                "x-apikey": settings.VIRUSTOTAL_API_KEY
-            }
-        )
-
-        stats = analysis_response.json()["data"]["attributes"]["stats"]
-        print("📊 VirusTotal result:", stats)
+        logger.info("VirusTotal result", extra={'stage': 'vt_poll', 'vt_analysis_id': analysis_id, 'vt_stats': stats})
 
         if stats.get("malicious", 0) > 0:
-            print("🚫 File blocked by VirusTotal")
+            logger.warning("File blocked by VirusTotal", extra={'stage': 'vt_poll', 'vt_analysis_id': analysis_id, 'vt_stats': stats})
             return Response(
                 {
                     "status": "blocked",
@@ -491,8 +579,6 @@ class AnalyzeFileView(APIView):
                 status=status.HTTP_400_BAD_REQUEST
             )
 
-        print("✅ VirusTotal check passed, continuing main logic")
-
         # ---------- END VIRUSTOTAL PRE-CHECK ----------
 
         file_analysis = None
@@ -526,54 +612,51 @@ class AnalyzeFileView(APIView):
                 temp_file.close()
                 
                 # Save to model from temp file
-                with open(temp_file.name, 'rb') as f:
+                with PipelineMetrics.stage('analyze', 'save_original', *stage_labels), open(temp_file.name, 'rb') as f:
                     file_analysis.original_file.save(uploaded_file.name, f, save=True)
                 
                 # Extract metadata from temp file
-                with open(temp_file.name, 'rb') as f:
+                with PipelineMetrics.stage('analyze', 'extract', *stage_labels), open(temp_file.name, 'rb') as f:
                     metadata = MetadataExtractor.extract_metadata(f, uploaded_file.content_type)
             else:
                 # For smaller files, process directly
-                uploaded_file.seek(0)
-                file_analysis.original_file.save(uploaded_file.name, uploaded_file, save=True)
+                with PipelineMetrics.stage('analyze', 'save_original', *stage_labels):
+                    uploaded_file.seek(0)
+                    file_analysis.original_file.save(uploaded_file.name, uploaded_file, save=True)
                 
-                uploaded_file.seek(0)
-                metadata = MetadataExtractor.extract_metadata(uploaded_file, uploaded_file.content_type)
+                with PipelineMetrics.stage('analyze', 'extract', *stage_labels):
+                    uploaded_file.seek(0)
+                    metadata = MetadataExtractor.extract_metadata(uploaded_file, uploaded_file.content_type)
             
             # Create metadata entries
             metadata_entries = []
-            for key, value in metadata.items():
-                category = MetadataExtractor.categorize_metadata(key, value)
-                risk_level = RiskAnalyzer.get_risk_level(category)
-                
-                entry = MetadataEntry.objects.create(
-                    file_analysis=file_analysis,
-                    key=str(key),
-                    value=str(value)[:500],
-                    category=category,
-                    risk_level=risk_level
-                )
-                metadata_entries.append(entry)
+            with PipelineMetrics.stage('analyze', 'categorize', *stage_labels):
+                for key, value in metadata.items():
+                    category = MetadataExtractor.categorize_metadata(key, value)
+                    risk_level = RiskAnalyzer.get_risk_level(category)
+                    
+                    metadata_entries.append(MetadataEntry(
+                        file_analysis=file_analysis,
+                        key=str(key),
+                        value=str(value)[:500],
+                        category=category,
+                        risk_level=risk_level
+                    ))
+            with PipelineMetrics.stage('analyze', 'store_entries', *stage_labels):
+                file_analysis.store_metadata_entries(metadata_entries)
             
             # Calculate risk with improved algorithm
             metadata_data = [{'category': e.category} for e in metadata_entries]
             risk_score = RiskAnalyzer.calculate_risk_score(metadata_data)
             
             # Remove metadata
-            if is_large_file and temp_file:
-                with open(temp_file.name, 'rb') as f:
-                    cleaned = MetadataRemover.remove_metadata(
-                        f, 
-                        uploaded_file.content_type,
-                        uploaded_file.name
-                    )
-            else:
-                uploaded_file.seek(0)
-                cleaned = MetadataRemover.remove_metadata(
-                    uploaded_file, 
-                    uploaded_file.content_type,
-                    uploaded_file.name
-                )
+            with PipelineMetrics.stage('analyze', 'clean', *stage_labels):
+                if is_large_file and temp_file:
+                    with open(temp_file.name, 'rb') as f:
+                        cleaned = clean_upload(f, uploaded_file, platform, clean_mode)
+                else:
+                    uploaded_file.seek(0)
+                    cleaned = clean_upload(uploaded_file, uploaded_file, platform, clean_mode)
             
             # Save cleaned file
             filename_parts = uploaded_file.name.rsplit('.', 1)
@@ -585,13 +668,14 @@ class AnalyzeFileView(APIView):
             if hasattr(cleaned, 'seek'):
                 cleaned.seek(0)
             
-            file_analysis.cleaned_file.save(clean_name, cleaned, save=False)
-            file_analysis.metadata_count = len(metadata_entries)
-            file_analysis.risk_score = risk_score
-            file_analysis.status = 'cleaned'
-            file_analysis.save()
+            with PipelineMetrics.stage('analyze', 'save_cleaned', *stage_labels):
+                file_analysis.cleaned_file.save(clean_name, cleaned, save=False)
+                file_analysis.metadata_count = len(metadata_entries)
+                file_analysis.risk_score = risk_score
+                file_analysis.status = 'cleaned'
+                file_analysis.save()
             
-            return Response({
+            result = {
                 'analysis_id': str(file_analysis.id),
                 'filename': file_analysis.original_filename,
                 'file_type': file_analysis.file_type,
@@ -600,18 +684,23 @@ class AnalyzeFileView(APIView):
                 'risk_score': risk_score,
                 'metadata_count': len(metadata_entries),
                 'metadata_entries': MetadataEntrySerializer(metadata_entries, many=True).data,
+                'platform_risky_keys': PlatformRuleCache.get(platform).risky_keys(e.key for e in metadata_entries),
                 'risk_recommendation': RiskAnalyzer.get_risk_recommendation(risk_score),
                 'share_token': str(file_analysis.share_token)
-            }, status=status.HTTP_200_OK)
+            }
+            PipelineMetrics.record_bytes('analyze', *stage_labels)
+            # Recorded last, so an analysis that fails above is counted once, as failed
+            UserStats.record_analysis(file_analysis, [e.category for e in metadata_entries])
+            
+            return Response(result, status=status.HTTP_200_OK)
             
         except Exception as e:
             if file_analysis:
                 file_analysis.status = 'failed'
                 file_analysis.save()
+                UserStats.record_analysis(file_analysis)
             
-            import traceback
-            print("ERROR:", str(e))
-            print(traceback.format_exc())
+            logger.exception("Analysis failed")
             
             return Response(
                 {'error': str(e)},
@@ -652,29 +741,13 @@ class CleanFileView(APIView):
                 status=status.HTTP_404_NOT_FOUND
             )
         
-        file_size = file_analysis.cleaned_file.size
-        
-        # Use streaming for large files
-        if file_size > 10 * 1024 * 1024:  # > 10MB
-            response = StreamingHttpResponse(
-                file_iterator(file_analysis.cleaned_file.open('rb')),
-                content_type=file_analysis.file_type
-            )
-            response['Content-Disposition'] = f'attachment; filename="clean_{file_analysis.original_filename}"'
-            response['Content-Length'] = file_size
-        else:
-            response = FileResponse(
-                file_analysis.cleaned_file.open('rb'),
-                as_attachment=True,
-                filename=f"clean_{file_analysis.original_filename}"
-            )
-            response['Content-Length'] = file_size
-        
-        return response
+        # Range, ETag/Last-Modified and proxy offload are handled by FileServer
+        return FileServer.serve_cleaned_file(request, file_analysis)
 
 
 class CleanAndDownloadView(APIView):
     
+    @PipelineMetrics.track('clean')
     def post(self, request):
         serializer = FileUploadSerializer(data=request.data)
         
@@ -682,6 +755,9 @@ class CleanAndDownloadView(APIView):
             return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
         
         uploaded_file = serializer.validated_data['file']
+        platform = serializer.validated_data.get('platform', 'general')
+        clean_mode = serializer.validated_data.get('clean_mode', 'all')
+        stage_labels = (uploaded_file.content_type, uploaded_file.size)
         temp_file = None
         
         try:
@@ -689,32 +765,27 @@ class CleanAndDownloadView(APIView):
             
             # Process large files using temp storage
             if is_large_file:
-                temp_file = tempfile.NamedTemporaryFile(
-                    delete=False,
-                    suffix=os.path.splitext(uploaded_file.name)[1]
-                )
-                
-                # Write to temp file in chunks
-                for chunk in uploaded_file.chunks(chunk_size=8192):
-                    temp_file.write(chunk)
-                temp_file.flush()
-                temp_file.close()
+                with PipelineMetrics.stage('clean', 'spool', *stage_labels):
+                    temp_file = tempfile.NamedTemporaryFile(
+                        delete=False,
+                        suffix=os.path.splitext(uploaded_file.name)[1]
+                    )
+                    
+                    # Write to temp file in chunks
+                    for chunk in uploaded_file.chunks(chunk_size=8192):
+                        temp_file.write(chunk)
+                    temp_file.flush()
+                    temp_file.close()
                 
                 # Process from temp file
-                with open(temp_file.name, 'rb') as f:
-                    cleaned_file = MetadataRemover.remove_metadata(
-                        f, 
-                        uploaded_file.content_type,
-                        uploaded_file.name
-                    )
+                with PipelineMetrics.stage('clean', 'clean', *stage_labels), open(temp_file.name, 'rb') as f:
+                    cleaned_file = clean_upload(f, uploaded_file, platform, clean_mode)
             else:
                 # Process smaller files directly
-                uploaded_file.seek(0)
-                cleaned_file = MetadataRemover.remove_metadata(
-                    uploaded_file, 
-                    uploaded_file.content_type,
-                    uploaded_file.name
-                )
+                with PipelineMetrics.stage('clean', 'clean', *stage_labels):
+                    uploaded_file.seek(0)
+                    cleaned_file = clean_upload(uploaded_file, uploaded_file, platform, clean_mode)
+            PipelineMetrics.record_bytes('clean', *stage_labels)
             
             # Generate clean filename
             filename_parts = uploaded_file.name.rsplit('.', 1)
@@ -749,9 +820,7 @@ class CleanAndDownloadView(APIView):
             return response
             
         except Exception as e:
-            import traceback
-            print("Cleaning Error:", str(e))
-            print(traceback.format_exc())
+            logger.exception("Cleaning Error")
             
             return Response(
                 {'error': f'Cleaning failed: {str(e)}'},
@@ -796,25 +865,8 @@ class ShareFileView(APIView):
                 status=status.HTTP_404_NOT_FOUND
             )
         
-        file_size = file_analysis.cleaned_file.size
-        
-        # Use streaming for large files
-        if file_size > 10 * 1024 * 1024:  # > 10MB
-            response = StreamingHttpResponse(
-                file_iterator(file_analysis.cleaned_file.open('rb')),
-                content_type=file_analysis.file_type
-            )
-            response['Content-Disposition'] = f'attachment; filename="clean_{file_analysis.original_filename}"'
-            response['Content-Length'] = file_size
-        else:
-            response = FileResponse(
-                file_analysis.cleaned_file.open('rb'),
-                as_attachment=True,
-                filename=f"clean_{file_analysis.original_filename}"
-            )
-            response['Content-Length'] = file_size
-        
-        return response
+        # Range, ETag/Last-Modified and proxy offload are handled by FileServer
+        return FileServer.serve_cleaned_file(request, file_analysis)
 
 
 class MakePublicView(APIView):
@@ -837,11 +889,9 @@ class MakePublicView(APIView):
         file_analysis.is_public = True
         file_analysis.save()
         
-        share_url = request.build_absolute_uri(f'/share/{file_analysis.share_token}/')
-        
         return Response({
             'share_token': str(file_analysis.share_token),
-            'share_url': share_url,
+            'share_url': share_url(request, file_analysis.share_token),
             'is_public': file_analysis.is_public
         })
 
@@ -853,15 +903,41 @@ class PlatformRuleViewSet(viewsets.ModelViewSet):
     @action(detail=False, methods=['get'])
     def by_platform(self, request):
         platform = request.query_params.get('platform', 'general')
-        try:
-            rule = PlatformRule.objects.get(platform=platform, is_active=True)
-            serializer = self.get_serializer(rule)
-            return Response(serializer.data)
-        except PlatformRule.DoesNotExist:
-            return Response(
-                {'risky_metadata_keys': RiskAnalyzer.get_platform_risky_keys(platform)},
-                status=status.HTTP_200_OK
-            )
+        # Served from the compiled rule cache; no query per request
+        rule = PlatformRuleCache.rules().get(platform)
+        if rule is not None:
+            return Response(rule.data)
+        return Response(
+            {'risky_metadata_keys': RiskAnalyzer.get_platform_risky_keys(platform)},
+            status=status.HTTP_200_OK
+        )
+
+
+class UserStatsView(APIView):
+    """
+    Dashboard totals for the current user, read from one UserStats row
+    GET /api/stats/
+    """
+    permission_classes = [IsAuthenticated]
+    
+    def get(self, request):
+        stats = UserStats.objects.filter(user=request.user).first() or UserStats(user=request.user)
+        return Response(UserStatsSerializer(stats).data)
+
+
+def metrics_view(request):
+    """
+    Prometheus scrape endpoint
+    GET /metrics
+    """
+    token = getattr(settings, 'METRICS_TOKEN', '')
+    if token and request.META.get('HTTP_AUTHORIZATION', '') != f'Bearer {token}':
+        return HttpResponse(status=status.HTTP_401_UNAUTHORIZED)
+    if not PROMETHEUS_AVAILABLE:
+        return HttpResponse('prometheus-client is not installed', status=status.HTTP_503_SERVICE_UNAVAILABLE)
+    
+    body, content_type = PipelineMetrics.render()
+    return HttpResponse(body, content_type=content_type)
 
 
 class HealthCheckView(APIView):
@@ -877,10 +953,12 @@ class HealthCheckView(APIView):
 class EncryptFileView(APIView):
     """Encrypt and password-protect files"""
     
+    @PipelineMetrics.track('encrypt')
     def post(self, request):
         uploaded_file = request.FILES.get('file')
         password = request.data.get('password')
         method = request.data.get('method', 'encrypt')
+        container_format = request.data.get('format', 'v2')
         temp_file = None
         
         if not uploaded_file:
@@ -896,6 +974,79 @@ class EncryptFileView(APIView):
             )
         
         try:
+            # Generate encrypted filename
+            name_parts = uploaded_file.name.rsplit('.', 1)
+            if method == 'zip':
+                encrypted_filename = f"{name_parts[0]}_protected.zip"
+            elif method == 'encrypt' and container_format == 'extension':
+                # Same naming as the extension so its decrypt page recovers the name
+                encrypted_filename = f"{uploaded_file.name}.enc"
+            elif method == 'encrypt':
+                encrypted_filename = f"{name_parts[0]}_encrypted.enc"
+            else:
+                encrypted_filename = f"{name_parts[0]}_protected.{name_parts[1] if len(name_parts) > 1 else 'pdf'}"
+            
+            # ZIP protection streams every uploaded file into one AES archive
+            if method == 'zip':
+                uploaded_files = request.FILES.getlist('file')
+                if len(uploaded_files) > 1:
+                    encrypted_filename = 'protected_files.zip'
+                
+                stream = EncryptionHandler.create_password_protected_zip_stream(
+                    [(f.name, f) for f in uploaded_files],
+                    password
+                )
+                stream = TimedStream(stream, 'encrypt', 'zip_stream', 'application/zip', sum(f.size for f in uploaded_files))
+                response = StreamingHttpResponse(stream, content_type='application/zip')
+                response['Content-Disposition'] = f'attachment; filename="{encrypted_filename}"'
+                return response
+            
+            # Native PDF protection encrypts the document in place
+            if method == 'pdf' and 'pdf' in uploaded_file.name.lower():
+                # Multipart forms repeat the field; JSON sends a list or comma string
+                permissions = None
+                if 'permissions' in request.data:
+                    permissions = (
+                        request.data.getlist('permissions')
+                        if hasattr(request.data, 'getlist') else request.data.get('permissions')
+                    )
+                
+                try:
+                    with PipelineMetrics.stage('encrypt', 'pdf_protect', 'application/pdf', uploaded_file.size):
+                        stream, protected_size = EncryptionHandler.password_protect_pdf_stream(
+                            uploaded_file,
+                            password,
+                            request.data.get('owner_password') or None,
+                            permissions
+                        )
+                except ValueError as e:
+                    return Response(
+                        {'error': str(e)},
+                        status=status.HTTP_400_BAD_REQUEST
+                    )
+                
+                stream = TimedStream(stream, 'encrypt', 'pdf_stream', 'application/pdf', uploaded_file.size)
+                response = StreamingHttpResponse(stream, content_type='application/pdf')
+                response['Content-Disposition'] = f'attachment; filename="{encrypted_filename}"'
+                response['Content-Length'] = protected_size
+                return response
+            
+            # Universal encryption streams straight from the upload into the response
+            if method != 'pdf':
+                with PipelineMetrics.stage('encrypt', 'derive_key', uploaded_file.content_type, uploaded_file.size):
+                    stream, encrypted_size = EncryptionHandler.encrypt_file_stream(
+                        uploaded_file,
+                        password,
+                        uploaded_file.name,
+                        uploaded_file.size,
+                        container_format
+                    )
+                stream = TimedStream(stream, 'encrypt', 'encrypt_stream', uploaded_file.content_type, uploaded_file.size)
+                response = StreamingHttpResponse(stream, content_type='application/octet-stream')
+                response['Content-Disposition'] = f'attachment; filename="{encrypted_filename}"'
+                response['Content-Length'] = encrypted_size
+                return response
+            
             is_large_file = uploaded_file.size > 10 * 1024 * 1024
             
             # Handle large files with temp storage
@@ -910,7 +1061,8 @@ class EncryptFileView(APIView):
                 temp_file.flush()
                 temp_file.close()
                 
-                with open(temp_file.name, 'rb') as f:
+                with PipelineMetrics.stage('encrypt', 'protect', uploaded_file.content_type, uploaded_file.size), \
+                        open(temp_file.name, 'rb') as f:
                     encrypted_file = EncryptionHandler.protect_file(
                         f,
                         uploaded_file.name,
@@ -919,21 +1071,14 @@ class EncryptFileView(APIView):
                     )
             else:
                 uploaded_file.seek(0)
-                encrypted_file = EncryptionHandler.protect_file(
-                    uploaded_file,
-                    uploaded_file.name,
-                    password,
-                    method
-                )
-            
-            # Generate encrypted filename
-            name_parts = uploaded_file.name.rsplit('.', 1)
-            if method == 'zip':
-                encrypted_filename = f"{name_parts[0]}_protected.zip"
-            elif method == 'encrypt':
-                encrypted_filename = f"{name_parts[0]}_encrypted.enc"
-            else:
-                encrypted_filename = f"{name_parts[0]}_protected.{name_parts[1] if len(name_parts) > 1 else 'pdf'}"
+                with PipelineMetrics.stage('encrypt', 'protect', uploaded_file.content_type, uploaded_file.size):
+                    encrypted_file = EncryptionHandler.protect_file(
+                        uploaded_file,
+                        uploaded_file.name,
+                        password,
+                        method
+                    )
+            PipelineMetrics.record_bytes('encrypt', uploaded_file.content_type, uploaded_file.size)
             
             if hasattr(encrypted_file, 'seek'):
                 encrypted_file.seek(0)
@@ -959,9 +1104,7 @@ class EncryptFileView(APIView):
             return response
         
         except Exception as e:
-            import traceback
-            print("Encryption Error:", str(e))
-            print(traceback.format_exc())
+            logger.exception("Encryption Error")
             
             return Response(
                 {'error': f'Encryption failed: {str(e)}'},
@@ -976,14 +1119,74 @@ class EncryptFileView(APIView):
                     pass
 
 
+class BatchEncryptFileView(APIView):
+    """
+    Encrypt several files under one password into a single archive
+    POST /api/encrypt/batch/
+    Body: {files (multiple), password}
+    """
+    
+    def post(self, request):
+        uploaded_files = request.FILES.getlist('files')
+        password = request.data.get('password')
+        
+        if not uploaded_files:
+            return Response(
+                {'error': 'No files provided'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        if not password:
+            return Response(
+                {'error': 'Password is required'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        try:
+            # The password KDF runs once here, before the response starts
+            stream = EncryptionHandler.encrypt_files_archive(uploaded_files, password)
+        
+        except Exception as e:
+            logger.exception("Encryption Error")
+            
+            return Response(
+                {'error': f'Encryption failed: {str(e)}'},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
+        
+        response = StreamingHttpResponse(stream, content_type='application/zip')
+        response['Content-Disposition'] = 'attachment; filename="encrypted_files.zip"'
+        return response
+
+
+def decrypted_filename(uploaded_name, original_filename='', embedded_filename=None):
+    """Pick the download name for a decrypted file"""
+    if original_filename:
+        return original_filename
+    
+    if embedded_filename and embedded_filename != 'file':
+        return embedded_filename
+    
+    if uploaded_name.endswith('_encrypted.enc'):
+        return uploaded_name.replace('_encrypted.enc', '')
+    elif uploaded_name.endswith('.enc'):
+        return uploaded_name.replace('.enc', '')
+    elif uploaded_name.endswith('_protected.zip'):
+        return uploaded_name.replace('_protected.zip', '')
+    elif uploaded_name.endswith('_protected.pdf'):
+        return uploaded_name.replace('_protected.pdf', '.pdf')
+    else:
+        return uploaded_name.replace('_protected', '_decrypted')
+
+
 class DecryptFileView(APIView):
     """Decrypt password-protected files"""
     
+    @PipelineMetrics.track('decrypt')
     def post(self, request):
         uploaded_file = request.FILES.get('file')
         password = request.data.get('password')
         original_filename = request.data.get('original_filename', '')
-        temp_file = None
         
         if not uploaded_file:
             return Response(
@@ -998,82 +1201,110 @@ class DecryptFileView(APIView):
             )
         
         try:
-            is_large_file = uploaded_file.size > 10 * 1024 * 1024
-            
-            # Handle large files with temp storage
-            if is_large_file:
-                temp_file = tempfile.NamedTemporaryFile(
-                    delete=False,
-                    suffix=os.path.splitext(uploaded_file.name)[1]
+            # Password is checked here, before any data is streamed
+            with PipelineMetrics.stage('decrypt', 'open', uploaded_file.content_type, uploaded_file.size):
+                embedded_filename, decrypted_size, decrypted_stream = EncryptionHandler.open_encrypted_file(
+                    uploaded_file,
+                    password
                 )
-                
-                for chunk in uploaded_file.chunks(chunk_size=8192):
-                    temp_file.write(chunk)
-                temp_file.flush()
-                temp_file.close()
-                
-                with open(temp_file.name, 'rb') as f:
-                    decrypted_file = EncryptionHandler.decrypt_file(f, password)
-            else:
-                uploaded_file.seek(0)
-                decrypted_file = EncryptionHandler.decrypt_file(uploaded_file, password)
-            
-            # Determine filename
-            if original_filename:
-                filename = original_filename
-            else:
-                uploaded_name = uploaded_file.name
-                
-                if uploaded_name.endswith('_encrypted.enc'):
-                    filename = uploaded_name.replace('_encrypted.enc', '')
-                elif uploaded_name.endswith('.enc'):
-                    filename = uploaded_name.replace('.enc', '')
-                elif uploaded_name.endswith('_protected.zip'):
-                    filename = uploaded_name.replace('_protected.zip', '')
-                elif uploaded_name.endswith('_protected.pdf'):
-                    filename = uploaded_name.replace('_protected.pdf', '.pdf')
-                else:
-                    filename = uploaded_name.replace('_protected', '_decrypted')
+        
+        except Exception as e:
+            logger.exception("Decryption Error")
             
-            if hasattr(decrypted_file, 'seek'):
-                decrypted_file.seek(0)
+            return Response(
+                {'error': 'Decryption failed: Wrong password or corrupted file'},
+                status=status.HTTP_401_UNAUTHORIZED
+            )
+        
+        filename = decrypted_filename(uploaded_file.name, original_filename, embedded_filename)
+        
+        decrypted_stream = TimedStream(
+            decrypted_stream, 'decrypt', 'decrypt_stream', uploaded_file.content_type, uploaded_file.size
+        )
+        response = StreamingHttpResponse(decrypted_stream, content_type='application/octet-stream')
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+        response['Content-Length'] = decrypted_size
+        return response
+
+
+class DecryptRangeView(APIView):
+    """
+    Decrypt only the requested byte range of an encrypted file
+    POST /api/decrypt/range/
+    Headers: Range: bytes=<start>-<end>
+    Body: {file, password, original_filename (optional)}
+    """
+    
+    def post(self, request):
+        uploaded_file = request.FILES.get('file')
+        password = request.data.get('password')
+        original_filename = request.data.get('original_filename', '')
+        
+        if not uploaded_file:
+            return Response(
+                {'error': 'No file provided'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        if not password:
+            return Response(
+                {'error': 'Password is required'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        try:
+            header = EncryptionHandler.open_seekable_file(uploaded_file, password)
             
-            # Use streaming for large decrypted files
-            if is_large_file and hasattr(decrypted_file, 'size') and decrypted_file.size > 10 * 1024 * 1024:
-                response = StreamingHttpResponse(
-                    file_iterator(decrypted_file),
-                    content_type='application/octet-stream'
-                )
-                response['Content-Disposition'] = f'attachment; filename="{filename}"'
-                response['Content-Length'] = decrypted_file.size
+            if header is None:
+                # Legacy and extension files are one authenticated message:
+                # ignore the Range and return the whole file
+                embedded_filename, size, stream = EncryptionHandler.open_encrypted_file(uploaded_file, password)
             else:
-                response = FileResponse(
-                    decrypted_file,
-                    as_attachment=True,
-                    filename=filename
-                )
-                
-                if hasattr(decrypted_file, 'size'):
-                    response['Content-Length'] = decrypted_file.size
-            
-            return response
+                embedded_filename, size = header['filename'], header['plaintext_size']
         
         except Exception as e:
-            import traceback
-            print("Decryption Error:", str(e))
-            print(traceback.format_exc())
+            logger.exception("Decryption Error")
             
             return Response(
                 {'error': 'Decryption failed: Wrong password or corrupted file'},
                 status=status.HTTP_401_UNAUTHORIZED
             )
         
-        finally:
-            if temp_file and os.path.exists(temp_file.name):
-                try:
-                    os.unlink(temp_file.name)
-                except Exception:
-                    pass
+        filename = decrypted_filename(uploaded_file.name, original_filename, embedded_filename)
+        content_type = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+        
+        if header is None:
+            response = StreamingHttpResponse(stream, content_type=content_type)
+            response['Content-Length'] = size
+        else:
+            try:
+                byte_range = parse_range_header(request.META.get('HTTP_RANGE'), size)
+            except RangeNotSatisfiable:
+                response = Response(
+                    {'error': 'Requested range not satisfiable'},
+                    status=status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE
+                )
+                response['Content-Range'] = f'bytes */{size}'
+                return response
+            
+            start, end = byte_range if byte_range else (0, size - 1)
+            
+            if size == 0:
+                response = StreamingHttpResponse(iter([]), content_type=content_type)
+            else:
+                response = StreamingHttpResponse(
+                    EncryptionHandler.decrypt_range(uploaded_file, header, start, end),
+                    content_type=content_type
+                )
+            
+            if byte_range:
+                response.status_code = status.HTTP_206_PARTIAL_CONTENT
+                response['Content-Range'] = f'bytes {start}-{end}/{size}'
+            response['Content-Length'] = end - start + 1 if size else 0
+            response['Accept-Ranges'] = 'bytes'
+        
+        response['Content-Disposition'] = f'inline; filename="{filename}"'
+        return response
 
 
 class ValidatePasswordView(APIView):
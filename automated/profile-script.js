@@ -65,13 +65,8 @@ async function loadFileHistory() {
         const data = await response.json();
         fileHistory = data.results || data;
         
-        // Update stats
-        document.getElementById("totalFiles").textContent = fileHistory.length;
-        
-        const totalMetadata = fileHistory.reduce((sum, file) => sum + (file.metadata_count || 0), 0);
-        document.getElementById("totalMetadata").textContent = totalMetadata;
-        
         renderHistory();
+        loadStats();
         
     } catch (error) {
         console.error('History error:', error);
@@ -85,6 +80,24 @@ async function loadFileHistory() {
     }
 }
 
+// Lifetime totals from the server, not just the loaded page
+async function loadStats() {
+    try {
+        const response = await fetch(`${API}/stats/`, {
+            headers: authHeaders
+        });
+        
+        if (!response.ok) throw new Error("Failed to load stats");
+        
+        const stats = await response.json();
+        document.getElementById("totalFiles").textContent = stats.total_files;
+        document.getElementById("totalMetadata").textContent = stats.metadata_count;
+        
+    } catch (error) {
+        console.error('Stats error:', error);
+    }
+}
+
 // Render history
 function renderHistory() {
     let filteredFiles = fileHistory;